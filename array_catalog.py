@@ -0,0 +1,363 @@
+"""Array-backed catalog for very large stores. Prices, quantities, maximums, kinds and
+active flags of all products live in shared typed arrays. Product objects are lightweight
+views over one row, created on first access, and behave like regular products. Views don't
+carry the field slots of regular products: they are subclasses of the ProductBase, NonStockedBase
+and LimitedBase behaviour classes, and are pickled and copied as the regular products they stand for.
+The catalog holds views weakly, a view lives as long as someone uses it.
+"""
+import bisect
+import collections.abc
+import itertools
+import weakref
+from array import array
+
+import products
+import store
+
+PRODUCT = 0
+NON_STOCKED = 1
+LIMITED = 2
+
+
+def _regular_product(product_class, state):
+    """Returns a regular product of a class restored from the state of a pickled view"""
+    product = product_class.__new__(product_class)
+    product.__setstate__(state)
+    return product
+
+
+class _CatalogView(products.ProductBase):
+    """Base of product views redirecting product fields to a row of an ArrayCatalog"""
+
+    __slots__ = ('_catalog', '_index', '__weakref__')
+    # regular product class the view stands for
+    _product_class = products.Product
+
+    def __reduce__(self):
+        """Pickles the view as a regular product detached from the catalog"""
+        return _regular_product, (self._product_class, self._fields_state(self._product_class))
+
+    @property
+    def _name(self):
+        return self._catalog._names[self._index]
+
+    @property
+    def _sku(self):
+        return self._catalog._skus[self._index]
+
+    @property
+    def _price(self):
+        price = self._catalog._prices[self._index]
+        return int(price) if self._catalog._integer_prices[self._index] else price
+
+    @property
+    def _quantity(self):
+        return self._catalog._quantities[self._index]
+
+    @_quantity.setter
+    def _quantity(self, quantity):
+        self._catalog._quantities[self._index] = quantity
+
+    @property
+    def _active(self):
+        return bool(self._catalog._active[self._index])
+
+    @_active.setter
+    def _active(self, active):
+        self._catalog._active[self._index] = active
+
+    @property
+    def _maximum(self):
+        return self._catalog._maximums[self._index]
+
+    @property
+    def _promotions(self):
+        return self._catalog._promotion_entries[self._index][0]
+
+    @property
+    def _promotion_multiplier(self):
+        return self._catalog._promotion_entries[self._index][1]
+
+    def _set_promotions(self, chain):
+        """Replaces promotions of the catalog row"""
+        self._catalog._promotion_entries[self._index] = products.intern_promotions(chain)
+
+
+class CatalogProduct(_CatalogView):
+    """Product view over an ArrayCatalog row"""
+
+    __slots__ = ()
+
+
+class CatalogNonStockedProduct(products.NonStockedBase, _CatalogView):
+    """Non stocked product view over an ArrayCatalog row"""
+
+    __slots__ = ()
+    _product_class = products.NonStockedProduct
+
+
+class CatalogLimitedProduct(products.LimitedBase, _CatalogView):
+    """Limited product view over an ArrayCatalog row"""
+
+    __slots__ = ()
+    _product_class = products.LimitedProduct
+
+
+VIEW_CLASSES = {PRODUCT: CatalogProduct, NON_STOCKED: CatalogNonStockedProduct, LIMITED: CatalogLimitedProduct}
+
+
+class ArrayCatalog:
+    """Column storage of many products with product views created on demand"""
+
+    def __init__(self):
+        """Creates an empty catalog"""
+        self._names = []
+        self._skus = []
+        self._prices = array('d')
+        # prices given as integers, they are read back as integers
+        self._integer_prices = bytearray()
+        self._quantities = array('q')
+        self._maximums = array('q')
+        self._kinds = array('b')
+        self._active = bytearray()
+        self._promotion_entries = []
+        self._views = weakref.WeakValueDictionary()
+        self._view_listeners = ()
+
+    @classmethod
+    def from_products(cls, product_list):
+        """Builds a catalog with the data of existing products"""
+        catalog = cls()
+        for product in product_list:
+            if isinstance(product, products.NonStockedBase):
+                catalog.append(NON_STOCKED, product.name, product.price, product.quantity, sku=product.sku)
+            elif isinstance(product, products.LimitedBase):
+                catalog.append(LIMITED, product.name, product.price, product.quantity, product.maximum, product.sku)
+            else:
+                catalog.append(PRODUCT, product.name, product.price, product.quantity, sku=product.sku)
+            catalog._promotion_entries[-1] = products.intern_promotions(product._promotions)
+            catalog._active[-1] = product.is_active
+        return catalog
+
+    def append(self, kind, name, price, quantity=0, maximum=0, sku=None, promotions=()):
+        """Adds a product row, returns its index
+        :param kind: PRODUCT, NON_STOCKED or LIMITED
+        :param name: string
+        :param price: integer or float
+        :param quantity: integer
+        :param maximum: integer, maximum amount per order of a limited product
+        :param sku: hashable identity key, assigned automatically if not provided
+        :param promotions: ordered iterable of Promotion objects
+        :return: integer
+        """
+        if kind not in VIEW_CLASSES:
+            raise ValueError(f'Unknown product kind {kind!r}.')
+        if not name:
+            raise ValueError('Product name can not be empty.')
+        if not isinstance(price, (int, float)) or price < 0:
+            raise ValueError('Price should be a positive number.')
+        if not isinstance(quantity, int) or quantity < 0:
+            raise ValueError('Quantity should be a positive number.')
+        self._names.append(name)
+        self._skus.append(next(products._sku_counter) if sku is None else sku)
+        self._prices.append(price)
+        self._integer_prices.append(isinstance(price, int))
+        self._quantities.append(quantity)
+        self._maximums.append(maximum)
+        self._kinds.append(kind)
+        self._active.append(True)
+        self._promotion_entries.append(products.intern_promotions(promotions))
+        return len(self._names) - 1
+
+    def __len__(self):
+        """Returns number of product rows"""
+        return len(self._names)
+
+    def __getitem__(self, index):
+        """Returns product view of a row, creating it on first access"""
+        view = self._views.get(index)
+        if view is None:
+            if not 0 <= index < len(self._names):
+                raise IndexError('Catalog index out of range.')
+            view = VIEW_CLASSES[self._kinds[index]].__new__(VIEW_CLASSES[self._kinds[index]])
+            view._catalog = self
+            view._index = index
+            view._listeners = self._view_listeners
+            view._version = 0
+            view._price_version = 0
+            view = self._views.setdefault(index, view)
+        return view
+
+    def __iter__(self):
+        """Iterates over product views of all rows"""
+        return (self[index] for index in range(len(self._names)))
+
+    @property
+    def total_quantity(self):
+        """Returns quantity of all rows without creating product views"""
+        return sum(self._quantities)
+
+    def to_store(self):
+        """Returns a Store of all catalog products, creating a view of every row"""
+        return store.Store(self)
+
+    def add_view_listener(self, listener):
+        """Subscribes a callable to changes of all product views, including views created later"""
+        self._view_listeners = self._view_listeners + (listener,)
+        for view in list(self._views.values()):
+            view.add_listener(listener)
+
+
+class _CatalogProducts:
+    """Dictionary-like sku -> product of a CatalogStore. Catalog rows are found through a sku index
+    built on the first lookup and their views are created on access. Products added to the store
+    later are kept in a dictionary of their own
+    """
+
+    def __init__(self, catalog):
+        """Creates the mapping over catalog rows"""
+        self._catalog = catalog
+        self._rows = None
+        self._added = {}
+        # rows of catalog products removed from the store
+        self._removed = set()
+
+    def _row(self, sku):
+        """Returns catalog row of a sku in the store or None"""
+        rows = self._rows
+        if rows is None:
+            skus = self._catalog._skus
+            rows = {}
+            for row in range(len(skus)):
+                rows.setdefault(skus[row], row)
+            self._rows = rows
+        row = rows.get(sku)
+        return None if row is None or row in self._removed else row
+
+    def __len__(self):
+        """Returns number of products in the store"""
+        return len(self._catalog) - len(self._removed) + len(self._added)
+
+    def __contains__(self, sku):
+        """Returns bool weather a product with the sku is in the store"""
+        return self._row(sku) is not None or sku in self._added
+
+    def get(self, sku, default=None):
+        """Returns product of a sku or default"""
+        row = self._row(sku)
+        if row is None:
+            return self._added.get(sku, default)
+        return self._catalog[row]
+
+    def __getitem__(self, sku):
+        """Returns product of a sku, raises KeyError if there is none"""
+        product = self.get(sku)
+        if product is None:
+            raise KeyError(sku)
+        return product
+
+    def __setitem__(self, sku, product):
+        """Adds a product which is not a catalog row"""
+        self._added[sku] = product
+
+    def pop(self, sku):
+        """Removes a product from the store and returns it"""
+        row = self._row(sku)
+        if row is None:
+            return self._added.pop(sku)
+        self._removed.add(row)
+        return self._catalog[row]
+
+    def active_products(self):
+        """Returns _ActiveProducts sequence of active products in the store, without creating views"""
+        rows = array('q', itertools.compress(range(len(self._catalog)), self._catalog._active))
+        if self._removed:
+            rows = array('q', (row for row in rows if row not in self._removed))
+        return _ActiveProducts(self._catalog, rows,
+                               tuple(product for product in self._added.values() if product.is_active))
+
+    def values(self):
+        """Iterates over all products of the store, catalog rows first"""
+        catalog_products = (self._catalog[row] for row in range(len(self._catalog)) if row not in self._removed)
+        return itertools.chain(catalog_products, list(self._added.values()))
+
+
+class _ActiveProducts(collections.abc.Sequence):
+    """Read only sequence of active products of a CatalogStore at the moment it was built.
+    Holds catalog row numbers, views are created on access
+    """
+
+    def __init__(self, catalog, rows, added):
+        """Creates a sequence of catalog rows followed by other products"""
+        self._catalog = catalog
+        self._rows = rows
+        self._added = added
+
+    def __len__(self):
+        """Returns number of active products"""
+        return len(self._rows) + len(self._added)
+
+    def __getitem__(self, index):
+        """Returns product at a position, or list of products of a slice"""
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Product index out of range.')
+        if index < len(self._rows):
+            return self._catalog[self._rows[index]]
+        return self._added[index - len(self._rows)]
+
+    def position(self, product):
+        """Returns position of a product without creating views, raises ValueError if it isn't listed"""
+        if isinstance(product, _CatalogView) and product._catalog is self._catalog:
+            position = bisect.bisect_left(self._rows, product._index)
+            if position < len(self._rows) and self._rows[position] == product._index:
+                return position
+        else:
+            for position, added in enumerate(self._added):
+                if added is product:
+                    return len(self._rows) + position
+        raise ValueError(f'{product} is not an active product of the store.')
+
+
+class CatalogStore(store.Store):
+    """Store over an ArrayCatalog which reads only the quantity column when it is opened.
+    Product views, the sku index and the price index are created on first access.
+    Skus of catalog rows should be unique, as they are in snapshots written from a store
+    """
+
+    def __init__(self, catalog, quote_cache=None, schedule=None):
+        """Opens a store over catalog rows
+        :param catalog: ArrayCatalog object
+        :param quote_cache: optional QuoteCache used by quotes and by orders without quantity reduction
+        :param schedule: optional PromotionSchedule applied on top of product promotions
+        """
+        super().__init__((), quote_cache, schedule)
+        self._catalog = catalog
+        self._products = _CatalogProducts(catalog)
+        self._total_quantity = catalog.total_quantity
+        self._active_products = None
+        # built on the first price query
+        self._price_index = None
+        catalog.add_view_listener(self._on_product_change)
+
+    @property
+    def all_products(self):
+        """Returns sequence of all active products left in store.
+        The sequence is cached and rebuilt only after a product was activated or deactivated
+        """
+        if self.check_invariants:
+            self._verify_invariants()
+        active_products = self._active_products
+        if active_products is None:
+            with self._lock:
+                active_products = self._active_products
+                if active_products is None:
+                    active_products = self._active_products = self._products.active_products()
+        return active_products
+
+    def product_position(self, product):
+        """Returns position of an active product in all_products, catalog rows are located without views"""
+        return self.all_products.position(product)
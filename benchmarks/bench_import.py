@@ -0,0 +1,68 @@
+"""Rows per second of streaming catalog import.
+Run from the repository root: python -m benchmarks.bench_import --rows 1000000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+import catalog_import
+import promotions
+
+PRODUCT_TYPES = ('product', 'product', 'product', 'non_stocked', 'limited')
+
+
+def promotion_catalog():
+    """Returns promotion catalog used by the generated rows"""
+    return {'second_half': promotions.SecondHalfPrice("Second Half price!"),
+            'third_free': promotions.ThirdOneFree("Third One Free!"),
+            'thirty_off': promotions.PercentDiscount("30% off!", percent=30)}
+
+
+def generate_rows(count, seed=0):
+    """Yields synthetic catalog rows"""
+    rng = random.Random(seed)
+    promo_names = list(promotion_catalog())
+    for number in range(count):
+        yield {'type': rng.choice(PRODUCT_TYPES), 'name': f'Product {number}',
+               'price': round(rng.uniform(1, 2000), 2), 'quantity': rng.randint(1, 1000),
+               'maximum': rng.randint(1, 5), 'sku': f'SKU-{number}',
+               'promotions': ';'.join(rng.sample(promo_names, rng.randint(0, 2)))}
+
+
+def write_catalog(path, count):
+    """Writes count synthetic rows as CSV or JSONL depending on the file extension"""
+    rows = generate_rows(count)
+    with open(path, 'w', newline='', encoding='utf-8') as catalog_file:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(catalog_file, ['type', 'name', 'price', 'quantity', 'maximum',
+                                                   'sku', 'promotions'])
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                catalog_file.write(json.dumps(row) + '\n')
+
+
+def main():
+    """Generates catalogs in a temporary directory and times their import"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    arguments = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in ('csv', 'jsonl'):
+            path = os.path.join(directory, f'catalog.{extension}')
+            write_catalog(path, arguments.rows)
+            started = time.perf_counter()
+            result = catalog_import.import_catalog(path, promotion_catalog(), chunk_size=arguments.chunk_size)
+            elapsed = time.perf_counter() - started
+            print(f'{extension}: {result.imported} rows in {elapsed:.2f}s, '
+                  f'{result.imported / elapsed:,.0f} rows/sec, {result.error_count} errors')
+
+
+if __name__ == "__main__":
+    main()
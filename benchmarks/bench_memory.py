@@ -0,0 +1,61 @@
+"""Bytes per SKU of regular slotted products and of the array-backed catalog.
+Run from the repository root: python -m benchmarks.bench_memory --skus 1000000
+"""
+import argparse
+import gc
+import tracemalloc
+
+import array_catalog
+import products
+import promotions
+
+PROMOTION_CHAINS = ((), (promotions.SecondHalfPrice("Second Half price!"),),
+                    (promotions.PercentDiscount("30% off!", percent=30),))
+
+
+def measure(build):
+    """Returns object built by build() and the number of bytes allocated for it"""
+    gc.collect()
+    tracemalloc.start()
+    built = build()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, allocated
+
+
+def build_products(count):
+    """Builds a list of regular products"""
+    product_list = []
+    for number in range(count):
+        product = products.Product(f'Product {number}', price=number % 2000 + 0.99, quantity=number % 1000)
+        for promo in PROMOTION_CHAINS[number % len(PROMOTION_CHAINS)]:
+            product.set_promotion(promo)
+        product_list.append(product)
+    return product_list
+
+
+def build_catalog(count):
+    """Builds an array catalog with the same rows as build_products"""
+    catalog = array_catalog.ArrayCatalog()
+    for number in range(count):
+        catalog.append(array_catalog.PRODUCT, f'Product {number}', number % 2000 + 0.99, number % 1000,
+                       promotions=PROMOTION_CHAINS[number % len(PROMOTION_CHAINS)])
+    return catalog
+
+
+def main():
+    """Prints bytes per SKU for both representations"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--skus', type=int, default=100000)
+    count = parser.parse_args().skus
+    product_list, allocated = measure(lambda: build_products(count))
+    print(f'slotted products:        {allocated / count:8.1f} bytes/SKU')
+    del product_list
+    catalog, allocated = measure(lambda: build_catalog(count))
+    print(f'array catalog:           {allocated / count:8.1f} bytes/SKU')
+    _, allocated = measure(lambda: list(catalog))
+    print(f'  + materialized views:  {allocated / count:8.1f} bytes/SKU')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Latency of ranked name searches against an unranked linear scan of product names.
+Run from the repository root: python -m benchmarks.bench_search --skus 1000000
+"""
+import argparse
+import random
+import time
+
+import array_catalog
+import search
+
+WORDS = ('Google', 'Pixel', 'MacBook', 'Air', 'Pro', 'Bose', 'QuietComfort', 'Earbuds', 'USB-C', 'Cable',
+         'Charger', 'Case', 'Screen', 'Protector', 'Windows', 'License', 'Shipping', 'Stand', 'Mouse', 'Keyboard')
+QUERIES = ('pixel', 'quietcomfort earbuds', 'cable 12', 'air', 'pr', 'keyboard mouse 99')
+
+
+def build_catalog(count, seed=0):
+    """Returns array catalog of count products with random multi word names"""
+    rng = random.Random(seed)
+    catalog = array_catalog.ArrayCatalog()
+    for number in range(count):
+        name = ' '.join(rng.sample(WORDS, rng.randint(2, 4))) + f' {number}'
+        catalog.append(array_catalog.PRODUCT, name, 10, 1)
+    return catalog
+
+
+def best_seconds(function, repeat):
+    """Returns the best time of repeat calls of function"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    """Prints index build time and per query latency of the index and of a linear scan"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--skus', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+    product_list = list(build_catalog(arguments.skus))
+    index = search.NameIndex()
+    print(f'index build:           {best_seconds(lambda: index.add_many(product_list), 1):10.3f} s')
+    names = [search.normalize(product.name) for product in product_list]
+    for query in QUERIES:
+        indexed = best_seconds(lambda: index.search(query), arguments.repeat)
+        prefix = best_seconds(lambda: index.prefix(query), arguments.repeat)
+        scanned = best_seconds(lambda: [name for name in names if query in name], 1)
+        print(f'{query!r:24} substring {indexed * 1000:9.3f} ms   prefix {prefix * 1000:7.3f} ms   '
+              f'unranked scan {scanned * 1000:9.3f} ms')
+
+
+if __name__ == "__main__":
+    main()
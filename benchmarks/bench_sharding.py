@@ -0,0 +1,46 @@
+"""Order throughput of a plain Store and of a ShardedStore with growing worker counts.
+Run from the repository root: python -m benchmarks.bench_sharding --workers 1 2 4 8
+"""
+import argparse
+import random
+import time
+
+import sharding
+from benchmarks.suite import make_store
+
+
+def make_orders(product_list, count, lines, seed=0):
+    """Returns count shopping lists of random products"""
+    rng = random.Random(seed)
+    return [[(rng.choice(product_list), rng.randint(1, 3)) for _ in range(lines)] for _ in range(count)]
+
+
+def main():
+    """Prints orders per second for the plain store and for every worker count"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--skus', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--lines', type=int, default=1, help='lines per order')
+    parser.add_argument('--batch', type=int, default=5000, help='orders sent to the shards at once')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    arguments = parser.parse_args()
+    plain_store = make_store(arguments.skus)
+    product_list = list(plain_store)
+    orders = make_orders(product_list, arguments.orders, arguments.lines)
+    started = time.perf_counter()
+    for shopping_list in orders:
+        plain_store.order(shopping_list)
+    print(f'plain store:        {arguments.orders / (time.perf_counter() - started):10.0f} orders/s')
+    for workers in arguments.workers:
+        with sharding.ShardedStore(product_list, workers) as sharded:
+            started = time.perf_counter()
+            rejected = 0
+            for start in range(0, len(orders), arguments.batch):
+                results = sharded.order_many(orders[start:start + arguments.batch])
+                rejected += sum(isinstance(result, ValueError) for result in results)
+            seconds = time.perf_counter() - started
+        print(f'{workers:2} shard workers:   {arguments.orders / seconds:10.0f} orders/s, {rejected} rejected')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark suite for store, product and promotion hot paths.
+Run from the repository root:
+    python -m benchmarks.suite run --sizes 1000 100000 1000000 --output baseline.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import main
+import products
+import promotions
+import store
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+
+def make_store(size, seed=0):
+    """Builds a store of size synthetic products of all kinds with stacked promotions"""
+    rng = random.Random(seed)
+    promo_chains = ((), (promotions.SecondHalfPrice("Second Half price!"),),
+                    (promotions.ThirdOneFree("Third One Free!"), promotions.SecondHalfPrice("Second Half price!")),
+                    (promotions.PercentDiscount("30% off!", percent=30),))
+    product_list = []
+    for number in range(size):
+        kind = rng.random()
+        price = round(rng.uniform(1, 2000), 2)
+        if kind < 0.8:
+            product = products.Product(f'Product {number}', price, quantity=10 ** 9)
+        elif kind < 0.9:
+            product = products.NonStockedProduct(f'License {number}', price)
+        else:
+            product = products.LimitedProduct(f'Shipping {number}', price, maximum=3, quantity=10 ** 9)
+        for promo in rng.choice(promo_chains):
+            product.set_promotion(promo)
+        product_list.append(product)
+    return store.Store(product_list)
+
+
+def time_per_call(function, number, repeat):
+    """Returns the best average seconds per call of function over repeat rounds of number calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def benchmarks_for(store_obj, seed=0):
+    """Returns dictionary of benchmark name to tuple (function, calls per round)"""
+    rng = random.Random(seed)
+    stocked = [product for product in store_obj.all_products if type(product) is products.Product]
+    stacked = next(product for product in stocked if len(product._promotions) > 1)
+    order_lines = [[(rng.choice(stocked), 1)] for _ in range(1000)]
+    order_indexes = [[(rng.randrange(len(store_obj.all_products)), 1) for _ in range(5)] for _ in range(100)]
+    other_store = store.Store([])
+    lines = iter(order_lines * 1000)
+    indexes = iter(order_indexes * 1000)
+    return {
+        'store_order': (lambda: store_obj.order(next(lines)), 1000),
+        'store_all_products': (lambda: store_obj.all_products, 10000),
+        'store_total_quantity': (lambda: store_obj.total_quantity, 10000),
+        'store_add': (lambda: store_obj + other_store, 1),
+        'product_buy_stacked_promotions': (lambda: stacked.buy(3, reduce_product_quantity=False), 10000),
+        'calculate_order_price_and_order_dict':
+            (lambda: main.calculate_order_price_and_order_dict(store_obj, next(indexes), False), 100),
+    }
+
+
+def run(sizes, repeat, selected=None):
+    """Runs benchmarks for every catalog size, returns JSON-ready results"""
+    results = {}
+    for size in sizes:
+        store_obj = make_store(size)
+        for name, (function, number) in benchmarks_for(store_obj).items():
+            if selected and name not in selected:
+                continue
+            seconds = time_per_call(function, number, repeat)
+            results[f'{name}[{size}]'] = {'seconds_per_call': seconds}
+            print(f'{name}[{size}]: {seconds * 1e6:,.3f} us/call', file=sys.stderr)
+    return {'meta': {'python': platform.python_version(), 'machine': platform.machine(),
+                     'platform': platform.platform(), 'repeat': repeat},
+            'results': results}
+
+
+def compare(baseline, current, threshold):
+    """Returns list of tuples (benchmark, baseline seconds, current seconds, ratio)
+    of benchmarks that became slower than baseline by more than threshold
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['seconds_per_call']
+        after = result['seconds_per_call']
+        if before and after / before > 1 + threshold:
+            regressions.append((name, before, after, after / before))
+    return regressions
+
+
+def main_cli(arguments=None):
+    """Command line entry point, returns process exit code"""
+    parser = argparse.ArgumentParser(description='Best Buy benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run benchmarks and save results as JSON')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--only', nargs='+', help='names of benchmarks to run')
+    run_parser.add_argument('--output', default='-', help='JSON file, "-" for standard output')
+    compare_parser = commands.add_parser('compare', help='flag regressions against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='allowed slowdown as a fraction, 0.2 means 20%%')
+    arguments = parser.parse_args(arguments)
+    if arguments.command == 'run':
+        results = run(arguments.sizes, arguments.repeat, arguments.only)
+        if arguments.output == '-':
+            print(json.dumps(results, indent=2))
+        else:
+            with open(arguments.output, 'w', encoding='utf-8') as output_file:
+                json.dump(results, output_file, indent=2)
+        return 0
+    with open(arguments.baseline, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(arguments.current, encoding='utf-8') as current_file:
+        current = json.load(current_file)
+    regressions = compare(baseline, current, arguments.threshold)
+    for name, before, after, ratio in regressions:
+        print(f'REGRESSION {name}: {before * 1e6:,.3f} -> {after * 1e6:,.3f} us/call ({ratio:.2f}x)')
+    if not regressions:
+        print('No regressions.')
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,64 @@
+class Cart:
+    """Shopping cart of a Store. Keeps ordered quantity and cached price of every line,
+    so adding an item re-prices only the line of that product
+    """
+
+    def __init__(self, store_obj):
+        """Cart instance initialization
+        :param store_obj: Store class object
+        """
+        self._store = store_obj
+        self._lines = {}
+
+    def __contains__(self, product):
+        """Returns bool weather product is in the cart"""
+        return product.sku in self._lines
+
+    def __getitem__(self, product):
+        """Returns ordered quantity of a product"""
+        return self._lines[product.sku][1]
+
+    def __iter__(self):
+        """Iterates over products in the cart in the order they were added"""
+        return (product for product, _, _ in self._lines.values())
+
+    def __len__(self):
+        """Returns number of different products in the cart"""
+        return len(self._lines)
+
+    def get(self, product, default=0):
+        """Returns ordered quantity of a product or default if the product is not in the cart"""
+        line = self._lines.get(product.sku)
+        return default if line is None else line[1]
+
+    def items(self):
+        """Returns list of tuples (product, quantity) in the order products were added"""
+        return [(product, quantity) for product, quantity, _ in self._lines.values()]
+
+    def add(self, product, quantity):
+        """Adds quantity of a product to the cart and re-prices its line.
+        Raises ValueError if the store can not sell the new line quantity
+        :param product: Product class object
+        :param quantity: integer
+        :return: None
+        """
+        line_quantity = self.get(product) + quantity
+        line_price = self._store.quote([(product, line_quantity)])
+        self._lines[product.sku] = (product, line_quantity, line_price)
+
+    def remove(self, product):
+        """Removes a product line from the cart"""
+        del self._lines[product.sku]
+
+    @property
+    def total(self):
+        """Returns total price of the cart from cached line prices"""
+        return round(sum(line_price for _, _, line_price in self._lines.values()), 2)
+
+    def checkout(self):
+        """Orders all cart lines from the store in one pass and empties the cart
+        :return: float, total price of the order
+        """
+        total_price = self._store.order(self.items())
+        self._lines.clear()
+        return round(total_price, 2)
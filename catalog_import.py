@@ -0,0 +1,185 @@
+"""Streaming import of product catalogs from CSV or JSONL files into a Store.
+Every row describes one product with the fields:
+    type        product, non_stocked or limited (product if empty)
+    name        product name
+    price       positive number
+    quantity    positive integer (ignored for non_stocked)
+    maximum     maximum amount per order, only for limited
+    promotions  promotion names separated by ";" (list of names in JSONL)
+    sku         optional identity key
+Rows are read lazily and added to the store in chunks, so memory besides the store
+itself stays bounded. Invalid rows and rows with a sku which is already in the store
+are reported with their line numbers and skipped.
+"""
+import csv
+import itertools
+import json
+import math
+import os
+
+import products
+import store
+
+PROMOTION_SEPARATOR = ';'
+
+
+class ImportResult:
+    """Outcome of a catalog import"""
+
+    def __init__(self, store_obj, max_errors):
+        """Instance initialization"""
+        self.store = store_obj
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self._max_errors = max_errors
+
+    def add_error(self, line_number, message):
+        """Records a skipped row. Keeps only the first max_errors messages"""
+        self.error_count += 1
+        if len(self.errors) < self._max_errors:
+            self.errors.append((line_number, message))
+
+
+def read_csv_rows(path):
+    """Yields tuples (line number, row dictionary) of a CSV file with a header row"""
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        reader = csv.DictReader(csv_file)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_jsonl_rows(path):
+    """Yields tuples (line number, row dictionary) of a JSONL file.
+    Lines which are not JSON objects are yielded with the error message instead of a dictionary
+    """
+    with open(path, encoding='utf-8') as jsonl_file:
+        for line_number, line in enumerate(jsonl_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, f'Invalid JSON: {error}'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, 'Row should be a JSON object.'
+                continue
+            yield line_number, row
+
+
+def _number(value, field):
+    """Converts a CSV or JSON value to int or float. Booleans, nan and infinities are not numbers"""
+    if isinstance(value, bool):
+        raise ValueError(f'{field} should be a number, got {value!r}.')
+    if isinstance(value, (int, float)):
+        number = value
+    else:
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{field} should be a number, got {value!r}.') from None
+    if not math.isfinite(number):
+        raise ValueError(f'{field} should be a finite number, got {value!r}.')
+    return number
+
+
+def _integer(value, field):
+    """Converts a CSV or JSON value to int"""
+    number = _number(value, field)
+    if not isinstance(number, int):
+        raise ValueError(f'{field} should be an integer, got {value!r}.')
+    return number
+
+
+def build_product(row, promotion_catalog):
+    """Creates a product from a row dictionary. Raises ValueError for invalid rows
+    :param row: dictionary of row fields
+    :param promotion_catalog: dictionary of promotion name to Promotion object
+    :return: Product class object
+    """
+    product_type = (row.get('type') or 'product').strip().lower()
+    name = row.get('name')
+    price = _number(row.get('price'), 'price')
+    sku = row.get('sku') or None
+    if product_type == 'product':
+        product = products.Product(name, price, _integer(row.get('quantity'), 'quantity'), sku=sku)
+    elif product_type == 'non_stocked':
+        product = products.NonStockedProduct(name, price, sku=sku)
+    elif product_type == 'limited':
+        product = products.LimitedProduct(name, price, _integer(row.get('maximum'), 'maximum'),
+                                          _integer(row.get('quantity') or 0, 'quantity'), sku=sku)
+    else:
+        raise ValueError(f'Unknown product type {product_type!r}.')
+    promotion_names = row.get('promotions') or []
+    if isinstance(promotion_names, str):
+        promotion_names = [promo_name.strip() for promo_name in promotion_names.split(PROMOTION_SEPARATOR)]
+    for promo_name in promotion_names:
+        if not promo_name:
+            continue
+        if promo_name not in promotion_catalog:
+            raise ValueError(f'Unknown promotion {promo_name!r}.')
+        product.set_promotion(promotion_catalog[promo_name])
+    return product
+
+
+def iter_product_chunks(rows, promotion_catalog, result, chunk_size=10000):
+    """Validates rows and yields lists of at most chunk_size products.
+    Invalid rows and rows with a sku already in the store or in an earlier row are recorded in result and skipped
+    :param rows: iterable of tuples (line number, row dictionary or error message)
+    :param promotion_catalog: dictionary of promotion name to Promotion object
+    :param result: ImportResult object collecting errors
+    :param chunk_size: maximum number of products in a chunk
+    """
+    rows = iter(rows)
+    while True:
+        chunk = []
+        chunk_skus = set()
+        consumed = 0
+        for line_number, row in itertools.islice(rows, chunk_size):
+            consumed += 1
+            if isinstance(row, str):
+                result.add_error(line_number, row)
+                continue
+            try:
+                product = build_product(row, promotion_catalog)
+            except (TypeError, ValueError) as error:
+                result.add_error(line_number, str(error))
+                continue
+            # earlier chunks are already in the store, so only this chunk has to be checked separately
+            if product.sku in chunk_skus or result.store.get_product(product.sku) is not None:
+                result.add_error(line_number, f'Duplicate sku {product.sku!r}.')
+                continue
+            chunk_skus.add(product.sku)
+            chunk.append(product)
+        if not consumed:
+            return
+        if chunk:
+            yield chunk
+
+
+def import_catalog(path, promotion_catalog=None, store_obj=None, chunk_size=10000, max_errors=1000):
+    """Streams a CSV or JSONL catalog into a store, the format is chosen by file extension
+    :param path: path of a .csv or .jsonl file
+    :param promotion_catalog: dictionary of promotion name to Promotion object
+    :param store_obj: Store class object to import into, a new Store is created if None
+    :param chunk_size: number of rows validated and added to the store at once
+    :param max_errors: number of invalid row messages kept in the result
+    :return: ImportResult object
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        rows = read_csv_rows(path)
+    elif extension in ('.jsonl', '.ndjson'):
+        rows = read_jsonl_rows(path)
+    else:
+        raise ValueError(f'Unsupported catalog format {extension!r}.')
+    if store_obj is None:
+        store_obj = store.Store([])
+    result = ImportResult(store_obj, max_errors)
+    for chunk in iter_product_chunks(rows, promotion_catalog or {}, result, chunk_size):
+        result.imported += store_obj.add_products(chunk)
+    return result
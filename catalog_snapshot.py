@@ -0,0 +1,234 @@
+"""Binary catalog snapshots for fast startup.
+A snapshot holds fixed-width columns of prices, integer price flags, quantities, maximums, skus,
+product kinds and active flags, a table of interned strings for names, promotion labels and promotion classes,
+and a table of promotion chains. Numbers use the native byte order and sizes of the machine.
+Loading maps the file into memory and reads nothing else: product objects are created on first
+access, and sold quantities change the mapped copy only, never the file. Open a CatalogStore
+over a loaded snapshot to keep that laziness in the store, to_store() creates every product.
+"""
+import mmap
+import struct
+import weakref
+from array import array
+
+import array_catalog
+import products
+import promotions
+
+MAGIC = b'BBCS'
+FORMAT_VERSION = 2
+# magic, format version, rows, strings, string bytes, promotions, chains, promotion ids of all chains
+HEADER = struct.Struct('<4sH2xQQQQQQ')
+SKU_INTEGER = 0
+SKU_STRING = 1
+
+
+def _layout(rows, strings, string_bytes, promotion_count, chains, chain_items):
+    """Returns list of tuples (section name, typecode, length) in file order.
+    Wider columns come first, so every column is aligned to its item size
+    """
+    return [('prices', 'd', rows), ('quantities', 'q', rows), ('maximums', 'q', rows), ('skus', 'q', rows),
+            ('string_offsets', 'Q', strings + 1), ('promotion_percents', 'd', promotion_count),
+            ('name_ids', 'I', rows), ('chain_ids', 'I', rows), ('promotion_classes', 'I', promotion_count),
+            ('promotion_labels', 'I', promotion_count), ('chain_starts', 'I', chains + 1),
+            ('chain_items', 'I', chain_items), ('kinds', 'b', rows), ('active', 'b', rows),
+            ('sku_kinds', 'b', rows), ('integer_prices', 'b', rows), ('strings', 'B', string_bytes)]
+
+
+def _product_kind(product):
+    """Returns catalog kind of a product"""
+    if isinstance(product, products.NonStockedBase):
+        return array_catalog.NON_STOCKED
+    if isinstance(product, products.LimitedBase):
+        return array_catalog.LIMITED
+    return array_catalog.PRODUCT
+
+
+def write_snapshot(store_obj, path):
+    """Writes all products of a store, including inactive ones, to a snapshot file
+    :param store_obj: Store class object
+    :param path: file path
+    :return: integer, number of written products
+    """
+    columns = {name: array(typecode) for name, typecode, _ in _layout(0, 0, 0, 0, 0, 0)}
+    string_ids = {}
+    promotion_ids = {}
+    chain_ids = {(): 0}
+    # the empty chain 0 ends where it starts
+    columns['chain_starts'].extend((0, 0))
+
+    def intern_string(text):
+        if text not in string_ids:
+            string_ids[text] = len(string_ids)
+        return string_ids[text]
+
+    def promotion_id(promo):
+        if id(promo) not in promotion_ids:
+            if getattr(promotions, type(promo).__name__, None) is not type(promo):
+                raise ValueError(f'Promotion {promo} is not defined in the promotions module.')
+            promotion_ids[id(promo)] = len(promotion_ids)
+            columns['promotion_classes'].append(intern_string(type(promo).__name__))
+            columns['promotion_labels'].append(intern_string(str(promo)))
+            columns['promotion_percents'].append(getattr(promo, '_percent', 0))
+        return promotion_ids[id(promo)]
+
+    for product in store_obj:
+        chain = tuple(promotion_id(promo) for promo in product._promotions)
+        if chain not in chain_ids:
+            chain_ids[chain] = len(chain_ids)
+            columns['chain_items'].extend(chain)
+            columns['chain_starts'].append(len(columns['chain_items']))
+        if isinstance(product.sku, int):
+            columns['sku_kinds'].append(SKU_INTEGER)
+            columns['skus'].append(product.sku)
+        elif isinstance(product.sku, str):
+            columns['sku_kinds'].append(SKU_STRING)
+            columns['skus'].append(intern_string(product.sku))
+        else:
+            raise ValueError(f'Sku {product.sku!r} should be an integer or a string.')
+        columns['prices'].append(product.price)
+        columns['integer_prices'].append(isinstance(product.price, int))
+        columns['quantities'].append(product.quantity)
+        columns['maximums'].append(getattr(product, 'maximum', 0))
+        columns['name_ids'].append(intern_string(product.name))
+        columns['chain_ids'].append(chain_ids[chain])
+        columns['kinds'].append(_product_kind(product))
+        columns['active'].append(product.is_active)
+    encoded = [text.encode() for text in string_ids]
+    columns['string_offsets'].append(0)
+    for text in encoded:
+        columns['string_offsets'].append(columns['string_offsets'][-1] + len(text))
+    columns['strings'].frombytes(b''.join(encoded))
+    rows = len(columns['prices'])
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, rows, len(encoded), len(columns['strings']),
+                                        len(promotion_ids), len(chain_ids), len(columns['chain_items'])))
+        for name, _, _ in _layout(0, 0, 0, 0, 0, 0):
+            snapshot_file.write(columns[name].tobytes())
+    return rows
+
+
+class _StringColumn:
+    """Sequence of strings of a column of string ids, decoded on access"""
+
+    def __init__(self, ids, strings):
+        """Creates a column over string ids and a string table"""
+        self._ids = ids
+        self._strings = strings
+
+    def __len__(self):
+        """Returns number of rows"""
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        """Returns string of a row"""
+        return self._strings[self._ids[index]]
+
+
+class _StringTable:
+    """Interned strings of a snapshot, decoded on access"""
+
+    def __init__(self, offsets, data):
+        """Creates a table over string end offsets and UTF-8 bytes"""
+        self._offsets = offsets
+        self._data = data
+
+    def __getitem__(self, string_id):
+        """Returns a string by its id"""
+        return str(self._data[self._offsets[string_id]:self._offsets[string_id + 1]], 'utf-8')
+
+
+class _SkuColumn:
+    """Sequence of integer or string skus, decoded on access"""
+
+    def __init__(self, kinds, values, strings):
+        """Creates a column over sku kinds, values and a string table"""
+        self._kinds = kinds
+        self._values = values
+        self._strings = strings
+
+    def __len__(self):
+        """Returns number of rows"""
+        return len(self._values)
+
+    def __getitem__(self, index):
+        """Returns sku of a row"""
+        if self._kinds[index] == SKU_STRING:
+            return self._strings[self._values[index]]
+        return self._values[index]
+
+
+class _PromotionEntries:
+    """Interned promotion entries of catalog rows, looked up from chain ids on access"""
+
+    def __init__(self, chain_ids, chains):
+        """Creates entries over a column of chain ids and the chains they refer to"""
+        self._chain_ids = chain_ids
+        self._chains = chains
+        # row -> entry of rows whose promotions were changed after loading
+        self._changed = {}
+
+    def __getitem__(self, index):
+        """Returns tuple (promotions, compiled multiplier) of a row"""
+        entry = self._changed.get(index)
+        if entry is None:
+            entry = products.intern_promotions(self._chains[self._chain_ids[index]])
+        return entry
+
+    def __setitem__(self, index, entry):
+        """Replaces promotions of a row"""
+        self._changed[index] = entry
+
+
+class SnapshotCatalog(array_catalog.ArrayCatalog):
+    """Array catalog over a memory mapped snapshot file. Products are materialized on first access"""
+
+    def __init__(self, path):
+        """Maps a snapshot file into memory
+        :param path: file path
+        """
+        with open(path, 'rb') as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, *counts = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError('Not a catalog snapshot of a supported version.')
+        sections = {}
+        offset = HEADER.size
+        memory = memoryview(self._map)
+        for name, typecode, length in _layout(*counts):
+            size = length * struct.calcsize(typecode)
+            sections[name] = memory[offset:offset + size].cast(typecode)
+            offset += size
+        strings = _StringTable(sections['string_offsets'], sections['strings'])
+        promotion_list = []
+        for class_id, label_id, percent in zip(sections['promotion_classes'], sections['promotion_labels'],
+                                               sections['promotion_percents']):
+            promotion_class = getattr(promotions, strings[class_id])
+            if promotion_class is promotions.PercentDiscount:
+                promotion_list.append(promotion_class(strings[label_id], percent=percent))
+            else:
+                promotion_list.append(promotion_class(strings[label_id]))
+        starts = sections['chain_starts']
+        chains = [tuple(promotion_list[item] for item in sections['chain_items'][start:end])
+                  for start, end in zip(starts, starts[1:])]
+        self._names = _StringColumn(sections['name_ids'], strings)
+        self._skus = _SkuColumn(sections['sku_kinds'], sections['skus'], strings)
+        self._prices = sections['prices']
+        self._integer_prices = sections['integer_prices']
+        self._quantities = sections['quantities']
+        self._maximums = sections['maximums']
+        self._kinds = sections['kinds']
+        self._active = sections['active']
+        self._promotion_entries = _PromotionEntries(sections['chain_ids'], chains)
+        self._views = weakref.WeakValueDictionary()
+        self._view_listeners = ()
+
+    def append(self, kind, name, price, quantity=0, maximum=0, sku=None, promotions=()):
+        """Snapshot catalogs have a fixed number of rows"""
+        raise ValueError('Products can not be appended to a snapshot catalog.')
+
+
+def load(path):
+    """Returns SnapshotCatalog of a snapshot file"""
+    return SnapshotCatalog(path)
@@ -0,0 +1,129 @@
+"""In-process feed of store changes for downstream consumers.
+Changes are numbered and kept in a bounded ring buffer. Every consumer keeps its own cursor,
+the sequence number of the next change it wants, and pulls batches from it. Repeated changes
+of one product inside a batch are coalesced into one. A consumer whose cursor fell out of
+the buffer gets a resync batch and has to reload the store state instead of catching up.
+"""
+import collections
+import threading
+
+import store
+
+# changes after a cursor, cursor to ask for next and bool weather the consumer has to reload the store
+FeedBatch = collections.namedtuple('FeedBatch', ['changes', 'cursor', 'resync'])
+
+
+def coalesce(changes):
+    """Merges changes of the same product into one change keeping the oldest state.
+    Merged changes take the place of the latest of them. A product added and removed
+    again disappears, an added product stays added and a removed product stays removed
+    :param changes: list of Change tuples in the order they happened
+    :return: list of Change tuples
+    """
+    merged = {}
+    for change in changes:
+        first = merged.pop(change.product.sku, None)
+        if first is None:
+            merged[change.product.sku] = change
+        elif first.kind == 'added' and change.kind == 'removed':
+            continue
+        else:
+            kind = 'added' if first.kind == 'added' else 'removed' if change.kind == 'removed' else 'updated'
+            merged[change.product.sku] = store.Change(change.product, first.old_quantity, first.old_active, kind)
+    return list(merged.values())
+
+
+class ChangeFeed:
+    """Bounded, numbered feed of the changes of one store"""
+
+    def __init__(self, store_obj, capacity=4096):
+        """Subscribes the feed to a store
+        :param store_obj: Store class object
+        :param capacity: integer, number of most recent changes kept
+        """
+        if not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError('Feed capacity should be a positive integer.')
+        self._store = store_obj
+        self._capacity = capacity
+        self._buffer = [None] * capacity
+        self._next_sequence = 0
+        self._condition = threading.Condition()
+        self._subscriptions = []
+        self._closed = False
+        store_obj.subscribe(self._append)
+
+    @property
+    def sequence(self):
+        """Returns sequence number of the next change, the cursor of a consumer which is up to date"""
+        return self._next_sequence
+
+    @property
+    def oldest_sequence(self):
+        """Returns sequence number of the oldest change still in the buffer"""
+        return max(0, self._next_sequence - self._capacity)
+
+    def _append(self, changes):
+        """Store subscriber. Numbers changes and puts them into the ring buffer"""
+        with self._condition:
+            for change in changes:
+                self._buffer[self._next_sequence % self._capacity] = change
+                self._next_sequence += 1
+            self._condition.notify_all()
+
+    def poll(self, cursor, max_changes=None, timeout=0):
+        """Returns FeedBatch of changes from cursor on
+        :param cursor: integer, sequence number of the first wanted change
+        :param max_changes: integer, biggest number of changes read before coalescing, all if None
+        :param timeout: seconds to wait for a change if there is none, None to wait until one comes
+        :return: FeedBatch
+        """
+        with self._condition:
+            if timeout != 0:
+                self._condition.wait_for(lambda: self._closed or self._next_sequence > cursor, timeout)
+            if cursor < self.oldest_sequence:
+                return FeedBatch([], self._next_sequence, True)
+            end = self._next_sequence if max_changes is None else min(self._next_sequence, cursor + max_changes)
+            changes = [self._buffer[sequence % self._capacity] for sequence in range(cursor, end)]
+        return FeedBatch(coalesce(changes), max(end, cursor), False)
+
+    def subscribe(self, callback, cursor=None, max_changes=1024):
+        """Calls callback(batch) from a background thread for every batch of new changes
+        :param callback: callable taking a FeedBatch
+        :param cursor: integer, sequence number to start from, the current one if None
+        :param max_changes: integer, biggest number of changes read for one batch
+        :return: subscription handle for unsubscribe
+        """
+        stopped = threading.Event()
+
+        def deliver(cursor):
+            while not stopped.is_set():
+                batch = self.poll(cursor, max_changes, timeout=0.1)
+                if batch.changes or batch.resync:
+                    callback(batch)
+                cursor = batch.cursor
+
+        thread = threading.Thread(target=deliver, args=(self.sequence if cursor is None else cursor,),
+                                  name='change-feed-subscriber', daemon=True)
+        subscription = (thread, stopped)
+        self._subscriptions.append(subscription)
+        thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stops deliveries of a subscription and waits for the last one to finish"""
+        self._subscriptions.remove(subscription)
+        thread, stopped = subscription
+        stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def close(self):
+        """Unsubscribes the feed from the store and stops all subscriptions"""
+        self._store.unsubscribe(self._append)
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -1,7 +1,33 @@
+import sys
+
+import array_catalog
+import cart
+import catalog_snapshot
 import products
 import store
 import promotions
 
+PAGE_SIZE = 20
+NEXT_PAGE = '>'
+PREVIOUS_PAGE = '<'
+
+# product sku -> (product, product version, quantity already ordered, rendered listing text),
+# the oldest rows are forgotten after RENDERED_ROWS_LIMIT, so removed products don't stay forever
+_rendered_rows = {}
+RENDERED_ROWS_LIMIT = 10000
+# stores with more products print a notice before their name index is built by the first search
+SLOW_NAME_INDEX_SIZE = 100000
+
+
+def print_applied_promotion(promotion, product, quantity):
+    """Prints information about a promotion applied to an order line
+    :param promotion: Promotion class object
+    :param product: Product class object
+    :param quantity: integer, ordered quantity of the product
+    :return: None
+    """
+    print(f'\33[34mApplying "{promotion}" promotion for {product.name}\033[00m')
+
 
 def print_store_menu(functions_dict):
     """Prints user interface menu
@@ -15,27 +41,94 @@ def print_store_menu(functions_dict):
         print(f'{key}. {value[0]}')
 
 
-def print_all_products(store_obj, order_dict=()):
+def render_product_row(product, order_dict=()):
+    """Returns listing text of a product. Shows reduced amount of a stocked product already in the order.
+    The text is cached until the product quantity, activation or promotions change,
+    another product with the same sku gets its own text
+    :param product: Product class object
+    :param order_dict: order dictionary so far
+    :return: string
+    """
+    already_ordered = order_dict[product] if product in order_dict else 0
+    cached = _rendered_rows.get(product.sku)
+    if (cached is not None and cached[0] is product and cached[1] == product.version
+            and cached[2] == already_ordered):
+        return cached[3]
+    if already_ordered and not isinstance(product, (products.LimitedBase, products.NonStockedBase)):
+        text = product.show(already_ordered)
+    else:
+        text = str(product)
+    if cached is None and len(_rendered_rows) >= RENDERED_ROWS_LIMIT:
+        del _rendered_rows[next(iter(_rendered_rows))]
+    _rendered_rows[product.sku] = (product, product.version, already_ordered, text)
+    return text
+
+
+def iter_product_rows(store_obj, order_dict=(), start=0, stop=None):
+    """Lazily yields numbered listing rows of active products from start up to stop
+    :param store_obj: Store class object
+    :param order_dict: order dictionary so far
+    :param start: integer, index of the first product
+    :param stop: integer, index after the last product, None for all products
+    """
+    store_products = store_obj.all_products
+    stop = len(store_products) if stop is None else min(stop, len(store_products))
+    for index in range(start, stop):
+        yield f'{index + 1}. {render_product_row(store_products[index], order_dict)}'
+
+
+def page_count(store_obj, page_size=PAGE_SIZE):
+    """Returns number of listing pages of active products, at least 1"""
+    return max(1, -(-len(store_obj.all_products) // page_size))
+
+
+def print_all_products(store_obj, order_dict=(), page=None, page_size=PAGE_SIZE):
     """Prints information about all available product in store_obj.
-    Prints reduced amount of products if called during order creation
+    Prints reduced amount of products if called during order creation.
+    The listing is written as one block
     :param store_obj: Store class object
     :param order_dict: order dictionary so far
+    :param page: integer, number of the page to print starting from 0, None prints all products
+    :param page_size: integer, number of products per page
     :return: None
     """
-    print("-" * 5)
-    store_products = store_obj.all_products
+    lines = ["-" * 5]
     if store_obj.total_quantity > 0:
-        for index in range(len(store_products)):
-            if store_products[index] in order_dict:
-                if isinstance(store_products[index], (products.LimitedProduct, products.NonStockedProduct)):
-                    print(f'{index + 1}. {store_products[index]}')
-                else:
-                    print(f'{index + 1}. {store_products[index].show(order_dict[store_products[index]])}')
-            else:
-                print(f'{index + 1}. {str(store_products[index])}')
+        if page is None:
+            lines.extend(iter_product_rows(store_obj, order_dict))
+        else:
+            lines.extend(iter_product_rows(store_obj, order_dict, page * page_size, (page + 1) * page_size))
+            pages = page_count(store_obj, page_size)
+            if pages > 1:
+                lines.append(f'Page {page + 1} of {pages}. '
+                             f'Enter "{NEXT_PAGE}" for the next page, "{PREVIOUS_PAGE}" for the previous one.')
     else:
-        print("\u001b[31mCurrently we don't have any products. Come back later!\u001b[0m")
-    print("-" * 5)
+        lines.append("\u001b[31mCurrently we don't have any products. Come back later!\u001b[0m")
+    lines.append("-" * 5)
+    print("\n".join(lines))
+
+
+def turn_page(page, command, store_obj):
+    """Returns new page number after a page navigation command, keeps it in the range of pages"""
+    if command == NEXT_PAGE:
+        return min(page + 1, page_count(store_obj) - 1)
+    return max(page - 1, 0)
+
+
+def list_all_products(store_obj):
+    """Prints products page by page until user enters empty text
+    :param store_obj: Store class object
+    :return: None
+    """
+    page = 0
+    while True:
+        print_all_products(store_obj, page=page)
+        if page_count(store_obj) == 1:
+            return
+        command = input('Which page do you want? ').strip()
+        if command not in (NEXT_PAGE, PREVIOUS_PAGE):
+            return
+        page = turn_page(page, command, store_obj)
 
 
 def print_total_amount_in_store(store_obj):
@@ -62,21 +155,62 @@ def ask_user_function_number(func_dict):
         print('\u001b[31mError with your choice! Try again!\u001b[0m')
 
 
+def product_position(store_obj, product):
+    """Returns listing position of an active product, the store keeps the positions cached"""
+    return store_obj.product_position(product)
+
+
+def find_product_index(store_obj, query, order_dict=()):
+    """Searches products by typed name. Returns listing position of the only match,
+    or prints the best matches with their numbers and returns None
+    :param store_obj: Store class object
+    :param query: string, part of a product name
+    :param order_dict: order dictionary so far
+    :return: integer or None
+    """
+    if not store_obj.has_name_index and len(store_obj) >= SLOW_NAME_INDEX_SIZE:
+        print(f'Indexing names of {len(store_obj)} products for the first search, this may take a while...')
+    found = store_obj.search_products(query, page_size=PAGE_SIZE)
+    if len(found) == 1:
+        return product_position(store_obj, found[0])
+    if not found:
+        print(f'\u001b[31mThere is no product matching "{query}"\u001b[0m')
+        return None
+    print('\n'.join(f'{product_position(store_obj, product) + 1}. {render_product_row(product, order_dict)}'
+                    for product in found))
+    return None
+
+
 def ask_user_product_index(store_obj, order_dict=()):
-    """Shows products info, gets product index from user input
+    """Shows products info, gets product index from user input.
+    Products can be chosen by their number or by typing a part of their name
     :param store_obj: class Store object
     :param order_dict: order dictionary so far
     :return: integer
     """
     product_list = store_obj.all_products
+    page = 0
+    show_listing = True
     while True:
-        print_all_products(store_obj, order_dict)
-        print('When you want to finish your order, enter empty text.')
+        if show_listing:
+            print_all_products(store_obj, order_dict, page)
+            print('When you want to finish your order, enter empty text.')
+        show_listing = True
         index = input('Which product # do you want? ').strip()
         if index == "":
             return index
-        if index in [str(num) for num in list(range(1, len(product_list) + 1))]:
+        if index in (NEXT_PAGE, PREVIOUS_PAGE):
+            page = turn_page(page, index, store_obj)
+            continue
+        if index.isdigit() and 1 <= int(index) <= len(product_list):
             return int(index) - 1
+        if not index.isdigit():
+            found_index = find_product_index(store_obj, index, order_dict)
+            if found_index is not None:
+                return found_index
+            # keep found products on screen for choosing one of them by number
+            show_listing = False
+            continue
         print('\u001b[31mProduct # should be in a range '
               f'from 1 to {len(product_list)}\u001b[0m')
 
@@ -102,9 +236,9 @@ def ask_user_product_quantity(store_obj, product_index, order_dict=()):
         current_product = store_obj.all_products[product_index]
         already_ordered = order_dict.get(current_product, 0)
         in_store_quantity = current_product.quantity - already_ordered
-        if isinstance(current_product, (products.NonStockedProduct, products.LimitedProduct)):
+        if isinstance(current_product, (products.NonStockedBase, products.LimitedBase)):
             in_store_quantity = quantity
-        if (isinstance(current_product, products.LimitedProduct)
+        if (isinstance(current_product, products.LimitedBase)
                 and already_ordered + quantity > current_product.maximum):
             print(f'\u001b[31mMaximum amount of {str(current_product).split(",")[0]} per order '
                   f'is {current_product.maximum}. '
@@ -124,18 +258,14 @@ def calculate_order_price_and_order_dict(store_obj, orders, product_quantity_red
     from product quantity left in store
     :return: tuple (float, dict)
     """
-    order_dict = {}
     all_products = store_obj.all_products
-    order_price = 0
+    order_cart = cart.Cart(store_obj)
     for index, quantity in orders:
-        product = all_products[index]
-        if product in order_dict:
-            order_dict[product] += quantity
-        else:
-            order_dict[product] = quantity
-    for product, quantity in order_dict.items():
-        order_price += store_obj.order([(product, quantity)], product_quantity_reduction)
-    return round(order_price, 2), order_dict
+        order_cart.add(all_products[index], quantity)
+    order_dict = dict(order_cart.items())
+    if product_quantity_reduction:
+        return order_cart.checkout(), order_dict
+    return order_cart.total, order_dict
 
 
 def make_order(store_obj):
@@ -146,34 +276,32 @@ def make_order(store_obj):
     :return: None
     """
     all_products = store_obj.all_products
-    order = []
-    order_dict = {}
+    order_cart = cart.Cart(store_obj)
     while True:
-        index = ask_user_product_index(store_obj, order_dict)
+        index = ask_user_product_index(store_obj, order_cart)
         if index == "":
             break
-        quantity = ask_user_product_quantity(store_obj, index, order_dict)
+        quantity = ask_user_product_quantity(store_obj, index, order_cart)
         if quantity == "":
             continue
         print(f'\033[0;32m{quantity} {all_products[index].name} was added to your order\033[00m')
-        order.append((index, quantity))
-        total_price, order_dict = calculate_order_price_and_order_dict(store_obj, order, False)
-        print(f'\033[0;32mOrder total price so far is ${total_price}\033[00m')
-    if order:
+        order_cart.add(all_products[index], quantity)
+        print(f'\033[0;32mOrder total price so far is ${order_cart.total}\033[00m')
+    if order_cart:
         shipment_info = ""
-        stockable_in_order = any(isinstance(prod, products.Product)
-                             for prod in order_dict if not isinstance(prod, products.NonStockedProduct))
-        if all_products[4] not in order_dict and stockable_in_order:
+        ordered_products = "\n".join(f'\t{quantity} items: {product.name}'
+                                     for product, quantity in order_cart.items())
+        stockable_in_order = any(isinstance(prod, products.ProductBase)
+                                 for prod in order_cart if not isinstance(prod, products.NonStockedBase))
+        if all_products[4] not in order_cart and stockable_in_order:
             add_shipping = input('\33[34mYou have some stockable products in your order, but not the shipping.\n'
                                  'Would you like to add a shipping to your order '
                                  f'(+${all_products[-1].price})? Yes/no: \033[00m').strip().lower()
             if add_shipping in ('yes', 'y', ''):
-                order.append((len(all_products) - 1, 1))
+                order_cart.add(all_products[-1], 1)
                 shipment_info = f'\n\t1 item: {all_products[-1].name}'
-        ordered_products = "\n".join(f'\t{quantity} items: {product.name}'
-                                     for product, quantity in order_dict.items()) + shipment_info
-        print(f"\033[0;32mOrder made! You've ordered: \n{ordered_products}\n\033[00m")
-        total_price = calculate_order_price_and_order_dict(store_obj, order, True)[0]
+        print(f"\033[0;32mOrder made! You've ordered: \n{ordered_products + shipment_info}\n\033[00m")
+        total_price = order_cart.checkout()
         print(f"\033[0;32mTotal payment: ${total_price}\033[00m")
 
 
@@ -183,23 +311,27 @@ def start(store_obj):
     :return: None
     """
     func_dict = {
-        "1": ["List all products in store", print_all_products],
+        "1": ["List all products in store", list_all_products],
         "2": ["Show total amount in store", print_total_amount_in_store],
         "3": ["Make an order", make_order],
         "4": ["Quit"]
     }
-    while True:
-        print_store_menu(func_dict)
-        func_key = ask_user_function_number(func_dict)
-        if func_key == "4":
-            print('\033[0;32mThanks fo visiting "Best-Buy" store! Bye.\033[00m')
-            break
-        func_dict[func_key][1](store_obj)
+    promotions.subscribe(print_applied_promotion)
+    try:
+        while True:
+            print_store_menu(func_dict)
+            func_key = ask_user_function_number(func_dict)
+            if func_key == "4":
+                print('\033[0;32mThanks fo visiting "Best-Buy" store! Bye.\033[00m')
+                break
+            func_dict[func_key][1](store_obj)
+    finally:
+        promotions.unsubscribe(print_applied_promotion)
 
 
-def main():
-    """Setups the Store and runs start function
-    :return: None
+def create_store():
+    """Creates the Store with initial stock of inventory and promotions
+    :return: Store class object
     """
     # setup initial stock of inventory
     product_list = [products.Product("MacBook Air M2", price=1450, quantity=100),
@@ -221,11 +353,22 @@ def main():
     product_list[2].set_promotion(second_half_price)
     product_list[3].set_promotion(thirty_percent)
 
-    best_buy = store.Store(product_list)
+    return store.Store(product_list)
+
+
+def main(snapshot_path=None):
+    """Setups the Store and runs start function
+    :param snapshot_path: optional catalog snapshot file to load the Store from
+    :return: None
+    """
+    if snapshot_path is None:
+        best_buy = create_store()
+    else:
+        best_buy = array_catalog.CatalogStore(catalog_snapshot.load(snapshot_path))
 
     # running dispatcher function
     start(best_buy)
 
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:2])
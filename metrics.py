@@ -0,0 +1,245 @@
+"""Opt-in latency and throughput instrumentation for orders, buys and promotions.
+Disabled by default: instrumented functions check one module flag and call straight through.
+When enabled, every thread accumulates into its own counters and histograms without locking.
+Shards are merged only when a snapshot or a Prometheus text dump is requested.
+"""
+import bisect
+import cProfile
+import functools
+import math
+import pstats
+import threading
+import time
+
+# upper bounds of latency histogram buckets in seconds
+BUCKETS = (0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+           0.01, 0.05, 0.1, 0.5, 1.0, math.inf)
+
+enabled = False
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_slow_order_hook = None
+
+
+def enable():
+    """Turns instrumentation on"""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Turns instrumentation off, keeps recorded values"""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Forgets all recorded values"""
+    with _shards_lock:
+        for counters, histograms in _shards:
+            counters.clear()
+            histograms.clear()
+
+
+def _shard():
+    """Returns (counters, histograms) dictionaries of the current thread"""
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = ({}, {})
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def increment(name, labels=(), value=1):
+    """Adds value to a counter
+    :param name: metric name
+    :param labels: tuple of (label name, label value) tuples
+    :param value: integer or float
+    """
+    counters = _shard()[0]
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, labels, seconds):
+    """Records a latency in a histogram
+    :param name: metric name
+    :param labels: tuple of (label name, label value) tuples
+    :param seconds: float
+    """
+    histograms = _shard()[1]
+    key = (name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        # per-bucket counts followed by sum and count of observations
+        histogram = histograms[key] = [0] * (len(BUCKETS) + 2)
+    histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+    histogram[-2] += seconds
+    histogram[-1] += 1
+
+
+def profile_slow_orders(threshold, callback, sample_every=100):
+    """Reports orders slower than threshold seconds to callback.
+    Every sample_every-th order of a thread runs under cProfile, slow sampled orders
+    are reported with their pstats.Stats, other slow orders with None
+    :param threshold: float, seconds
+    :param callback: callable(seconds, shopping_list, stats or None)
+    :param sample_every: integer, 0 disables profiling
+    """
+    global _slow_order_hook
+    _slow_order_hook = (threshold, callback, sample_every)
+
+
+def stop_profiling_slow_orders():
+    """Removes the slow order hook"""
+    global _slow_order_hook
+    _slow_order_hook = None
+
+
+def _product_labels(product):
+    """Returns metric labels of a product"""
+    return (('product', str(product.sku)),)
+
+
+def instrument_order(order):
+    """Decorator of Store.order recording latency, units and revenue of orders.
+    Orders without quantity reduction are only quotes, their units and revenue are not recorded
+    """
+    @functools.wraps(order)
+    def instrumented_order(store_obj, shopping_list, *args, **kwargs):
+        if not enabled:
+            return order(store_obj, shopping_list, *args, **kwargs)
+        shopping_list = list(shopping_list)
+        hook = _slow_order_hook
+        profiler = None
+        if hook and hook[2]:
+            _local.orders = getattr(_local, 'orders', 0) + 1
+            if _local.orders % hook[2] == 0:
+                profiler = cProfile.Profile()
+        reduces_stock = args[0] if args else kwargs.get('product_quantity_reduction', True)
+        # buys made by a quote are not sales either, instrumented_buy checks this flag
+        quoting = getattr(_local, 'quoting', False)
+        _local.quoting = quoting or not reduces_stock
+        started = time.perf_counter()
+        try:
+            if profiler is None:
+                total_price = order(store_obj, shopping_list, *args, **kwargs)
+            else:
+                total_price = profiler.runcall(order, store_obj, shopping_list, *args, **kwargs)
+        except ValueError:
+            increment('store_orders_rejected_total')
+            raise
+        finally:
+            _local.quoting = quoting
+        seconds = time.perf_counter() - started
+        observe('store_order_seconds', (), seconds)
+        increment('store_orders_total')
+        if reduces_stock:
+            increment('store_order_units_total', value=sum(quantity for _, quantity in shopping_list))
+            increment('store_order_revenue_total', value=total_price)
+        if hook and seconds > hook[0]:
+            hook[1](seconds, shopping_list, None if profiler is None else pstats.Stats(profiler))
+        return total_price
+    return instrumented_order
+
+
+def instrument_buy(buy):
+    """Decorator of Product.buy recording latency, units and revenue per product.
+    Units and revenue of quotes, buys without quantity reduction or made by a quoting order, are not recorded
+    """
+    @functools.wraps(buy)
+    def instrumented_buy(product, quantity, *args, **kwargs):
+        if not enabled:
+            return buy(product, quantity, *args, **kwargs)
+        started = time.perf_counter()
+        total_price = buy(product, quantity, *args, **kwargs)
+        labels = _product_labels(product)
+        observe('product_buy_seconds', labels, time.perf_counter() - started)
+        if not getattr(_local, 'quoting', False) and (args[0] if args else kwargs.get('reduce_product_quantity', True)):
+            increment('product_units_total', labels, quantity)
+            increment('product_revenue_total', labels, total_price)
+        return total_price
+    return instrumented_buy
+
+
+def record_promotion(promotion, product, seconds, applied):
+    """Records evaluation of a promotion multiplier for a product"""
+    labels = (('product', str(product.sku)), ('promotion', type(promotion).__name__))
+    observe('promotion_seconds', labels, seconds)
+    if applied:
+        increment('promotion_applied_total', labels)
+
+
+def _merged():
+    """Returns counters and histograms summed over all thread shards"""
+    counters, histograms = {}, {}
+    with _shards_lock:
+        shards = list(_shards)
+    for shard_counters, shard_histograms in shards:
+        for key, value in shard_counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in shard_histograms.copy().items():
+            merged = histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+            for position, value in enumerate(list(histogram)):
+                merged[position] += value
+    return counters, histograms
+
+
+def _bound(bucket):
+    """Returns Prometheus bucket bound label"""
+    return '+Inf' if bucket == math.inf else repr(bucket)
+
+
+def snapshot():
+    """Returns JSON-ready dictionary of all counters and histograms with cumulative buckets"""
+    counters, histograms = _merged()
+    result = {'counters': [], 'histograms': []}
+    for (name, labels), value in sorted(counters.items()):
+        result['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+    for (name, labels), histogram in sorted(histograms.items()):
+        cumulative, buckets = 0, {}
+        for bucket, count in zip(BUCKETS, histogram):
+            cumulative += count
+            buckets[_bound(bucket)] = cumulative
+        result['histograms'].append({'name': name, 'labels': dict(labels), 'buckets': buckets,
+                                     'sum': histogram[-2], 'count': histogram[-1]})
+    return result
+
+
+def _escape(value):
+    """Escapes a label value for Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels, extra=()):
+    """Formats labels as {name="value",...}"""
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def prometheus_text():
+    """Returns all metrics in Prometheus text exposition format"""
+    counters, histograms = _merged()
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name}{_label_text(labels)} {value}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bucket, count in zip(BUCKETS, histogram):
+            cumulative += count
+            lines.append(f'{name}_bucket{_label_text(labels, (("le", _bound(bucket)),))} {cumulative}')
+        lines.append(f'{name}_sum{_label_text(labels)} {histogram[-2]}')
+        lines.append(f'{name}_count{_label_text(labels)} {histogram[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,9 @@
+"""Percentiles of measured latencies, shared by the order service and the workload replay"""
+
+
+def percentile(ordered, percent):
+    """Returns nearest-rank percentile of an already sorted list, 0 for an empty list"""
+    if not ordered:
+        return 0
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
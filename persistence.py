@@ -0,0 +1,188 @@
+"""Durable inventory for a Store: an append-only write-ahead log of product changes
+plus periodic snapshots. The catalog itself (names, prices, promotions) still comes
+from code, only quantities and active states of products are persisted.
+
+Log records and snapshots hold absolute product states, so replaying a record twice
+is harmless. Every committed order is written as a single log record.
+"""
+import contextlib
+import json
+import os
+import threading
+
+import products
+
+LOG_NAME = 'inventory.log'
+SNAPSHOT_NAME = 'inventory.snapshot'
+
+# fsync after every committed change, after a group of changes, or hand every record to the OS
+# without fsync, so it survives a crash of the process but not of the machine
+DURABILITY_MODES = ('always', 'group', 'none')
+
+
+def _product_state(product):
+    """Returns JSON-ready state of a product: [sku, quantity, active]"""
+    return [product.sku, product.quantity, product.is_active]
+
+
+def _restore_state(store_obj, sku, quantity, active):
+    """Applies a persisted product state to the product of the store, ignores unknown skus"""
+    product = store_obj.get_product(sku)
+    if product is None:
+        return
+    product.quantity = quantity
+    if active:
+        product.activate()
+    else:
+        product.deactivate()
+
+
+def recover(store_obj, directory):
+    """Restores product states from the latest snapshot and the log tail.
+    Reading stops at the first incomplete or damaged log record.
+    :param store_obj: Store class object with the catalog already loaded
+    :param directory: journal directory
+    :return: tuple (last applied sequence number, byte length of the valid log prefix)
+    """
+    sequence = 0
+    snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        sequence = snapshot['seq']
+        for state in snapshot['products']:
+            _restore_state(store_obj, *state)
+    valid_length = 0
+    log_path = os.path.join(directory, LOG_NAME)
+    if os.path.exists(log_path):
+        with open(log_path, 'rb') as log_file:
+            for line in log_file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_length += len(line)
+                if record['seq'] <= sequence:
+                    continue
+                sequence = record['seq']
+                for state in record['changes']:
+                    _restore_state(store_obj, *state)
+    return sequence, valid_length
+
+
+class InventoryJournal:
+    """Write-ahead log of store product changes with group commit and periodic snapshots"""
+
+    def __init__(self, store_obj, directory, durability='group', group_size=64,
+                 group_interval=0.01, snapshot_every=10000):
+        """Recovers store state from the directory and starts logging its changes
+        :param store_obj: Store class object
+        :param directory: journal directory, created if missing
+        :param durability: 'always' fsyncs every committed change before the order returns,
+        'group' fsyncs after group_size records or group_interval seconds,
+        'none' writes every record to the operating system without fsync
+        :param group_size: number of records per group commit
+        :param group_interval: maximum delay of a group commit in seconds
+        :param snapshot_every: number of log records between snapshots, 0 disables snapshots
+        """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Durability should be one of {", ".join(DURABILITY_MODES)}.')
+        os.makedirs(directory, exist_ok=True)
+        self._store = store_obj
+        self._directory = directory
+        self._durability = durability
+        self._group_size = group_size
+        self._snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._sequence, valid_length = recover(store_obj, directory)
+        self._log_path = os.path.join(directory, LOG_NAME)
+        self._log = open(self._log_path, 'ab')
+        # drop a torn record left by a crash, so new records follow the valid prefix
+        self._log.truncate(valid_length)
+        self._unsynced = 0
+        self._since_snapshot = 0
+        self._snapshot_due = threading.Event()
+        self._closed = threading.Event()
+        self._worker = threading.Thread(target=self._run_background, args=(group_interval,), daemon=True)
+        self._worker.start()
+        store_obj.subscribe(self._append)
+
+    def _append(self, changes):
+        """Store subscriber. Writes one log record for a list of changes"""
+        with self._lock:
+            self._sequence += 1
+            record = {'seq': self._sequence, 'changes': [_product_state(change.product) for change in changes]}
+            self._log.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+            self._unsynced += 1
+            if self._durability == 'always' or (self._durability == 'group' and self._unsynced >= self._group_size):
+                self._sync()
+            elif self._durability == 'none':
+                self._log.flush()
+            self._since_snapshot += 1
+            if self._snapshot_every and self._since_snapshot >= self._snapshot_every:
+                self._snapshot_due.set()
+
+    def _sync(self):
+        """Flushes written records to disk. Must be called holding the journal lock"""
+        if self._unsynced:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    def _run_background(self, interval):
+        """Background thread. Syncs pending records of group commits at least every interval seconds
+        and writes snapshots when they are due
+        """
+        while not self._closed.wait(interval):
+            if self._snapshot_due.is_set():
+                self.snapshot()
+            elif self._durability == 'group':
+                with self._lock:
+                    self._sync()
+
+    def _write_snapshot(self):
+        """Writes states of all store products and starts a new log.
+        Must be called holding locks of all products and then the journal lock,
+        so no order is half applied in the snapshot
+        """
+        snapshot = {'seq': self._sequence,
+                    'products': [_product_state(product) for product in self._store]}
+        snapshot_path = os.path.join(self._directory, SNAPSHOT_NAME)
+        temporary_path = snapshot_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(snapshot, snapshot_file, separators=(',', ':'))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, snapshot_path)
+        # records up to the snapshot sequence are skipped on replay, so a crash
+        # before the truncation below only leaves records that are ignored
+        self._log.truncate(0)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = 0
+        self._since_snapshot = 0
+        self._snapshot_due.clear()
+
+    def snapshot(self):
+        """Writes a snapshot now. Waits for orders in progress to finish"""
+        with contextlib.ExitStack() as stack:
+            for lock in products.ordered_locks(self._store):
+                stack.enter_context(lock)
+            with self._lock:
+                self._write_snapshot()
+
+    def flush(self):
+        """Syncs all written records to disk"""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        """Stops logging store changes, syncs and closes the log"""
+        self._store.unsubscribe(self._append)
+        self._closed.set()
+        self._worker.join()
+        with self._lock:
+            self._sync()
+            self._log.close()
@@ -0,0 +1,89 @@
+import bisect
+import itertools
+import math
+
+
+class PriceIndex:
+    """Products kept sorted by price. Products with equal prices keep the order they were added in.
+    Lookups are logarithmic plus the size of the result
+    """
+
+    def __init__(self):
+        """Creates an empty index"""
+        # sorted (price, sequence number, product) entries, sequence numbers are unique,
+        # so products themselves are never compared
+        self._entries = []
+        self._entry_of = {}
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        """Returns number of indexed products"""
+        return len(self._entries)
+
+    def __contains__(self, product):
+        """Returns bool weather product is indexed"""
+        return product.sku in self._entry_of
+
+    def _new_entry(self, product):
+        """Creates and remembers the entry of a product"""
+        entry = (product.price, next(self._sequence), product)
+        self._entry_of[product.sku] = entry
+        return entry
+
+    def add(self, product):
+        """Adds a product to the index"""
+        if product.sku not in self._entry_of:
+            bisect.insort(self._entries, self._new_entry(product))
+
+    def add_many(self, product_list):
+        """Adds many products at once, sorting the index once instead of inserting one by one"""
+        self._entries.extend(self._new_entry(product) for product in product_list
+                             if product.sku not in self._entry_of)
+        self._entries.sort()
+
+    def remove(self, product):
+        """Removes a product from the index, does nothing if it is not indexed"""
+        entry = self._entry_of.pop(product.sku, None)
+        if entry is not None:
+            del self._entries[bisect.bisect_left(self._entries, entry)]
+
+    def remove_many(self, product_list):
+        """Removes many products at once, filtering the index once instead of deleting one by one"""
+        sequences = {self._entry_of.pop(product.sku)[1] for product in product_list if product.sku in self._entry_of}
+        if sequences:
+            self._entries = [entry for entry in self._entries if entry[1] not in sequences]
+
+    def between(self, low, high):
+        """Returns list of products with low <= price <= high, cheapest first"""
+        start = bisect.bisect_left(self._entries, (low,))
+        end = bisect.bisect_right(self._entries, (high, math.inf))
+        return [entry[2] for entry in self._entries[start:end]]
+
+    def cheapest(self, count):
+        """Returns list of count cheapest products, cheapest first"""
+        return [entry[2] for entry in self._entries[:max(count, 0)]]
+
+    def most_expensive(self, count):
+        """Returns list of count most expensive products, most expensive first"""
+        if count <= 0:
+            return []
+        return [entry[2] for entry in reversed(self._entries[-count:])]
+
+    def page(self, number, size, descending=False):
+        """Returns list of products of a page in price order
+        :param number: integer, page number starting from 0
+        :param size: integer, number of products per page
+        :param descending: bool, True to start from the most expensive products
+        :return: list
+        """
+        start = number * size
+        if descending:
+            end = len(self._entries) - start
+            entries = reversed(self._entries[max(end - size, 0):max(end, 0)])
+        else:
+            entries = self._entries[start:start + size]
+        return [entry[2] for entry in entries]
+
+    def products(self):
+        """Returns list of all indexed products in price order"""
+        return [entry[2] for entry in self._entries]
@@ -0,0 +1,135 @@
+"""Columnar pricing engine. Quotes large batches of order lines in one vectorized pass.
+Requires numpy, which is optional for the rest of the store.
+"""
+import time
+
+import numpy as np
+
+import products
+
+STOCKED = 0
+NON_STOCKED = 1
+LIMITED = 2
+
+
+class PriceColumns:
+    """Struct of arrays view of store products: prices, quantities, maximums,
+    product kinds and promotion chain codes. Row i describes store.all_products[i]
+    at the moment the view was built. Promotions of the store schedule are applied when quoting.
+    """
+
+    def __init__(self, store):
+        """Builds the columns from active products of a Store object"""
+        self._products = store.all_products
+        self._schedule = store.schedule
+        size = len(self._products)
+        self.prices = np.empty(size, dtype=np.float64)
+        self.quantities = np.empty(size, dtype=np.int64)
+        self.maximums = np.full(size, -1, dtype=np.int64)
+        self.kinds = np.full(size, STOCKED, dtype=np.int8)
+        self.promotion_codes = np.empty(size, dtype=np.int32)
+        self.promotion_chains = []
+        chain_codes = {}
+        for row, product in enumerate(self._products):
+            self.prices[row] = product.price
+            self.quantities[row] = product.quantity
+            if isinstance(product, products.NonStockedBase):
+                self.kinds[row] = NON_STOCKED
+            elif isinstance(product, products.LimitedBase):
+                self.kinds[row] = LIMITED
+                self.maximums[row] = product.maximum
+            # promotions are stacked in the same order the scalar path multiplies them
+            chain = tuple(product._promotions)
+            if chain not in chain_codes:
+                chain_codes[chain] = len(self.promotion_chains)
+                self.promotion_chains.append(chain)
+            self.promotion_codes[row] = chain_codes[chain]
+
+    def __len__(self):
+        """Returns number of rows in the view"""
+        return len(self._products)
+
+    @property
+    def products(self):
+        """Returns products in row order"""
+        return self._products
+
+    def _validate(self, sku_index, quantity):
+        """Raises ValueError for the first order line the scalar path would reject"""
+        if sku_index.size and (sku_index.min() < 0 or sku_index.max() >= len(self)):
+            raise ValueError(f'Product index should be in a range from 0 to {len(self) - 1}.')
+        kinds = self.kinds[sku_index]
+        invalid = quantity <= 0
+        invalid |= (kinds == STOCKED) & (quantity > self.quantities[sku_index])
+        invalid |= (kinds == LIMITED) & (quantity > self.maximums[sku_index])
+        if invalid.any():
+            line = int(np.flatnonzero(invalid)[0])
+            product = self._products[sku_index[line]]
+            raise ValueError(f'Line {line}: quantity {quantity[line]} of {product.name} can not be ordered.')
+
+    def _scheduled_codes(self, sku_index, at):
+        """Returns chain codes of order lines with scheduled promotions stacked after product promotions
+        and the list of chains the codes refer to
+        """
+        chains = list(self.promotion_chains)
+        chain_codes = {chain: code for code, chain in enumerate(chains)}
+        rows, line_rows = np.unique(sku_index, return_inverse=True)
+        row_codes = self.promotion_codes[rows]
+        for position, row in enumerate(rows.tolist()):
+            scheduled = self._schedule.active(self._products[row].sku, at)
+            if scheduled:
+                chain = chains[row_codes[position]]
+                chain = chain + tuple(promo for promo in scheduled if promo not in chain)
+                if chain not in chain_codes:
+                    chain_codes[chain] = len(chains)
+                    chains.append(chain)
+                row_codes[position] = chain_codes[chain]
+        return row_codes[line_rows], chains
+
+    def quote(self, sku_index, quantity, order_id=None, at=None):
+        """Prices order lines without changing the store.
+        :param sku_index: integer array of row numbers in this view
+        :param quantity: integer array of ordered quantities
+        :param order_id: optional integer array mapping every line to an order number
+        :param at: timestamp scheduled promotions are evaluated at, now if not provided
+        :return: tuple (line totals array, order totals array or None)
+        """
+        sku_index = np.asarray(sku_index, dtype=np.intp)
+        quantity = np.asarray(quantity, dtype=np.int64)
+        if sku_index.shape != quantity.shape:
+            raise ValueError('Product indexes and quantities should have the same length.')
+        self._validate(sku_index, quantity)
+        multipliers = np.ones(quantity.shape, dtype=np.float64)
+        if self._schedule is not None and len(self._schedule):
+            codes, chains = self._scheduled_codes(sku_index, time.time() if at is None else at)
+        else:
+            codes, chains = self.promotion_codes[sku_index], self.promotion_chains
+        for code, chain in enumerate(chains):
+            if not chain:
+                continue
+            lines = np.flatnonzero(codes == code)
+            if not lines.size:
+                continue
+            line_quantity = quantity[lines]
+            chain_multiplier = np.ones(lines.size, dtype=np.float64)
+            for promo in chain:
+                chain_multiplier = chain_multiplier * promo.multiplier(line_quantity)
+            multipliers[lines] = chain_multiplier
+        line_totals = _round_cents(self.prices[sku_index] * multipliers * quantity)
+        if order_id is None:
+            return line_totals, None
+        order_id = np.asarray(order_id, dtype=np.intp)
+        return line_totals, np.bincount(order_id, weights=line_totals)
+
+
+def _round_cents(values):
+    """Rounds to cents exactly like the builtin round(value, 2).
+    np.round scales by 100 first, which can move values lying close to a half cent
+    to the other side, so those few values are re-rounded with the builtin round.
+    """
+    scaled = values * 100
+    rounded = np.round(scaled) / 100
+    close_to_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for index in close_to_half:
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
@@ -1,23 +1,87 @@
-class Product:
-    """Defines Product class object and its methods"""
+import functools
+import itertools
+import threading
+
+import metrics
+import promotions
+
+_sku_counter = itertools.count(1)
+
+# products share a fixed pool of reentrant locks instead of owning one each
+_LOCK_STRIPES = tuple(threading.RLock() for _ in range(1024))
+
+# interned (promotions tuple, compiled multiplier) pairs shared by products with the same promotions.
+# The oldest chains are forgotten past INTERNED_PROMOTIONS_LIMIT, products keep the entries they hold,
+# only new products with a forgotten chain get an entry of their own
+INTERNED_PROMOTIONS_LIMIT = 4096
+_NO_PROMOTIONS = ((), None)
+_interned_promotions = {}
+_interning_lock = threading.Lock()
+
+
+def intern_promotions(chain):
+    """Returns shared tuple of promotions and its compiled multiplier function
+    :param chain: ordered iterable of Promotion objects
+    :return: tuple (tuple of promotions, function or None)
+    """
+    chain = tuple(chain)
+    if not chain:
+        return _NO_PROMOTIONS
+    entry = _interned_promotions.get(chain)
+    if entry is None:
+        with _interning_lock:
+            entry = _interned_promotions.get(chain)
+            if entry is None:
+                if len(_interned_promotions) >= INTERNED_PROMOTIONS_LIMIT:
+                    del _interned_promotions[next(iter(_interned_promotions))]
+                entry = _interned_promotions[chain] = (chain, promotions.compile_promotions(chain))
+    return entry
+
+
+@functools.lru_cache(maxsize=1024)
+def _extended_multiplier(chain, extra_promotions):
+    """Returns compiled multiplier of a product chain followed by extra promotions it doesn't have.
+    Kept apart from interned chains, so short-lived combinations of scheduled promotions
+    don't push product chains out
+    """
+    return promotions.compile_promotions(chain + tuple(promo for promo in extra_promotions if promo not in chain))
+
+
+def ordered_locks(product_list):
+    """Returns distinct locks of products in the fixed global order they must be taken in"""
+    locks = {id(product.lock): product.lock for product in product_list}
+    return [locks[key] for key in sorted(locks)]
 
-    def __init__(self, name, price, quantity):
-        """Initialises an instance of Product class, assigns instance variables
-        :param name: string
-        :param price: integer or float
-        :param quantity: integer
-        """
-        if not name:
-            raise ValueError('Product name can not be empty.')
-        self._name = name
-        if not isinstance(price, (int, float)) or price < 0:
-            raise ValueError('Price should be a positive number.')
-        self._price = price
-        if not isinstance(quantity, int) or quantity < 0:
-            raise ValueError('Quantity should be a positive number.')
-        self._quantity = quantity
-        self._active = True
-        self._promotions = set()
+
+class ProductBase:
+    """Behaviour shared by all products. Subclasses provide the product fields,
+    either as slots of their own or as properties reading them from elsewhere.
+    Kinds of products are told apart by ProductBase, NonStockedBase and LimitedBase,
+    which also cover catalog views
+    """
+
+    __slots__ = ('_listeners', '_version', '_price_version')
+
+    def __getstate__(self):
+        """Returns picklable state of the product. Listeners and the compiled pricing function are left out"""
+        return self._fields_state(type(self))
+
+    def _fields_state(self, product_class):
+        """Returns dictionary of the slot fields of a product class read from this product"""
+        state = {}
+        for cls in product_class.__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name not in ('_listeners', '_promotion_multiplier') and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        """Restores an unpickled product without listeners"""
+        for name, value in state.items():
+            if name != '_promotions':
+                setattr(self, name, value)
+        self._set_promotions(state.get('_promotions', ()))
+        self._listeners = ()
 
     def __hash__(self):
         """Makes product instances hashable"""
@@ -53,9 +117,11 @@ class Product:
         """Sets product quantity"""
         if not isinstance(quantity, int) or quantity < 0:
             raise ValueError('Quantity should be a positive integer.')
+        old_quantity, old_active = self._quantity, self._active
         self._quantity = quantity
         if self._quantity == 0:
-            self.deactivate()
+            self._active = False
+        self._notify(old_quantity, old_active)
 
     @property
     def price(self):
@@ -69,11 +135,55 @@ class Product:
 
     def activate(self):
         """Activates the product"""
-        self._active = True
+        if not self._active:
+            self._active = True
+            self._notify(self._quantity, False)
 
     def deactivate(self):
         """Deactivates the product"""
-        self._active = False
+        if self._active:
+            self._active = False
+            self._notify(self._quantity, True)
+
+    def _set_stock(self, quantity, active):
+        """Sets quantity and active state together and notifies listeners once"""
+        old_quantity, old_active = self._quantity, self._active
+        self._quantity = quantity
+        self._active = active
+        self._notify(old_quantity, old_active)
+
+    def add_listener(self, listener):
+        """Subscribes a callable to product changes.
+        The listener is called as listener(product, old_quantity, old_active)
+        after the quantity or the active state of the product has changed
+        """
+        self._listeners = self._listeners + (listener,)
+
+    def remove_listener(self, listener):
+        """Unsubscribes a callable from product changes"""
+        listeners = list(self._listeners)
+        listeners.remove(listener)
+        self._listeners = tuple(listeners)
+
+    @property
+    def version(self):
+        """Returns a counter which grows every time quantity, activation or promotions change"""
+        return self._version
+
+    @property
+    def price_version(self):
+        """Returns a counter which grows every time price, promotions or activation change.
+        Unlike version it doesn't change with quantity, so quoted prices can be cached by it
+        """
+        return self._price_version
+
+    def _notify(self, old_quantity, old_active):
+        """Calls all product listeners with the state the product had before the change"""
+        self._version += 1
+        if self._active != old_active:
+            self._price_version += 1
+        for listener in self._listeners:
+            listener(self, old_quantity, old_active)
 
     def __str__(self, quantity=0):
         """Returns product info as f-string"""
@@ -94,42 +204,119 @@ class Product:
         """Returns product name"""
         return self._name
 
-    def buy(self, quantity, reduce_product_quantity=True):
+    @property
+    def sku(self):
+        """Returns product identity key"""
+        return self._sku
+
+    @metrics.instrument_buy
+    def buy(self, quantity, reduce_product_quantity=True, extra_promotions=()):
         """Implements buy functionality.
         Reduces product amount if provided quantity is valid and reduce_product_quantity is True.
         Applies promotions, returns total price
         :param quantity: amount of a product bought
         :param reduce_product_quantity: bool
+        :param extra_promotions: promotions applied after the product promotions, e.g. scheduled ones
         :return: float
         """
+        with self.lock:
+            self.validate_order(quantity)
+            if reduce_product_quantity:
+                self.quantity = self._quantity - quantity
+            return self._total_price(quantity, extra_promotions)
+
+    def quote(self, quantity, extra_promotions=()):
+        """Returns total price of quantity of the product without buying it
+        :param quantity: amount of a product
+        :param extra_promotions: promotions applied after the product promotions, e.g. scheduled ones
+        :return: float
+        """
+        self.validate_order(quantity)
+        return self._total_price(quantity, extra_promotions)
+
+    @property
+    def lock(self):
+        """Returns reentrant lock guarding product quantity changes.
+        Locks are striped, so different products may share a lock
+        """
+        return _LOCK_STRIPES[(id(self) >> 4) % len(_LOCK_STRIPES)]
+
+    def validate_order(self, quantity):
+        """Raises ValueError if quantity of the product can not be ordered
+        :param quantity: amount of a product to be ordered
+        :return: None
+        """
         if not isinstance(quantity, int) or quantity <= 0:
             raise ValueError('Quantity should be a positive integer.')
         if quantity > self._quantity:
             raise ValueError(f'Quantity can not be bigger than items in store ({self._quantity}).')
-        if reduce_product_quantity:
-            self.quantity = self._quantity - quantity
-        if self._promotions:
-            promo_multiplier = 1
-            for promo in self._promotions:
-                promo_multiplier *= promo.apply_promotion(self, quantity)
-            return round(self._price * promo_multiplier * quantity, 2)
-        return round(quantity * self._price, 2)
+
+    def _total_price(self, quantity, extra_promotions=()):
+        """Returns price of quantity of the product with all promotions applied.
+        Extra promotions are stacked after the product promotions
+        """
+        promotion_multiplier = self._promotion_multiplier
+        if extra_promotions:
+            promotion_multiplier = _extended_multiplier(self._promotions, tuple(extra_promotions))
+        if promotion_multiplier is None:
+            return round(quantity * self._price, 2)
+        return round(self._price * promotion_multiplier(self, quantity) * quantity, 2)
+
+    def _set_promotions(self, chain):
+        """Replaces the product promotions and their compiled pricing function"""
+        self._promotions, self._promotion_multiplier = intern_promotions(chain)
 
     def set_promotion(self, promotion):
-        """Adds a promotion to the product promotions set"""
-        self._promotions.add(promotion)
+        """Adds a promotion to the product promotions.
+        Promotions are stacked in the order they were added
+        """
+        if promotion not in self._promotions:
+            self._set_promotions(self._promotions + (promotion,))
+            self._version += 1
+            self._price_version += 1
 
     def remove_promotion(self, promotion):
-        """Removes a promotion from the product promotions set"""
-        self._promotions.remove(promotion)
+        """Removes a promotion from the product promotions"""
+        if promotion not in self._promotions:
+            raise KeyError(promotion)
+        self._set_promotions(promo for promo in self._promotions if promo is not promotion)
+        self._version += 1
+        self._price_version += 1
 
 
-class NonStockedProduct(Product):
-    """Non stocked product class"""
+class Product(ProductBase):
+    """Defines Product class object and its methods"""
 
-    def __init__(self, name, price):
-        """Instance initiation"""
-        super().__init__(name, price, quantity=0)
+    __slots__ = ('_name', '_price', '_quantity', '_sku', '_active', '_promotions', '_promotion_multiplier')
+
+    def __init__(self, name, price, quantity, sku=None):
+        """Initialises an instance of Product class, assigns instance variables
+        :param name: string
+        :param price: integer or float
+        :param quantity: integer
+        :param sku: hashable identity key, assigned automatically if not provided
+        """
+        if not name:
+            raise ValueError('Product name can not be empty.')
+        self._name = name
+        if not isinstance(price, (int, float)) or price < 0:
+            raise ValueError('Price should be a positive number.')
+        self._price = price
+        if not isinstance(quantity, int) or quantity < 0:
+            raise ValueError('Quantity should be a positive number.')
+        self._quantity = quantity
+        self._sku = next(_sku_counter) if sku is None else sku
+        self._active = True
+        self._promotions, self._promotion_multiplier = intern_promotions(())
+        self._listeners = ()
+        self._version = 0
+        self._price_version = 0
+
+
+class NonStockedBase(ProductBase):
+    """Behaviour of non stocked products"""
+
+    __slots__ = ()
 
     def __str__(self, quantity=0):
         """Returns product info as f-string"""
@@ -138,30 +325,39 @@ class NonStockedProduct(Product):
             result += "".join([", " + str(promo_name) for promo_name in self._promotions])
         return result
 
-    def buy(self, quantity, reduce_product_quantity=False):
+    @metrics.instrument_buy
+    def buy(self, quantity, reduce_product_quantity=False, extra_promotions=()):
         """Implements buy functionality. Applies promotions, returns total price
         :param quantity: amount of a product bought
         :param reduce_product_quantity: bool
+        :param extra_promotions: promotions applied after the product promotions
         :return: float
         """
+        with self.lock:
+            self.validate_order(quantity)
+            self.quantity = quantity
+            return self._total_price(quantity, extra_promotions)
+
+    def validate_order(self, quantity):
+        """Raises ValueError if quantity is not a positive integer"""
         if not isinstance(quantity, int) or quantity <= 0:
             raise ValueError('Quantity should be a positive integer.')
-        self.quantity = quantity
-        if self._promotions:
-            promo_multiplier = 1
-            for promo in self._promotions:
-                promo_multiplier *= promo.apply_promotion(self, quantity)
-            return round(self._price * promo_multiplier * quantity, 2)
-        return round(quantity * self._price, 2)
 
 
-class LimitedProduct(Product):
-    """Class for Limited products"""
+class NonStockedProduct(NonStockedBase, Product):
+    """Non stocked product class"""
 
-    def __init__(self, name, price, maximum, quantity=0):
-        """instance initialization"""
-        super().__init__(name, price, quantity)
-        self._maximum = maximum
+    __slots__ = ()
+
+    def __init__(self, name, price, sku=None):
+        """Instance initiation"""
+        super().__init__(name, price, quantity=0, sku=sku)
+
+
+class LimitedBase(ProductBase):
+    """Behaviour of limited products"""
+
+    __slots__ = ()
 
     def __str__(self, quantity=0):
         """Presents instance info as a string"""
@@ -179,17 +375,31 @@ class LimitedProduct(Product):
         """Returns maximum amount of instance product per order"""
         return self._maximum
 
-    def buy(self, quantity, reduce_product_quantity=False):
+    @metrics.instrument_buy
+    def buy(self, quantity, reduce_product_quantity=False, extra_promotions=()):
         """Implements buy functionality. Applies promotions, returns total price
         :param quantity: amount of a product bought
         :param reduce_product_quantity: bool
+        :param extra_promotions: promotions applied after the product promotions
         :return: float
         """
-        if quantity <= self._maximum:
-            if self._promotions:
-                promo_multiplier = 1
-                for promo in self._promotions:
-                    promo_multiplier *= promo.apply_promotion(self, quantity)
-                return round(self._price * promo_multiplier * quantity, 2)
-            return round(quantity * self._price, 2)
-        return f'Error while make order! Only {self._maximum} {self.name()} is allowed!'
+        self.validate_order(quantity)
+        return self._total_price(quantity, extra_promotions)
+
+    def validate_order(self, quantity):
+        """Raises ValueError if quantity is not a positive integer or exceeds maximum per order"""
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError('Quantity should be a positive integer.')
+        if quantity > self._maximum:
+            raise ValueError(f'Error while make order! Only {self._maximum} {self.name} is allowed!')
+
+
+class LimitedProduct(LimitedBase, Product):
+    """Class for Limited products"""
+
+    __slots__ = ('_maximum',)
+
+    def __init__(self, name, price, maximum, quantity=0, sku=None):
+        """instance initialization"""
+        super().__init__(name, price, quantity, sku)
+        self._maximum = maximum
@@ -1,5 +1,66 @@
+import time
 from abc import ABC, abstractmethod
 
+import metrics
+
+# callables notified as subscriber(promotion, product, quantity) when a promotion is applied
+_subscribers = []
+
+
+def subscribe(subscriber):
+    """Subscribes a callable to promotion application events"""
+    _subscribers.append(subscriber)
+
+
+def unsubscribe(subscriber):
+    """Unsubscribes a callable from promotion application events"""
+    _subscribers.remove(subscriber)
+
+
+def _notify_applied(promotion, product, quantity):
+    """Reports an applied promotion to all subscribers"""
+    for subscriber in _subscribers:
+        subscriber(promotion, product, quantity)
+
+
+def compile_promotions(promotions):
+    """Compiles an ordered collection of promotions into one multiplier function.
+    The returned function multiplies promotion multipliers in the given order
+    and reports applied promotions only if there are subscribers
+    :param promotions: iterable of Promotion objects
+    :return: function (product, quantity) -> float
+    """
+    chain = tuple(promotions)
+    multipliers = tuple(promo.multiplier for promo in chain)
+
+    def chain_multiplier(product, quantity):
+        """Returns stacked multiplier of the compiled promotions"""
+        if metrics.enabled:
+            return _measured_chain_multiplier(chain, product, quantity)
+        promo_multiplier = 1
+        for multiplier in multipliers:
+            promo_multiplier *= multiplier(quantity)
+        if _subscribers:
+            for promo in chain:
+                if promo.applies(quantity):
+                    _notify_applied(promo, product, quantity)
+        return promo_multiplier
+
+    return chain_multiplier
+
+
+def _measured_chain_multiplier(chain, product, quantity):
+    """Same as a compiled chain multiplier, records every promotion in metrics"""
+    promo_multiplier = 1
+    for promo in chain:
+        started = time.perf_counter()
+        promo_multiplier *= promo.multiplier(quantity)
+        applied = promo.applies(quantity)
+        metrics.record_promotion(promo, product, time.perf_counter() - started, applied)
+        if applied and _subscribers:
+            _notify_applied(promo, product, quantity)
+    return promo_multiplier
+
 
 class Promotion(ABC):
     """abstract class for all promotions"""
@@ -12,29 +73,50 @@ class Promotion(ABC):
         """magic method for print() and str() functions"""
         return self._name
 
-    @abstractmethod
+    def applies(self, quantity):
+        """returns True if the promotion changes the price of quantity of product"""
+        return True
+
     def apply_promotion(self, product, quantity):
-        """abstract method"""
+        """reports the promotion to subscribers if it applies, returns its price multiplier"""
+        started = time.perf_counter() if metrics.enabled else 0
+        multiplier = self.multiplier(quantity)
+        applied = self.applies(quantity)
+        if metrics.enabled:
+            metrics.record_promotion(self, product, time.perf_counter() - started, applied)
+        if applied:
+            _notify_applied(self, product, quantity)
+        return multiplier
+
+    @abstractmethod
+    def multiplier(self, quantity):
+        """abstract method. Returns price multiplier for a quantity.
+        Must be a closed-form expression so it also works on numpy integer arrays
+        """
         pass
 
 
 class SecondHalfPrice(Promotion):
     """promotion class for 'Second half price' promotion"""
 
-    def apply_promotion(self, product, quantity):
-        """calculates price multiplier of the promotion depending on quantity of product"""
-        if quantity >= 2:
-            print(f'\33[34mApplying "{self._name}" promotion for {product.name}\033[00m')
+    def applies(self, quantity):
+        """promotion applies starting from the second product"""
+        return quantity >= 2
+
+    def multiplier(self, quantity):
+        """returns price multiplier of the promotion for quantity of product"""
         return ((quantity // 2) * 1.5 + quantity % 2) / quantity
 
 
 class ThirdOneFree(Promotion):
     """promotion class for 'Third one free' promotion"""
 
-    def apply_promotion(self, product, quantity):
-        """calculates price multiplier of the promotion depending on quantity of product"""
-        if quantity >= 3:
-            print(f'\33[34mApplying "{self._name}" promotion for {product.name}\033[00m')
+    def applies(self, quantity):
+        """promotion applies starting from the third product"""
+        return quantity >= 3
+
+    def multiplier(self, quantity):
+        """returns price multiplier of the promotion for quantity of product"""
         return ((quantity // 3) * 2 + quantity % 3) / quantity
 
 
@@ -46,7 +128,6 @@ class PercentDiscount(Promotion):
         super().__init__(name)
         self._percent = percent
 
-    def apply_promotion(self, product, quantity):
-        """calculates price multiplier of the promotion depending on quantity of product and discount percent"""
-        print(f'\33[34mApplying "{self._name}" promotion for {product.name}\033[00m')
+    def multiplier(self, quantity):
+        """returns price multiplier of the promotion depending on discount percent"""
         return (100 - self._percent) / 100
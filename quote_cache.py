@@ -0,0 +1,66 @@
+import collections
+import threading
+
+
+class QuoteCache:
+    """Bounded least recently used cache of quoted prices per product and quantity.
+    An entry is used only while the product is the same object with the same price version,
+    so a price quoted before a promotion or activation change is never returned.
+    Stock is validated on every quote, cached or not.
+    Promotion subscribers are notified only when a price is actually calculated
+    """
+
+    def __init__(self, maxsize=4096):
+        """Creates an empty cache
+        :param maxsize: integer, maximum number of cached prices
+        """
+        if not isinstance(maxsize, int) or maxsize <= 0:
+            raise ValueError('Cache size should be a positive integer.')
+        self.maxsize = maxsize
+        # (sku, quantity) -> (product, price version, price), least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        """Returns number of cached prices"""
+        return len(self._entries)
+
+    def quote(self, product, quantity):
+        """Returns total price of quantity of the product without buying it
+        :param product: Product class object
+        :param quantity: amount of a product
+        :return: float
+        """
+        product.validate_order(quantity)
+        key = (product.sku, quantity)
+        price_version = product.price_version
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is product and entry[1] == price_version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        # calculated outside the lock, an entry stored with a version which changed meanwhile is never matched
+        price = product._total_price(quantity)
+        with self._lock:
+            self._entries[key] = (product, price_version, price)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return price
+
+    def clear(self):
+        """Removes all cached prices, keeps the statistics"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns dictionary with hits, misses, evictions, size and maxsize of the cache"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
@@ -0,0 +1,177 @@
+"""Promotions valid during time windows. Window boundaries split the time line into
+elementary segments, each knowing the windows valid in it, so the promotions of a moment
+are found with one binary search. Catalog wide windows share one time line, windows of
+some skus get a time line per sku. A new window only splits the segments at its two
+boundaries and joins the segments it covers, nothing is recalculated. Windows expire
+by themselves: nothing has to be changed on products when a window starts or ends,
+and windows which ended long ago are dropped while new ones are added.
+"""
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+
+class _Timeline:
+    """Sorted boundaries and for every segment from a boundary up to the next one
+    a tuple (windows valid in it in the order added, their distinct promotions).
+    The last segment reaches to the end of time
+    """
+
+    def __init__(self):
+        """Creates a time line without windows"""
+        self._bounds = []
+        self._segments = []
+
+    def _split(self, moment):
+        """Makes a moment a segment boundary, returns index of the segment starting at it"""
+        position = bisect.bisect_left(self._bounds, moment)
+        if position == len(self._bounds) or self._bounds[position] != moment:
+            self._bounds.insert(position, moment)
+            self._segments.insert(position, self._segments[position - 1] if position else ((), ()))
+        return position
+
+    def add(self, window):
+        """Adds a (sequence number, start, end, promotion, skus) window newer than all added before"""
+        first = self._split(window[1])
+        last = self._split(window[2])
+        for position in range(first, last):
+            windows, promotions = self._segments[position]
+            if window[3] not in promotions:
+                promotions = promotions + (window[3],)
+            self._segments[position] = (windows + (window,), promotions)
+
+    def at(self, moment):
+        """Returns tuple (windows, promotions) valid at a moment"""
+        position = bisect.bisect_right(self._bounds, moment) - 1
+        if position < 0:
+            return (), ()
+        return self._segments[position]
+
+    def trim(self, before):
+        """Forgets segments ending before a moment, and with them the windows which ended before it"""
+        position = bisect.bisect_right(self._bounds, before) - 1
+        if position > 0:
+            del self._bounds[:position]
+            del self._segments[:position]
+
+    def __bool__(self):
+        """Returns bool weather any window is left"""
+        return any(windows for windows, _ in self._segments)
+
+
+class PromotionSchedule:
+    """Promotions with [start, end) validity windows, for the whole catalog or for some skus"""
+
+    def __init__(self, retention=3600, clock=time.time):
+        """Creates an empty schedule
+        :param retention: seconds a window is kept after it ended, None keeps all windows
+        :param clock: function returning the current timestamp
+        """
+        # sequence number -> (sequence number, start, end, promotion, frozenset of skus or None
+        # for the whole catalog), in the order added
+        self._windows = {}
+        self._sequence = itertools.count()
+        self._retention = retention
+        self._clock = clock
+        # heap of (end, sequence number) of all windows, the first to expire on top
+        self._ends = []
+        self._catalog_wide = _Timeline()
+        # sku -> _Timeline of windows of some skus including it
+        self._by_sku = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Returns number of scheduled windows"""
+        return len(self._windows)
+
+    def add(self, promotion, start, end, skus=None):
+        """Schedules a promotion from start inclusive to end exclusive
+        :param promotion: Promotion object
+        :param start: timestamp, float or integer
+        :param end: timestamp, float or integer
+        :param skus: iterable of skus the promotion applies to, None for the whole catalog
+        :return: None
+        """
+        if not start < end:
+            raise ValueError('Promotion window should end after it starts.')
+        with self._lock:
+            if self._retention is not None:
+                self._expire(self._clock() - self._retention)
+            self._insert((next(self._sequence), start, end, promotion, None if skus is None else frozenset(skus)))
+
+    def _insert(self, window):
+        """Adds a window to the time lines. Must be called holding the schedule lock"""
+        self._windows[window[0]] = window
+        heapq.heappush(self._ends, (window[2], window[0]))
+        if window[4] is None:
+            self._catalog_wide.add(window)
+            return
+        for sku in window[4]:
+            timeline = self._by_sku.get(sku)
+            if timeline is None:
+                timeline = self._by_sku[sku] = _Timeline()
+            timeline.add(window)
+
+    def _expire(self, before):
+        """Drops windows which ended before a timestamp. Must be called holding the schedule lock"""
+        expired_skus = set()
+        catalog_wide_expired = False
+        while self._ends and self._ends[0][0] <= before:
+            _, sequence = heapq.heappop(self._ends)
+            window = self._windows.pop(sequence, None)
+            if window is None:
+                continue
+            if window[4] is None:
+                catalog_wide_expired = True
+            else:
+                expired_skus.update(window[4])
+        if catalog_wide_expired:
+            self._catalog_wide.trim(before)
+        for sku in expired_skus:
+            timeline = self._by_sku.get(sku)
+            if timeline is not None:
+                timeline.trim(before)
+                if not timeline:
+                    del self._by_sku[sku]
+
+    def _rebuild(self, windows):
+        """Replaces all windows, keeping their order. Must be called holding the schedule lock"""
+        self._windows = {}
+        self._ends = []
+        self._catalog_wide = _Timeline()
+        self._by_sku = {}
+        for window in windows:
+            self._insert(window)
+
+    def remove(self, promotion):
+        """Removes all windows of a promotion"""
+        with self._lock:
+            windows = [window for window in self._windows.values() if window[3] is not promotion]
+            if len(windows) == len(self._windows):
+                raise KeyError(promotion)
+            self._rebuild(windows)
+
+    def prune(self, before):
+        """Forgets windows which ended before a timestamp, returns number of forgotten windows"""
+        with self._lock:
+            windows = [window for window in self._windows.values() if window[2] > before]
+            pruned = len(self._windows) - len(windows)
+            if pruned:
+                self._rebuild(windows)
+            return pruned
+
+    def active(self, sku, at):
+        """Returns tuple of promotions valid for a sku at a timestamp, in the order they were scheduled"""
+        with self._lock:
+            catalog_windows, catalog_wide = self._catalog_wide.at(at)
+            timeline = self._by_sku.get(sku)
+            if timeline is None:
+                return catalog_wide
+            sku_windows, sku_promotions = timeline.at(at)
+        if not sku_windows:
+            return catalog_wide
+        if not catalog_windows:
+            return sku_promotions
+        return tuple(dict.fromkeys(window[3] for window in sorted(catalog_windows + sku_windows)))
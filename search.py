@@ -0,0 +1,153 @@
+"""Case-insensitive product name index. Names are kept sorted for prefix queries, and every
+three-letter slice of a name (trigram) points to the products containing it for substring
+queries. Candidates of a substring query are the products having all of its trigrams,
+each candidate is then checked against the query itself.
+"""
+import bisect
+import heapq
+import itertools
+
+
+def normalize(text):
+    """Returns text in the form names are indexed and searched in"""
+    return text.casefold()
+
+
+def trigrams(text):
+    """Returns set of three-character slices of normalized text"""
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+def rank(query, name):
+    """Returns sort key of a normalized name matching a normalized query, smaller keys rank higher:
+    names starting with the query first, then names with a word starting with it, then the rest.
+    Shorter names come first inside a group, then names in alphabetical order
+    """
+    if name.startswith(query):
+        group = 0
+    elif f' {query}' in name:
+        group = 1
+    else:
+        group = 2
+    return group, len(name), name
+
+
+class NameIndex:
+    """Prefix and substring index of product names"""
+
+    def __init__(self):
+        """Creates an empty index"""
+        # sorted (normalized name, sequence number, product) entries, sequence numbers are unique,
+        # so products themselves are never compared
+        self._entries = []
+        self._entry_of = {}
+        self._sequence = itertools.count()
+        # trigram -> set of skus of products with names containing it
+        self._postings = {}
+        # skus of products with names too short to have trigrams
+        self._short_names = set()
+
+    def __len__(self):
+        """Returns number of indexed products"""
+        return len(self._entries)
+
+    def __contains__(self, product):
+        """Returns bool weather product is indexed"""
+        return product.sku in self._entry_of
+
+    def _new_entry(self, product):
+        """Creates and remembers the entry of a product, indexes its trigrams"""
+        name = normalize(product.name)
+        sku = product.sku
+        entry = (name, next(self._sequence), product)
+        self._entry_of[sku] = entry
+        if len(name) < 3:
+            self._short_names.add(sku)
+        postings = self._postings
+        for trigram in trigrams(name):
+            skus = postings.get(trigram)
+            if skus is None:
+                skus = postings[trigram] = set()
+            skus.add(sku)
+        return entry
+
+    def add(self, product):
+        """Adds a product to the index"""
+        if product.sku not in self._entry_of:
+            bisect.insort(self._entries, self._new_entry(product))
+
+    def add_many(self, product_list):
+        """Adds many products at once, sorting the index once instead of inserting one by one"""
+        self._entries.extend(self._new_entry(product) for product in product_list
+                             if product.sku not in self._entry_of)
+        self._entries.sort()
+
+    def remove(self, product):
+        """Removes a product from the index, does nothing if it is not indexed"""
+        entry = self._entry_of.pop(product.sku, None)
+        if entry is None:
+            return
+        del self._entries[bisect.bisect_left(self._entries, entry)]
+        self._short_names.discard(product.sku)
+        for trigram in trigrams(entry[0]):
+            skus = self._postings[trigram]
+            skus.discard(product.sku)
+            if not skus:
+                del self._postings[trigram]
+
+    def remove_many(self, product_list):
+        """Removes many products at once, filtering the sorted names once"""
+        removed = [product for product in product_list if product.sku in self._entry_of]
+        if len(removed) < 16:
+            for product in removed:
+                self.remove(product)
+            return
+        sequences = set()
+        for product in removed:
+            entry = self._entry_of.pop(product.sku)
+            sequences.add(entry[1])
+            self._short_names.discard(product.sku)
+            for trigram in trigrams(entry[0]):
+                skus = self._postings[trigram]
+                skus.discard(product.sku)
+                if not skus:
+                    del self._postings[trigram]
+        self._entries = [entry for entry in self._entries if entry[1] not in sequences]
+
+    def prefix(self, query, page=0, page_size=20):
+        """Returns one page of products with names starting with query, in alphabetical order"""
+        query = normalize(query)
+        start = bisect.bisect_left(self._entries, (query,)) + page * page_size
+        result = []
+        for name, _, product in self._entries[start:start + page_size]:
+            if not name.startswith(query):
+                break
+            result.append(product)
+        return result
+
+    def _candidates(self, query):
+        """Returns skus of products which may contain a normalized query"""
+        if len(query) >= 3:
+            postings = sorted((self._postings.get(trigram, set()) for trigram in trigrams(query)), key=len)
+            return postings[0].intersection(*postings[1:])
+        candidates = set(self._short_names)
+        for trigram, skus in self._postings.items():
+            if query in trigram:
+                candidates.update(skus)
+        return candidates
+
+    def search(self, query, page=0, page_size=20):
+        """Returns one page of products with names containing query, best matches first
+        :param query: string
+        :param page: integer, page number starting from 0
+        :param page_size: integer, number of products per page
+        :return: list
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        matches = (self._entry_of[sku] for sku in self._candidates(query))
+        ranked = heapq.nsmallest((page + 1) * page_size,
+                                 (rank(query, name) + (sequence, product) for name, sequence, product in matches
+                                  if query in name))
+        return [ranked_match[-1] for ranked_match in ranked[page * page_size:]]
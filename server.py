@@ -0,0 +1,256 @@
+"""Asyncio order intake service for a Store.
+Speaks newline-delimited JSON over TCP. Every request is an object with an "op" key:
+    {"op": "list"}
+    {"op": "quote", "lines": [[sku, quantity], ...]}
+    {"op": "order", "lines": [[sku, quantity], ...]}
+    {"op": "stats"}
+Quotes and listings are answered directly. Orders are put on a bounded queue and applied
+to the Store in micro-batches by a single writer task.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import main
+import percentiles
+
+
+class LatencyRecorder:
+    """Keeps the most recent request latencies per operation and reports percentiles"""
+
+    def __init__(self, size=10000):
+        """Instance initialization
+        :param size: number of most recent samples kept per operation
+        """
+        self._size = size
+        self._samples = {}
+        self._counts = collections.Counter()
+
+    def record(self, operation, seconds):
+        """Records latency of a finished request"""
+        if operation not in self._samples:
+            self._samples[operation] = collections.deque(maxlen=self._size)
+        self._samples[operation].append(seconds)
+        self._counts[operation] += 1
+
+    def report(self):
+        """Returns dictionary of request counts and p50/p99 latencies in milliseconds per operation"""
+        result = {}
+        for operation, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[operation] = {
+                'count': self._counts[operation],
+                'p50_ms': round(percentiles.percentile(ordered, 50) * 1000, 3),
+                'p99_ms': round(percentiles.percentile(ordered, 99) * 1000, 3),
+            }
+        return result
+
+
+class OrderService:
+    """Network front end around a Store object"""
+
+    def __init__(self, store_obj, queue_size=1024, max_batch=64):
+        """Instance initialization
+        :param store_obj: Store class object
+        :param queue_size: maximum number of orders waiting for the writer
+        :param max_batch: maximum number of orders applied in one micro-batch
+        """
+        self._store = store_obj
+        self._queue_size = queue_size
+        self._max_batch = max_batch
+        self._queue = None
+        self._writer_task = None
+        self._server = None
+        self.latency = LatencyRecorder()
+        self.batch_sizes = collections.Counter()
+        # batches whose changes failed to reach a subscriber and the last such error
+        self.publish_failures = 0
+        self.last_publish_error = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Starts the writer task and the TCP server, returns bound (host, port)"""
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._writer_task = asyncio.create_task(self._write_orders())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stops accepting connections and cancels the writer task"""
+        self._server.close()
+        await self._server.wait_closed()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+
+    async def serve_forever(self):
+        """Serves requests until cancelled"""
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _shopping_list(self, lines):
+        """Converts [[sku, quantity], ...] to a list of (product, quantity) tuples"""
+        shopping_list = []
+        for sku, quantity in lines:
+            product = self._store.get_product(sku)
+            if product is None:
+                raise ValueError(f'There is no product {sku} in the store.')
+            shopping_list.append((product, quantity))
+        return shopping_list
+
+    def _list_products(self):
+        """Returns active products as JSON-ready dictionaries"""
+        return [{'sku': product.sku, 'name': product.name, 'price': product.price,
+                 'quantity': product.quantity} for product in self._store.all_products]
+
+    async def _write_orders(self):
+        """Single writer. Takes queued orders in micro-batches and applies them to the store.
+        Errors are reported to the orders they belong to, the writer itself keeps running.
+        An order is committed once the store applied it, so a subscriber failing to receive
+        the changes of a batch doesn't fail its orders, it is reported in the stats instead
+        """
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.batch_sizes[len(batch)] += 1
+            results = []
+            try:
+                # subscribers such as the journal get the changes of the whole batch at once
+                with self._store.batched_changes():
+                    for shopping_list, future in batch:
+                        if future.cancelled():
+                            continue
+                        try:
+                            results.append((future, None, self._store.order(shopping_list)))
+                        except Exception as error:
+                            results.append((future, error, None))
+            except Exception as error:
+                self.publish_failures += 1
+                self.last_publish_error = str(error)
+            for future, error, total in results:
+                if future.cancelled():
+                    continue
+                if error is None:
+                    future.set_result(total)
+                else:
+                    future.set_exception(error)
+
+    async def handle_request(self, request):
+        """Handles one decoded request, returns response dictionary"""
+        operation = request.get('op')
+        started = time.perf_counter()
+        try:
+            if operation == 'list':
+                response = {'ok': True, 'products': self._list_products()}
+            elif operation == 'quote':
+                total = self._store.quote(self._shopping_list(request['lines']))
+                response = {'ok': True, 'total': round(total, 2)}
+            elif operation == 'order':
+                future = asyncio.get_running_loop().create_future()
+                # waits here while the queue is full, which slows down the client
+                await self._queue.put((self._shopping_list(request['lines']), future))
+                response = {'ok': True, 'total': round(await future, 2)}
+            elif operation == 'stats':
+                response = {'ok': True, 'latency': self.latency.report(),
+                            'total_quantity': self._store.total_quantity,
+                            'publish_failures': self.publish_failures, 'last_publish_error': self.last_publish_error}
+            else:
+                response = {'ok': False, 'error': f'Unknown operation {operation!r}.'}
+        except Exception as error:
+            response = {'ok': False, 'error': str(error)}
+        self.latency.record(operation, time.perf_counter() - started)
+        return response
+
+    async def _handle_connection(self, reader, writer):
+        """Answers newline-delimited JSON requests of one client connection"""
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'ok': False, 'error': 'Request should be a JSON object.'}
+                else:
+                    if isinstance(request, dict):
+                        response = await self.handle_request(request)
+                    else:
+                        response = {'ok': False, 'error': 'Request should be a JSON object.'}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+class Client:
+    """Minimal client for the order service"""
+
+    def __init__(self, reader, writer):
+        """Instance initialization from an open connection"""
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        """Opens a connection to the order service"""
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, **request):
+        """Sends one request and returns decoded response"""
+        self._writer.write(json.dumps(request).encode() + b'\n')
+        await self._writer.drain()
+        return json.loads(await self._reader.readline())
+
+    async def close(self):
+        """Closes the connection"""
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def load_test(host, port, clients=8, orders_per_client=100):
+    """Sends single-line orders of the first listed product from many concurrent clients.
+    Returns service statistics after all orders are answered
+    """
+    async def customer():
+        client = await Client.connect(host, port)
+        listing = await client.request(op='list')
+        sku = listing['products'][0]['sku']
+        for _ in range(orders_per_client):
+            await client.request(op='order', lines=[[sku, 1]])
+        await client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(customer() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    client = await Client.connect(host, port)
+    stats = await client.request(op='stats')
+    await client.close()
+    stats['orders_per_second'] = round(clients * orders_per_client / elapsed, 1)
+    return stats
+
+
+async def run(arguments):
+    """Starts the service with the default store, optionally runs a local load test"""
+    service = OrderService(main.create_store(), arguments.queue_size, arguments.max_batch)
+    host, port = await service.start(arguments.host, arguments.port)
+    print(f'Serving on {host}:{port}')
+    if arguments.load_test:
+        print(json.dumps(await load_test(host, port, arguments.clients, arguments.orders), indent=2))
+        await service.close()
+    else:
+        await service.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Best Buy order intake service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--queue-size', type=int, default=1024)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--load-test', action='store_true', help='run a local load test and exit')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,279 @@
+"""Store partitioned across worker processes. Every product is owned by one shard,
+chosen by a stable hash of its sku, and every shard is a plain Store living in its own process.
+Orders touching one shard are applied there directly, orders touching several shards
+are reserved on all of them first and committed only if every reservation succeeded.
+"""
+import collections
+import contextlib
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+
+import products
+import store
+
+
+def shard_index(sku, shard_count):
+    """Returns index of the shard owning a sku. Stable across processes and runs"""
+    return zlib.crc32(repr(sku).encode()) % shard_count
+
+
+class _ShardWorker:
+    """Store of one shard and the order reservations held on it"""
+
+    def __init__(self, product_list):
+        """Creates the shard store"""
+        self._store = store.Store(product_list)
+        # order id -> quantities per sku reserved by the order
+        self._reservations = {}
+        self._held = collections.Counter()
+
+    def _resolve(self, lines):
+        """Returns shopping list of shard products for (sku, quantity) lines"""
+        shopping_list = []
+        for sku, quantity in lines:
+            product = self._store.get_product(sku)
+            if product is None:
+                raise ValueError(f'There is no product {sku!r} in the store.')
+            shopping_list.append((product, quantity))
+        return shopping_list
+
+    def _check_reservations(self, shopping_list):
+        """Validates order lines against stock which isn't reserved by other orders,
+        returns ordered quantity per sku
+        """
+        ordered = collections.Counter()
+        for product, quantity in shopping_list:
+            product.validate_order(quantity)
+            ordered[product.sku] += quantity
+        for sku, quantity in ordered.items():
+            product = self._store.get_product(sku)
+            product.validate_order(quantity)
+            # limited products are never depleted, validate_order checks their maximum per order
+            if (not isinstance(product, (products.NonStockedBase, products.LimitedBase))
+                    and self._held[sku] + quantity > product.quantity):
+                raise ValueError(f'Not enough {product.name} in stock, part of it is reserved by other orders.')
+        return ordered
+
+    def order(self, lines):
+        """Applies an order, returns its total price"""
+        shopping_list = self._resolve(lines)
+        if self._held:
+            self._check_reservations(shopping_list)
+        return self._store.order(shopping_list)
+
+    def orders(self, orders):
+        """Applies many orders, returns list of ('ok', total price) or ('error', exception) tuples"""
+        results = []
+        for lines in orders:
+            try:
+                results.append(('ok', self.order(lines)))
+            except ValueError as error:
+                results.append(('error', error))
+        return results
+
+    def quote(self, lines):
+        """Returns total price of an order without changing the shard"""
+        return self._store.quote(self._resolve(lines))
+
+    def reserve(self, argument):
+        """Validates order lines and holds their quantities until the order is committed or aborted"""
+        order_id, lines = argument
+        ordered = self._check_reservations(self._resolve(lines))
+        self._held.update(ordered)
+        self._reservations[order_id] = (lines, ordered)
+
+    def commit(self, order_id):
+        """Applies a reserved order, returns its total price"""
+        lines, ordered = self._reservations.pop(order_id)
+        self._held.subtract(ordered)
+        self._held = +self._held
+        return self._store.order(self._resolve(lines))
+
+    def abort(self, order_id):
+        """Releases quantities held by a reserved order"""
+        _, ordered = self._reservations.pop(order_id)
+        self._held.subtract(ordered)
+        self._held = +self._held
+
+    def total_quantity(self, _):
+        """Returns quantity of all shard products"""
+        return self._store.total_quantity
+
+    def all_products(self, _):
+        """Returns list of active shard products"""
+        return list(self._store.all_products)
+
+    def get_product(self, sku):
+        """Returns a shard product by its sku or None"""
+        return self._store.get_product(sku)
+
+
+def _serve_shard(connection, product_list):
+    """Worker process loop. Answers (command, argument) requests with ('ok', result) or ('error', exception)"""
+    worker = _ShardWorker(product_list)
+    while True:
+        command, argument = connection.recv()
+        if command == 'stop':
+            connection.close()
+            return
+        try:
+            connection.send(('ok', getattr(worker, command)(argument)))
+        except Exception as error:
+            connection.send(('error', error))
+
+
+class ShardedStore:
+    """Store hash partitioned across worker processes, each owning a plain Store.
+    Products returned by the sharded store are copies, the shards own the real ones.
+    Order lines are matched to shard products by sku
+    """
+
+    def __init__(self, product_list, workers=None):
+        """Starts the worker processes and hands every product to its shard
+        :param product_list: iterable of Product class objects
+        :param workers: integer, number of shards, number of CPUs if not provided
+        """
+        workers = workers or os.cpu_count()
+        partitions = [[] for _ in range(workers)]
+        for product in product_list:
+            partitions[shard_index(product.sku, workers)].append(product)
+        context = multiprocessing.get_context()
+        self._connections = []
+        self._processes = []
+        # one request at a time per shard connection
+        self._locks = [threading.Lock() for _ in range(workers)]
+        self._order_ids = itertools.count()
+        for partition in partitions:
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(target=_serve_shard, args=(child_connection, partition), daemon=True)
+            process.start()
+            child_connection.close()
+            self._connections.append(parent_connection)
+            self._processes.append(process)
+
+    def __enter__(self):
+        """Returns the store for a with block"""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stops the worker processes at the end of a with block"""
+        self.close()
+
+    def __len__(self):
+        """Returns number of shards"""
+        return len(self._connections)
+
+    def close(self):
+        """Stops the worker processes"""
+        for shard, connection in enumerate(self._connections):
+            with self._locks[shard]:
+                if not connection.closed:
+                    connection.send(('stop', None))
+                    connection.close()
+        for process in self._processes:
+            process.join()
+
+    def _call(self, shard, command, argument=None):
+        """Sends one request to a shard and returns its result, raises the exception of a failed request"""
+        with self._locks[shard]:
+            connection = self._connections[shard]
+            connection.send((command, argument))
+            status, result = connection.recv()
+        if status == 'error':
+            raise result
+        return result
+
+    def _call_all(self, command, arguments):
+        """Sends one request to every shard in arguments before waiting for any result.
+        Returns dictionary shard -> (status, result)
+        """
+        shards = sorted(arguments)
+        with contextlib.ExitStack() as stack:
+            for shard in shards:
+                stack.enter_context(self._locks[shard])
+            for shard in shards:
+                self._connections[shard].send((command, arguments[shard]))
+            return {shard: self._connections[shard].recv() for shard in shards}
+
+    def _lines_by_shard(self, shopping_list):
+        """Splits a shopping list into (sku, quantity) lines per shard"""
+        lines_by_shard = {}
+        for product, quantity in shopping_list:
+            lines_by_shard.setdefault(shard_index(product.sku, len(self)), []).append((product.sku, quantity))
+        return lines_by_shard
+
+    def get_product(self, sku):
+        """Returns a copy of a product by its sku or None if there is no such product in the store"""
+        return self._call(shard_index(sku, len(self)), 'get_product', sku)
+
+    @property
+    def total_quantity(self):
+        """Returns quantity of all products left in all shards as integer"""
+        return sum(result for _, result in self._call_all('total_quantity', dict.fromkeys(range(len(self)))).values())
+
+    @property
+    def all_products(self):
+        """Returns tuple of copies of all active products, grouped by shard"""
+        results = self._call_all('all_products', dict.fromkeys(range(len(self))))
+        return tuple(itertools.chain.from_iterable(result for _, result in results.values()))
+
+    def quote(self, shopping_list):
+        """Returns total price of the order without changing the store
+        :param shopping_list: list of tuples (product, quantity)
+        :return: float or integer
+        """
+        return sum(self._call(shard, 'quote', lines) for shard, lines in self._lines_by_shard(shopping_list).items())
+
+    def order(self, shopping_list):
+        """Reduces product amount left in the shards, returns total price of the order.
+        An order of several shards is reserved on every shard before it is committed,
+        so it buys all of its lines or none
+        :param shopping_list: list of tuples (product, quantity)
+        :return: float or integer
+        """
+        lines_by_shard = self._lines_by_shard(shopping_list)
+        if len(lines_by_shard) == 1:
+            (shard, lines), = lines_by_shard.items()
+            return self._call(shard, 'order', lines)
+        order_id = next(self._order_ids)
+        reserved = []
+        try:
+            for shard in sorted(lines_by_shard):
+                self._call(shard, 'reserve', (order_id, lines_by_shard[shard]))
+                reserved.append(shard)
+        except Exception:
+            for shard in reserved:
+                self._call(shard, 'abort', order_id)
+            raise
+        return sum(self._call(shard, 'commit', order_id) for shard in reserved)
+
+    def order_many(self, shopping_lists):
+        """Applies many orders, sending single shard orders to their shards in one batch per shard
+        so the shards work on them in parallel. Orders of several shards are applied first, one by one
+        :param shopping_lists: list of shopping lists
+        :return: list with total price or the ValueError of every order, in the given order
+        """
+        results = [None] * len(shopping_lists)
+        batches = {}
+        for position, shopping_list in enumerate(shopping_lists):
+            lines_by_shard = self._lines_by_shard(shopping_list)
+            if len(lines_by_shard) == 1:
+                (shard, lines), = lines_by_shard.items()
+                positions, orders = batches.setdefault(shard, ([], []))
+                positions.append(position)
+                orders.append(lines)
+            else:
+                try:
+                    results[position] = self.order(shopping_list)
+                except ValueError as error:
+                    results[position] = error
+        replies = self._call_all('orders', {shard: orders for shard, (_, orders) in batches.items()})
+        for shard, (status, shard_results) in replies.items():
+            if status == 'error':
+                raise shard_results
+            for position, (_, result) in zip(batches[shard][0], shard_results):
+                results[position] = result
+        return results
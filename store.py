@@ -1,55 +1,576 @@
+import bisect
+import collections
+import collections.abc
+import contextlib
+import heapq
+import itertools
+import operator
+import threading
+import time
+
+import metrics
+import price_index
 import products
+import search
+
+# a product change as delivered to store subscribers, with the state the product had before it.
+# kind is 'updated' for quantity and activation changes, 'added' or 'removed' when the store
+# gains or loses a product. Added products had no state before, so old values are 0 and False
+Change = collections.namedtuple('Change', ['product', 'old_quantity', 'old_active', 'kind'],
+                                defaults=('updated',))
+
+
+class _OrderingStore:
+    """Quotes and orders shared by Store and FederatedStore.
+    Subclasses provide get_owner, batched_changes, quote_cache and schedule.
+    Every order line is priced by the store owning its product, with that store's schedule and quote cache
+    """
+
+    quote_cache = None
+    schedule = None
+
+    @contextlib.contextmanager
+    def _locked_order(self, shopping_list):
+        """Resolves order lines to store products, takes locks of all ordered products
+        in a fixed order and validates aggregated quantity of every product.
+        Yields list of tuples (owning store, product, quantity) while the locks are held
+        """
+        order_lines = []
+        ordered_quantities = {}
+        for product, quantity in shopping_list:
+            owner, current_product = self.get_owner(product.sku)
+            if current_product is None:
+                raise ValueError(f'There is no {product} in the store.')
+            current_product.validate_order(quantity)
+            order_lines.append((owner, current_product, quantity))
+            ordered_quantity = ordered_quantities.get(current_product.sku, (current_product, 0))[1]
+            ordered_quantities[current_product.sku] = (current_product, ordered_quantity + quantity)
+        with contextlib.ExitStack() as stack:
+            for lock in products.ordered_locks(product for product, _ in ordered_quantities.values()):
+                stack.enter_context(lock)
+            for current_product, quantity in ordered_quantities.values():
+                current_product.validate_order(quantity)
+            yield order_lines
+
+    def _scheduled_promotions(self, sku, at):
+        """Returns tuple of promotions the store schedule has for a sku at a timestamp"""
+        if self.schedule is None:
+            return ()
+        return self.schedule.active(sku, at)
+
+    def quote(self, shopping_list, at=None):
+        """Returns total price of the order without changing the store
+        :param shopping_list: list of tuples (product, quantity)
+        :param at: timestamp scheduled promotions are evaluated at, now if not provided
+        :return: float or integer
+        """
+        total_price = 0
+        at = time.time() if at is None else at
+        with self._locked_order(shopping_list) as order_lines:
+            for owner, current_product, quantity in order_lines:
+                total_price += owner._quote_line(current_product, quantity,
+                                                 owner._scheduled_promotions(current_product.sku, at))
+        return total_price
+
+    def _quote_line(self, product, quantity, extra_promotions=()):
+        """Returns price of an order line, from the quote cache if the store has one
+        and no scheduled promotion applies
+        """
+        if self.quote_cache is None or extra_promotions:
+            return product.quote(quantity, extra_promotions)
+        return self.quote_cache.quote(product, quantity)
+
+    @metrics.instrument_order
+    def order(self, shopping_list, product_quantity_reduction=True, at=None):
+        """Reduced product amount left is store, returns total price of the order.
+        Locks of all ordered products are taken in a fixed order and every line is
+        validated before any quantity is reduced, so an order buys all of its lines or none
+        :param shopping_list: list of tuples (product, quantity)
+        :param product_quantity_reduction: bool
+        :param at: timestamp scheduled promotions are evaluated at, now if not provided
+        :return: float or integer
+        """
+        total_price = 0
+        at = time.time() if at is None else at
+        with self._locked_order(shopping_list) as order_lines, self.batched_changes():
+            for owner, current_product, quantity in order_lines:
+                extra_promotions = owner._scheduled_promotions(current_product.sku, at)
+                if isinstance(current_product, (products.NonStockedBase, products.LimitedBase)):
+                    total_price += current_product.buy(quantity, extra_promotions=extra_promotions)
+                elif not product_quantity_reduction and owner.quote_cache is not None and not extra_promotions:
+                    total_price += owner.quote_cache.quote(current_product, quantity)
+                else:
+                    total_price += current_product.buy(quantity, product_quantity_reduction, extra_promotions)
+        return total_price
 
 
-class Store:
+class Store(_OrderingStore):
     """Store class initiation and methods definitions"""
 
-    def __init__(self, product_list):
-        """Store instance initialization"""
-        self._list_of_products = product_list
+    # when True every aggregate read is checked against a full recalculation
+    check_invariants = False
+
+    def __init__(self, product_list, quote_cache=None, schedule=None):
+        """Store instance initialization
+        :param product_list: iterable of Product class objects
+        :param quote_cache: optional QuoteCache used by quotes and by orders without quantity reduction
+        :param schedule: optional PromotionSchedule applied on top of product promotions
+        """
+        self.quote_cache = quote_cache
+        self.schedule = schedule
+        self._products = {}
+        self._total_quantity = 0
+        self._active_products = ()
+        self._price_index = price_index.PriceIndex()
+        # built on the first name search
+        self._name_index = None
+        # tuple of active products the positions were computed for and product sku -> position
+        self._positions = ((), {})
+        # guards aggregates only, product locks are never taken while holding it
+        self._lock = threading.Lock()
+        self._subscribers = ()
+        self._batches = threading.local()
+        self.add_products(product_list)
 
     def __contains__(self, product):
         """Magick method that returns bool weather product is in store"""
-        return product in self._list_of_products
+        return product.sku in self._products
+
+    def __iter__(self):
+        """Iterates over all products of the store, including inactive ones"""
+        return iter(self._products.values())
+
+    def __len__(self):
+        """Returns number of all products in the store"""
+        return len(self._products)
 
     def __add__(self, store):
-        """Operator overload. Returns a new store as a sum of two stores"""
-        return Store(self._list_of_products + store.all_products)
+        """Operator overload. Returns a live FederatedStore view over both stores, nothing is copied"""
+        return FederatedStore([self, store])
 
     def add_product(self, product):
         """adds new product to the store"""
-        if product in self._list_of_products:
-            pass
-        self._list_of_products.append(product)
+        with self._lock:
+            if product.sku in self._products:
+                return
+            self._products[product.sku] = product
+            product.add_listener(self._on_product_change)
+            self._total_quantity += product.quantity
+            if product.is_active:
+                self._active_products = None
+                for index in self._built_indexes():
+                    index.add(product)
+        if self._subscribers:
+            self._emit([Change(product, 0, False, 'added')])
+
+    def add_products(self, product_list):
+        """Adds many products to the store at once. Skips products which are already in the store.
+        Aggregates are updated once for the whole list
+        :param product_list: iterable of Product class objects
+        :return: integer, number of added products
+        """
+        with self._lock:
+            added_quantity = 0
+            added_active = []
+            added = []
+            for product in product_list:
+                if product.sku in self._products:
+                    continue
+                self._products[product.sku] = product
+                product.add_listener(self._on_product_change)
+                added_quantity += product.quantity
+                added.append(product)
+                if product.is_active:
+                    added_active.append(product)
+            self._total_quantity += added_quantity
+            if added_active:
+                self._active_products = None
+                for index in self._built_indexes():
+                    index.add_many(added_active)
+        if self._subscribers and added:
+            self._emit([Change(product, 0, False, 'added') for product in added])
+        return len(added)
 
     def remove_product(self, product):
         """Removes a product from the store"""
-        self._list_of_products.remove(product)
+        with self._lock:
+            if product.sku not in self._products:
+                raise ValueError(f'There is no {product} in the store.')
+            product = self._products.pop(product.sku)
+            product.remove_listener(self._on_product_change)
+            self._total_quantity -= product.quantity
+            if product.is_active:
+                self._active_products = None
+            for index in self._built_indexes():
+                index.remove(product)
+        if self._subscribers:
+            self._emit([Change(product, product.quantity, product.is_active, 'removed')])
+
+    def get_product(self, sku):
+        """Returns a product by its sku or None if there is no such product in the store"""
+        return self._products.get(sku)
+
+    def get_owner(self, sku):
+        """Returns tuple (store pricing the product, product) of a sku, the product is None if there is none"""
+        return self, self._products.get(sku)
+
+    def subscribe(self, subscriber):
+        """Subscribes a callable to changes of store products.
+        The subscriber is called with a list of Change tuples: one per quantity or activation change,
+        per added or removed product, or all changes of an order at once
+        """
+        self._subscribers = self._subscribers + (subscriber,)
+
+    def unsubscribe(self, subscriber):
+        """Unsubscribes a callable from changes of store products"""
+        subscribers = list(self._subscribers)
+        subscribers.remove(subscriber)
+        self._subscribers = tuple(subscribers)
+
+    @contextlib.contextmanager
+    def batched_changes(self):
+        """Collects product changes made by the current thread inside the block
+        and delivers them to subscribers as one list when the block exits
+        """
+        if getattr(self._batches, 'changes', None) is not None:
+            yield
+            return
+        self._batches.changes = []
+        try:
+            yield
+        finally:
+            changes, self._batches.changes = self._batches.changes, None
+            if changes:
+                self._publish(changes)
+
+    def _publish(self, changes):
+        """Delivers a list of changes to all subscribers"""
+        for subscriber in self._subscribers:
+            subscriber(changes)
+
+    def _on_product_change(self, product, old_quantity, old_active):
+        """Keeps store aggregates up to date when one of its products changes"""
+        deferred = getattr(self._batches, 'deferred', None)
+        if deferred is not None:
+            deferred.append((product, old_quantity, old_active))
+            return
+        with self._lock:
+            self._total_quantity += product.quantity - old_quantity
+            if product.is_active != old_active:
+                self._active_products = None
+                for index in self._built_indexes():
+                    if product.is_active:
+                        index.add(product)
+                    else:
+                        index.remove(product)
+        if self._subscribers:
+            self._emit([Change(product, old_quantity, old_active)])
+
+    def apply_adjustments(self, adjustments):
+        """Applies many stock deltas as one transaction. The whole batch is validated
+        under the locks of all adjusted products before any quantity changes, so it is applied
+        completely or not at all. Products reaching 0 are deactivated, products restocked from 0
+        are activated. Aggregates and the price index are updated once for the batch,
+        and subscribers get all changes as one list
+        :param adjustments: iterable of tuples (sku, delta), deltas may be any integer type
+        :return: integer, number of adjusted products
+        """
+        deltas = {}
+        for sku, delta in adjustments:
+            product = self._products.get(sku)
+            if product is None:
+                raise ValueError(f'There is no product {sku!r} in the store.')
+            if isinstance(product, products.NonStockedBase):
+                raise ValueError(f'{product.name} is not a stocked product.')
+            try:
+                deltas[sku] = deltas.get(sku, 0) + operator.index(delta)
+            except TypeError:
+                raise ValueError(f'Adjustment of {product.name} should be an integer.') from None
+        adjusted = [(self._products[sku], delta) for sku, delta in deltas.items() if delta]
+        with contextlib.ExitStack() as stack:
+            for lock in products.ordered_locks(product for product, _ in adjusted):
+                stack.enter_context(lock)
+            for product, delta in adjusted:
+                if product.quantity + delta < 0:
+                    raise ValueError(f'Adjustment would leave {product.quantity + delta} of {product.name} in store.')
+            with self.batched_changes():
+                deferred = self._batches.deferred = []
+                try:
+                    for product, delta in adjusted:
+                        quantity = product.quantity + delta
+                        product._set_stock(quantity, quantity > 0 and (product.is_active or product.quantity == 0))
+                finally:
+                    self._batches.deferred = None
+                    self._apply_deferred(deferred)
+        return len(adjusted)
+
+    def _apply_deferred(self, changes):
+        """Updates aggregates once for many product changes and emits them"""
+        with self._lock:
+            self._total_quantity += sum(product.quantity - old_quantity for product, old_quantity, _ in changes)
+            activated = [product for product, _, old_active in changes if product.is_active and not old_active]
+            deactivated = [product for product, _, old_active in changes if old_active and not product.is_active]
+            if activated or deactivated:
+                self._active_products = None
+                for index in self._built_indexes():
+                    index.remove_many(deactivated)
+                    index.add_many(activated)
+        if self._subscribers:
+            self._emit([Change(*change) for change in changes])
+
+    def _emit(self, changes):
+        """Publishes changes, or adds them to the batch of the current thread"""
+        batch = getattr(self._batches, 'changes', None)
+        if batch is None:
+            self._publish(changes)
+        else:
+            batch.extend(changes)
+
+    def _built_indexes(self):
+        """Returns tuple of product indexes built so far. Must be called holding the store lock"""
+        return tuple(index for index in (self._price_index, self._name_index) if index is not None)
+
+    def _built_price_index(self):
+        """Returns the price index, building it on first use. Must be called holding the store lock"""
+        if self._price_index is None:
+            self._price_index = price_index.PriceIndex()
+            self._price_index.add_many(product for product in self._products.values() if product.is_active)
+        return self._price_index
+
+    def _verify_invariants(self):
+        """Compares maintained aggregates with values recalculated from scratch"""
+        total_quantity = sum(product.quantity for product in self._products.values())
+        if self._total_quantity != total_quantity:
+            raise AssertionError(f'Total quantity is {self._total_quantity}, expected {total_quantity}.')
+        # products are kept in the lists, so ids of products created on access aren't reused meanwhile
+        active_products = [product for product in self._products.values() if product.is_active]
+        if self._active_products is not None and (
+                len(self._active_products) != len(active_products)
+                or any(cached is not product for cached, product in zip(self._active_products, active_products))):
+            raise AssertionError('Cached active products are out of date.')
+        by_price = sorted((product for product in self._products.values() if product.is_active),
+                          key=lambda product: product.price)
+        if (self._price_index is not None and [product.price for product in self._price_index.products()]
+                != [product.price for product in by_price]):
+            raise AssertionError('Price index is out of date.')
 
     @property
     def total_quantity(self):
         """Returns quantity of all products left is store as integer"""
-        return sum(product.quantity for product in self._list_of_products)
+        if self.check_invariants:
+            self._verify_invariants()
+        return self._total_quantity
 
     @property
     def all_products(self):
-        """Returns list of all active products left in store"""
-        return [product for product in self._list_of_products if product.is_active]
+        """Returns tuple of all active products left in store.
+        The tuple is cached and rebuilt only after a product was activated or deactivated
+        """
+        if self.check_invariants:
+            self._verify_invariants()
+        active_products = self._active_products
+        if active_products is None:
+            with self._lock:
+                active_products = self._active_products
+                if active_products is None:
+                    active_products = self._active_products = tuple(
+                        product for product in self._products.values() if product.is_active)
+        return active_products
 
-    def order(self, shopping_list, product_quantity_reduction=True):
-        """Reduced product amount left is store, returns total price of the order
-        :param shopping_list: list of tuples (product, quantity)
-        :param product_quantity_reduction: bool
-        :return: float or integer
+    def product_position(self, product):
+        """Returns position of an active product in all_products, raises ValueError if it isn't listed.
+        Positions are recalculated only after the tuple of active products was rebuilt
         """
-        total_price = 0
-        for product, quantity in shopping_list:
-            if product not in self._list_of_products:
-                raise ValueError(f'There is no {product} in the store.')
-            for current_product in self._list_of_products:
-                if current_product == product:
-                    if isinstance(current_product, (products.NonStockedProduct, products.LimitedProduct)):
-                        total_price += current_product.buy(quantity)
-                    else:
-                        total_price += current_product.buy(quantity, product_quantity_reduction)
-        return total_price
+        active_products = self.all_products
+        listed, positions = self._positions
+        if listed is not active_products:
+            positions = {product.sku: index for index, product in enumerate(active_products)}
+            self._positions = (active_products, positions)
+        position = positions.get(product.sku)
+        if position is None or active_products[position] is not product:
+            raise ValueError(f'{product} is not an active product of the store.')
+        return position
+
+    @property
+    def has_name_index(self):
+        """Returns bool weather the name index was built, the first name search builds it"""
+        return self._name_index is not None
+
+    def products_in_price_range(self, low, high):
+        """Returns list of active products with low <= price <= high, cheapest first"""
+        with self._lock:
+            return self._built_price_index().between(low, high)
+
+    def cheapest_products(self, count):
+        """Returns list of count cheapest active products, cheapest first"""
+        with self._lock:
+            return self._built_price_index().cheapest(count)
+
+    def most_expensive_products(self, count):
+        """Returns list of count most expensive active products, most expensive first"""
+        with self._lock:
+            return self._built_price_index().most_expensive(count)
+
+    def products_by_price(self, page=0, page_size=20, descending=False):
+        """Returns one page of active products in price order
+        :param page: integer, page number starting from 0
+        :param page_size: integer, number of products per page
+        :param descending: bool, True to start from the most expensive products
+        :return: list
+        """
+        with self._lock:
+            return self._built_price_index().page(page, page_size, descending)
+
+    def search_products(self, query, page=0, page_size=20, prefix=False):
+        """Returns one page of active products found by name, ignoring case.
+        The name index is built on the first search and kept up to date afterwards
+        :param query: string
+        :param page: integer, page number starting from 0
+        :param page_size: integer, number of products per page
+        :param prefix: bool, True for names starting with query in alphabetical order,
+        False for names containing query, best matches first
+        :return: list
+        """
+        with self._lock:
+            if self._name_index is None:
+                self._name_index = search.NameIndex()
+                self._name_index.add_many(product for product in self._products.values() if product.is_active)
+            if prefix:
+                return self._name_index.prefix(query, page, page_size)
+            return self._name_index.search(query, page, page_size)
+
+
+class _ChainedProducts(collections.abc.Sequence):
+    """Read only sequence of active products of several stores, read from their cached tuples on access"""
+
+    def __init__(self, members):
+        """Creates a view over member stores"""
+        self._members = members
+
+    def __len__(self):
+        """Returns number of active products of all members"""
+        return sum(len(member.all_products) for member in self._members)
+
+    def __iter__(self):
+        """Iterates over active products of all members in member order"""
+        return itertools.chain.from_iterable(member.all_products for member in self._members)
+
+    def __getitem__(self, index):
+        """Returns an active product by its position, or a list of products for a slice"""
+        if isinstance(index, slice):
+            return list(itertools.islice(self, *index.indices(len(self))))
+        parts = [member.all_products for member in self._members]
+        starts = list(itertools.accumulate((len(part) for part in parts), initial=0))
+        if index < 0:
+            index += starts[-1]
+        if not 0 <= index < starts[-1]:
+            raise IndexError('Product index out of range.')
+        member = bisect.bisect_right(starts, index) - 1
+        return parts[member][index - starts[member]]
+
+
+class FederatedStore(_OrderingStore):
+    """Live view over several stores. Products are looked up, counted and iterated
+    in the member stores, so later changes of the members are always visible and
+    combining stores costs nothing. Orders are validated and applied on the owning members
+    and buy all of their lines or none. Members are expected to hold different products,
+    a product of several members belongs to the first of them
+    """
+
+    def __init__(self, members):
+        """Creates a view over member stores. Members which are federated stores are flattened
+        :param members: iterable of Store or FederatedStore objects
+        """
+        self._members = tuple(itertools.chain.from_iterable(
+            member.members if isinstance(member, FederatedStore) else (member,) for member in members))
+        self._all_products = _ChainedProducts(self._members)
+
+    @property
+    def members(self):
+        """Returns tuple of member stores"""
+        return self._members
+
+    def __contains__(self, product):
+        """Returns bool weather product is in one of the member stores"""
+        return any(product in member for member in self._members)
+
+    def __iter__(self):
+        """Iterates over all products of all members, including inactive ones"""
+        return itertools.chain.from_iterable(self._members)
+
+    def __len__(self):
+        """Returns number of all products of all members"""
+        return sum(len(member) for member in self._members)
+
+    def __add__(self, store):
+        """Operator overload. Returns a federated store over the members of both operands"""
+        return FederatedStore([self, store])
+
+    def get_product(self, sku):
+        """Returns a product of the first member having it or None if no member has such product"""
+        for member in self._members:
+            product = member.get_product(sku)
+            if product is not None:
+                return product
+        return None
+
+    def get_owner(self, sku):
+        """Returns tuple (member owning the product, product) of a sku, the product is None if no member has it"""
+        for member in self._members:
+            owner, product = member.get_owner(sku)
+            if product is not None:
+                return owner, product
+        return self, None
+
+    def subscribe(self, subscriber):
+        """Subscribes a callable to product changes of all members"""
+        for member in self._members:
+            member.subscribe(subscriber)
+
+    def unsubscribe(self, subscriber):
+        """Unsubscribes a callable from product changes of all members"""
+        for member in self._members:
+            member.unsubscribe(subscriber)
+
+    @contextlib.contextmanager
+    def batched_changes(self):
+        """Collects product changes of all members made by the current thread inside the block"""
+        with contextlib.ExitStack() as stack:
+            for member in self._members:
+                stack.enter_context(member.batched_changes())
+            yield
+
+    @property
+    def total_quantity(self):
+        """Returns quantity of all products left in all members, from their maintained totals"""
+        return sum(member.total_quantity for member in self._members)
+
+    @property
+    def all_products(self):
+        """Returns sequence view of active products of all members in member order"""
+        return self._all_products
+
+    def product_position(self, product):
+        """Returns position of an active product in all_products, asking only the member owning it"""
+        offset = 0
+        for member in self._members:
+            if product in member:
+                return offset + member.product_position(product)
+            offset += len(member.all_products)
+        raise ValueError(f'{product} is not an active product of the store.')
+
+    @property
+    def has_name_index(self):
+        """Returns bool weather name indexes of all members were built"""
+        return all(member.has_name_index for member in self._members)
+
+    def search_products(self, query, page=0, page_size=20, prefix=False):
+        """Returns one page of active products of all members found by name, ranked as in a single store"""
+        wanted = (page + 1) * page_size
+        found = [member.search_products(query, 0, wanted, prefix) for member in self._members]
+        query = search.normalize(query)
+        if prefix:
+            key = lambda product: search.normalize(product.name)
+        else:
+            key = lambda product: search.rank(query, search.normalize(product.name))
+        return list(itertools.islice(heapq.merge(*found, key=key), page * page_size, wanted))
@@ -0,0 +1,92 @@
+import gc
+import pickle
+import sys
+
+import pytest
+
+import products
+from array_catalog import ArrayCatalog, LIMITED, NON_STOCKED, PRODUCT
+from products import LimitedBase, LimitedProduct, NonStockedBase, Product, ProductBase
+from promotions import SecondHalfPrice
+
+
+def test_catalog_views_behave_like_products():
+    # Test that a catalog view buys, validates and deactivates like a Product
+    catalog = ArrayCatalog()
+    catalog.append(PRODUCT, "MacBook Air M2", 1450, quantity=3, promotions=[SecondHalfPrice("Second Half price!")])
+    mac = catalog[0]
+    assert isinstance(mac, ProductBase) and mac is catalog[0], "Catalog view isn't a cached product"
+    assert mac.buy(2) == 2175, "Order price calculated wrong"
+    assert catalog.total_quantity == 1, "Buy didn't reduce the quantity column"
+    with pytest.raises(ValueError, match='Quantity can not be bigger than items in store'):
+        mac.buy(2)
+    mac.buy(1)
+    assert not mac.is_active, "Sold out catalog view didn't become inactive"
+
+
+def test_catalog_store_orders():
+    # Test that a store of catalog views keeps its aggregates and orders all product kinds
+    catalog = ArrayCatalog()
+    catalog.append(PRODUCT, "Google Pixel 7", 100, quantity=250, sku="PIX")
+    catalog.append(NON_STOCKED, "Windows License", 125, sku="WIN")
+    catalog.append(LIMITED, "Shipping", 10, quantity=250, maximum=1, sku="SHIP")
+    best_buy = catalog.to_store()
+    assert isinstance(best_buy.get_product("WIN"), NonStockedBase), "Non stocked view has wrong type"
+    assert isinstance(best_buy.get_product("SHIP"), LimitedBase), "Limited view has wrong type"
+    assert best_buy.order([(catalog[0], 5), (catalog[2], 1)]) == 510, "Order price calculated wrong"
+    assert best_buy.total_quantity == 495, "Store total quantity is wrong"
+
+
+def test_promotion_sets_are_interned():
+    # Test that products with the same promotions share one promotions tuple
+    second_half_price = SecondHalfPrice("Second Half price!")
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    pixel = Product("Google Pixel 7", price=100, quantity=250)
+    mac.set_promotion(second_half_price)
+    pixel.set_promotion(second_half_price)
+    assert mac._promotions is pixel._promotions, "Promotion sets aren't shared"
+    assert not hasattr(mac, '__dict__'), "Product has a per-instance dictionary"
+
+
+def test_catalog_views_pickle_as_products():
+    # Test that views are smaller than products and are pickled as regular products detached from the catalog
+    second_half_price = SecondHalfPrice("Second Half price!")
+    catalog = ArrayCatalog()
+    catalog.append(PRODUCT, "Google Pixel 7", 100, quantity=250, sku="PIX")
+    catalog.append(LIMITED, "Shipping", 10, quantity=250, maximum=1, sku="SHIP", promotions=[second_half_price])
+    pixel, shipping = catalog
+    assert sys.getsizeof(pixel) < sys.getsizeof(Product("Google Pixel 7", price=100, quantity=250)), \
+        "Catalog view carries the fields of a regular product"
+    copied_pixel, copied_shipping = pickle.loads(pickle.dumps([pixel, shipping]))
+    assert type(copied_pixel) is Product and type(copied_shipping) is LimitedProduct, "View wasn't pickled as a product"
+    assert (copied_shipping.name, copied_shipping.price, copied_shipping.quantity, copied_shipping.maximum,
+            copied_shipping.sku) == ("Shipping", 10, 250, 1, "SHIP"), "Pickled view lost its fields"
+    assert len(copied_shipping._promotions) == 1, "Pickled view lost its promotions"
+    copied_pixel.buy(5)
+    assert pixel.quantity == 250, "Pickled view still writes to the catalog"
+
+
+def test_interned_promotions_are_bounded(monkeypatch):
+    # Test that the oldest interned chains are forgotten while products keep their promotions
+    monkeypatch.setattr(products, '_interned_promotions', {})
+    monkeypatch.setattr(products, 'INTERNED_PROMOTIONS_LIMIT', 4)
+    first = Product("MacBook Air M2", price=1450, quantity=100)
+    first.set_promotion(SecondHalfPrice("Second Half price!"))
+    for number in range(10):
+        Product(f"Product {number}", price=1, quantity=1).set_promotion(SecondHalfPrice(f"Deal {number}"))
+    assert len(products._interned_promotions) == 4, "Interned chains weren't bounded"
+    assert first.buy(2) == 2175, "Forgotten chain broke the product pricing"
+
+
+def test_catalog_keeps_views_only_while_used():
+    # Test that views nobody uses are released and prices are read as they were given
+    catalog = ArrayCatalog()
+    for number in range(1000):
+        catalog.append(PRODUCT, f"Product {number}", number + 0.0 if number % 2 else number, quantity=1)
+    prices = [product.price for product in catalog]
+    gc.collect()
+    assert len(catalog._views) == 0, "Views outlived the scan"
+    assert type(prices[1]) is float and type(prices[2]) is int, "Price type changed"
+    kept = catalog[7]
+    kept.buy(1)
+    assert catalog[7] is kept and not catalog[7].is_active, "Used view wasn't kept"
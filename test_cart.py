@@ -0,0 +1,46 @@
+import pytest
+
+from cart import Cart
+from products import Product, LimitedProduct
+from promotions import SecondHalfPrice
+from store import Store
+
+
+def test_cart_reprices_changed_line():
+    # Test that adding to a cart line re-prices the whole line with promotions
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    mac.set_promotion(SecondHalfPrice("Second Half price!"))
+    pixel = Product("Google Pixel 7", price=100, quantity=250)
+    cart = Cart(Store([mac, pixel]))
+    cart.add(mac, 1)
+    cart.add(pixel, 3)
+    cart.add(mac, 1)
+    assert cart[mac] == 2 and cart.get(pixel) == 3, "Cart quantities are wrong"
+    assert cart.total == 2475, "Cart total calculated wrong"
+    assert mac.quantity == 100, "Adding to cart changed product quantity"
+
+
+def test_cart_rejects_unavailable_quantity():
+    # Test that a cart line can't exceed stock or maximum per order
+    mac = Product("MacBook Air M2", price=1450, quantity=2)
+    shipping = LimitedProduct("Shipping", price=10, quantity=250, maximum=1)
+    cart = Cart(Store([mac, shipping]))
+    cart.add(mac, 2)
+    cart.add(shipping, 1)
+    with pytest.raises(ValueError):
+        cart.add(mac, 1)
+    with pytest.raises(ValueError):
+        cart.add(shipping, 1)
+    assert cart.items() == [(mac, 2), (shipping, 1)], "Rejected line changed the cart"
+
+
+def test_checkout_orders_all_lines():
+    # Test that checkout reduces quantities of all lines and empties the cart
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=10)
+    cart = Cart(Store([mac, pixel]))
+    cart.add(mac, 1)
+    cart.add(pixel, 4)
+    assert cart.checkout() == 1850, "Checkout total calculated wrong"
+    assert (mac.quantity, pixel.quantity) == (9, 6), "Checkout didn't reduce quantities"
+    assert not cart, "Cart isn't empty after checkout"
@@ -0,0 +1,73 @@
+import catalog_import
+from products import NonStockedProduct, LimitedProduct
+from promotions import SecondHalfPrice
+
+CSV_CATALOG = '''type,name,price,quantity,maximum,sku,promotions
+product,MacBook Air M2,1450,100,,MBA,second_half
+product,Broken Laptop,-5,1,,,
+non_stocked,Windows License,125,,,WIN,
+limited,Shipping,10,250,1,SHIP,
+gadget,Unknown Gadget,10,1,,,
+product,Google Pixel 7,100,250,,PIX,unknown_promo
+'''
+
+
+def test_csv_import_skips_bad_rows(tmp_path):
+    # Test that valid rows are imported and bad rows are reported with line numbers
+    path = tmp_path / 'catalog.csv'
+    path.write_text(CSV_CATALOG)
+    second_half_price = SecondHalfPrice("Second Half price!")
+    result = catalog_import.import_catalog(str(path), {'second_half': second_half_price}, chunk_size=2)
+    best_buy = result.store
+    assert result.imported == 3, "Wrong number of imported products"
+    assert [line for line, _ in result.errors] == [3, 6, 7], "Bad rows reported with wrong line numbers"
+    assert best_buy.total_quantity == 350, "Imported quantities are wrong"
+    assert isinstance(best_buy.get_product("WIN"), NonStockedProduct), "Non stocked product type is wrong"
+    assert best_buy.get_product("SHIP").maximum == 1, "Limited product maximum is wrong"
+    assert best_buy.get_product("MBA").buy(2) == 2175, "Imported promotion isn't applied"
+
+
+def test_jsonl_import_reports_invalid_json(tmp_path):
+    # Test that a line which is not JSON doesn't abort the import
+    path = tmp_path / 'catalog.jsonl'
+    path.write_text('{"name": "MacBook Air M2", "price": 1450, "quantity": 100}\n'
+                    '{"name": "Google Pixel 7", "price": 100,\n'
+                    '{"type": "limited", "name": "Shipping", "price": 10, "maximum": 1}\n')
+    result = catalog_import.import_catalog(str(path))
+    assert result.imported == 2, "Valid rows after a broken line weren't imported"
+    assert result.error_count == 1 and result.errors[0][0] == 2, "Broken line wasn't reported"
+    assert any(isinstance(product, LimitedProduct) for product in result.store), "Limited product is missing"
+
+
+def test_duplicate_skus_are_reported(tmp_path):
+    # Test that rows repeating a sku of an earlier row or of the store are reported instead of dropped silently
+    path = tmp_path / 'catalog.csv'
+    path.write_text('name,price,quantity,sku\n'
+                    'MacBook Air M2,1450,100,MBA\n'
+                    'Google Pixel 7,100,250,PIX\n'
+                    'Another MacBook,1500,5,MBA\n'
+                    'Bose Earbuds,250,50,EAR\n'
+                    'Another Pixel,120,5,PIX\n')
+    result = catalog_import.import_catalog(str(path), chunk_size=2)
+    assert result.imported == 3, "Wrong number of imported products"
+    assert result.errors == [(4, "Duplicate sku 'MBA'."), (6, "Duplicate sku 'PIX'.")], \
+        "Duplicate rows weren't reported"
+    assert result.store.get_product("MBA").quantity == 100, "Duplicate row replaced the first one"
+    again = catalog_import.import_catalog(str(path), store_obj=result.store)
+    assert again.imported == 0 and again.error_count == 5, "Skus already in the store weren't reported"
+
+
+def test_non_finite_and_boolean_numbers_are_rejected(tmp_path):
+    # Test that nan, infinite and boolean prices or quantities are reported instead of imported
+    path = tmp_path / 'catalog.jsonl'
+    path.write_text('{"name": "MacBook Air M2", "price": 1450, "quantity": 100}\n'
+                    '{"name": "Google Pixel 7", "price": "nan", "quantity": 250}\n'
+                    '{"name": "Bose Earbuds", "price": NaN, "quantity": 50}\n'
+                    '{"name": "Windows License", "price": "inf", "quantity": 5}\n'
+                    '{"name": "Shipping", "price": 10, "quantity": true}\n'
+                    '{"name": "Gift wrap", "price": false, "quantity": 5}\n')
+    result = catalog_import.import_catalog(str(path))
+    assert result.imported == 1, "Invalid numbers were imported"
+    assert [line for line, _ in result.errors] == [2, 3, 4, 5, 6], "Invalid numbers weren't reported"
+    assert result.errors[0][1] == "price should be a finite number, got 'nan'." \
+        and result.errors[3][1] == "quantity should be a number, got True.", "Wrong errors were reported"
@@ -0,0 +1,58 @@
+import array_catalog
+import catalog_snapshot
+import main
+from products import LimitedBase, NonStockedBase, Product
+from store import Store
+
+
+def test_snapshot_round_trip(tmp_path):
+    # Test that all product classes, skus, promotions and states survive a snapshot round trip
+    best_buy = main.create_store()
+    best_buy.add_product(Product("Google Pixel 8", price=699.99, quantity=3, sku="PIX8"))
+    best_buy.add_product(Product("USB cable", price=10.0, quantity=3, sku="USB"))
+    best_buy.all_products[1].deactivate()
+    path = tmp_path / 'catalog.bbcs'
+    assert catalog_snapshot.write_snapshot(best_buy, path) == 7, "Not all products were written"
+    catalog = catalog_snapshot.load(path)
+    assert len(catalog) == 7, "Not all products were loaded"
+    for original, loaded in zip(best_buy, catalog):
+        assert loaded._product_class is type(original), "Product class wasn't restored"
+        assert (loaded.name, loaded.sku, loaded.price, loaded.quantity, loaded.is_active) == \
+            (original.name, original.sku, original.price, original.quantity, original.is_active), \
+            "Product fields weren't restored"
+        assert [str(promo) for promo in loaded._promotions] == [str(promo) for promo in original._promotions], \
+            "Promotions weren't restored"
+    assert isinstance(catalog[3], NonStockedBase) and isinstance(catalog[4], LimitedBase), \
+        "Product kinds were mixed up"
+    assert catalog[4].maximum == 1 and catalog[5].price == 699.99, "Columns were read wrong"
+    assert str(catalog[6]) == "USB cable, Price: $10.0, Quantity: 3", "Float price was read as an integer"
+    assert catalog[3]._promotions[0] is catalog[3]._promotions[0], "Promotions aren't shared"
+    loaded_store = catalog.to_store()
+    assert loaded_store.order([(catalog[0], 2), (catalog[3], 1)]) == best_buy.quote([(best_buy.all_products[0], 2),
+                                                                                      (best_buy.all_products[2], 1)]), \
+        "Loaded store prices orders differently"
+    assert catalog[0].quantity == 98 and catalog_snapshot.load(path)[0].quantity == 100, \
+        "Order changed the snapshot file"
+
+
+def test_catalog_store_creates_products_on_access(tmp_path):
+    # Test that a store over a snapshot creates only the products it touches and keeps its aggregates
+    path = tmp_path / 'catalog.bbcs'
+    catalog_snapshot.write_snapshot(
+        Store([Product(f"Product {number}", price=number + 1, quantity=10, sku=number) for number in range(100)]), path)
+    catalog = catalog_snapshot.load(path)
+    best_buy = array_catalog.CatalogStore(catalog)
+    assert not catalog._views, "Opening the store created products"
+    main.print_all_products(best_buy, page=1)
+    assert len(catalog._views) == main.PAGE_SIZE, "Listing a page created products of other pages"
+    assert main.product_position(best_buy, best_buy.get_product(57)) == 57, "Listing position is wrong"
+    assert best_buy.order([(best_buy.get_product(3), 10), (best_buy.get_product(7), 2)]) == 56, \
+        "Order price calculated wrong"
+    assert best_buy.total_quantity == 988 and len(best_buy.all_products) == 99, "Sold out product is still listed"
+    best_buy.add_product(Product("Google Pixel 8", price=699.99, quantity=3, sku="PIX8"))
+    best_buy.remove_product(best_buy.get_product(0))
+    assert best_buy.get_product(0) is None and len(best_buy) == 100, "Store products weren't updated"
+    assert best_buy.all_products[-1].sku == "PIX8" and main.product_position(best_buy, best_buy.get_product(1)) == 0, \
+        "Listing doesn't follow added and removed products"
+    assert [product.sku for product in best_buy.cheapest_products(2)] == [1, 2], "Price index is wrong"
+    best_buy._verify_invariants()
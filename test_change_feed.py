@@ -0,0 +1,52 @@
+import threading
+
+from change_feed import ChangeFeed
+from products import Product
+from store import Store
+
+
+def test_poll_coalesces_changes():
+    # Test that repeated changes of one product are pulled as one change with the oldest state
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    best_buy = Store([mac])
+    feed = ChangeFeed(best_buy)
+    pixel = Product("Google Pixel 7", price=100, quantity=5)
+    best_buy.add_product(pixel)
+    mac.buy(1)
+    mac.buy(2)
+    pixel.deactivate()
+    batch = feed.poll(0)
+    assert batch.cursor == 4 and not batch.resync, "Cursor doesn't follow the feed"
+    assert [(change.product, change.old_quantity, change.kind) for change in batch.changes] == \
+        [(mac, 10, 'updated'), (pixel, 0, 'added')], "Changes weren't coalesced"
+    best_buy.remove_product(mac)
+    assert feed.poll(batch.cursor).changes[0].kind == 'removed', "Removed product wasn't reported"
+    assert feed.poll(feed.sequence).changes == [], "Up to date consumer got changes"
+    feed.close()
+
+
+def test_lagging_consumer_gets_resync():
+    # Test that a consumer whose cursor left the ring buffer is told to resync
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    feed = ChangeFeed(Store([mac]), capacity=4)
+    for _ in range(6):
+        mac.buy(1)
+    batch = feed.poll(1)
+    assert batch.resync and batch.cursor == 6, "Lagging consumer wasn't told to resync"
+    assert len(feed.poll(2).changes) == 1 and not feed.poll(2).resync, "Buffered changes weren't returned"
+    feed.close()
+
+
+def test_subscription_delivers_batches():
+    # Test that a subscriber gets new changes from a background thread
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    best_buy = Store([mac])
+    feed = ChangeFeed(best_buy)
+    delivered = threading.Event()
+    batches = []
+    subscription = feed.subscribe(lambda batch: (batches.append(batch), delivered.set()))
+    best_buy.order([(mac, 3)])
+    assert delivered.wait(5), "Change wasn't delivered"
+    feed.unsubscribe(subscription)
+    assert batches[0].changes[0].old_quantity == 100, "Delivered change has wrong state"
+    feed.close()
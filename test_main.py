@@ -0,0 +1,58 @@
+import main
+from products import Product
+from store import Store
+
+
+def test_rendered_row_follows_product_changes(monkeypatch):
+    # Test that a cached listing row is rebuilt after the product quantity changes
+    monkeypatch.setattr(main, '_rendered_rows', {})
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    first = main.render_product_row(mac)
+    assert main.render_product_row(mac) is first, "Listing row wasn't cached"
+    mac.buy(1)
+    assert main.render_product_row(mac) == "MacBook Air M2, Price: $1450, Quantity: 99", \
+        "Listing row wasn't rebuilt after a buy"
+    assert main.render_product_row(mac, {mac: 9}) == "MacBook Air M2, Price: $1450, Quantity: 90", \
+        "Listing row doesn't show amount already in the order"
+
+
+def test_rendered_rows_are_kept_per_product(monkeypatch):
+    # Test that products sharing a sku and a version get their own rows and old rows are forgotten
+    monkeypatch.setattr(main, '_rendered_rows', {})
+    monkeypatch.setattr(main, 'RENDERED_ROWS_LIMIT', 3)
+    main.render_product_row(Product("MacBook Air M2", price=1450, quantity=100, sku="MBA"))
+    assert main.render_product_row(Product("MacBook Pro", price=2450, quantity=5, sku="MBA")) == \
+        "MacBook Pro, Price: $2450, Quantity: 5", "Row of another product with the same sku was shown"
+    for number in range(5):
+        main.render_product_row(Product(f"Product {number}", price=1, quantity=1, sku=number))
+    assert list(main._rendered_rows) == [2, 3, 4], "Oldest rows weren't forgotten"
+
+
+def test_paginated_listing(capsys):
+    # Test that a page lists only its products and continues numbering
+    best_buy = Store([Product(f"Product {number}", price=number + 1, quantity=1) for number in range(45)])
+    main.print_all_products(best_buy, page=2, page_size=20)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].startswith("41. Product 40") and lines[5].startswith("45. Product 44"), \
+        "Page shows wrong products"
+    assert lines[6].startswith("Page 3 of 3."), "Page footer is missing"
+
+
+def test_product_chosen_by_typed_name(monkeypatch, capsys):
+    # Test that a typed name picks the only matching product and lists several matches by number
+    best_buy = main.create_store()
+    answers = iter(["pixel", "o", "2"])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    assert main.ask_user_product_index(best_buy) == 2, "Typed name didn't pick the product"
+    assert main.ask_user_product_index(best_buy) == 1, "Number after a search didn't pick the product"
+    listed = capsys.readouterr().out
+    assert listed.count("2. Bose QuietComfort Earbuds") == 3, "Matches weren't listed once after the listings"
+
+
+def test_slow_name_index_build_is_announced(monkeypatch, capsys):
+    # Test that the first search of a large store says the name index is being built
+    monkeypatch.setattr(main, 'SLOW_NAME_INDEX_SIZE', 5)
+    best_buy = main.create_store()
+    main.find_product_index(best_buy, "pixel")
+    main.find_product_index(best_buy, "bose")
+    assert capsys.readouterr().out.count("Indexing names of") == 1, "Index build wasn't announced once"
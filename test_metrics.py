@@ -0,0 +1,65 @@
+import pytest
+
+import metrics
+from products import Product
+from promotions import SecondHalfPrice
+from store import Store
+
+
+@pytest.fixture
+def enabled_metrics():
+    # Enable instrumentation with clean counters for one test
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.stop_profiling_slow_orders()
+    metrics.reset()
+
+
+def counter(snapshot, name, **labels):
+    # Return value of a counter from a metrics snapshot
+    return next(item['value'] for item in snapshot['counters']
+                if item['name'] == name and item['labels'] == labels)
+
+
+def test_orders_are_counted(enabled_metrics):
+    # Test that orders, buys and promotions are recorded per product and per promotion
+    mac = Product("MacBook Air M2", price=1450, quantity=100, sku="MBA")
+    mac.set_promotion(SecondHalfPrice("Second Half price!"))
+    best_buy = Store([mac])
+    best_buy.order([(mac, 2)])
+    best_buy.order([(mac, 1)])
+    best_buy.order([(mac, 1)], False)
+    best_buy.order([(mac, 1)], product_quantity_reduction=False)
+    snapshot = metrics.snapshot()
+    assert counter(snapshot, 'store_orders_total') == 4, "Orders weren't counted"
+    assert counter(snapshot, 'store_order_revenue_total') == 3625, "Revenue wasn't summed over stock reducing orders"
+    assert counter(snapshot, 'store_order_units_total') == 3, "Units of quotes were counted"
+    assert counter(snapshot, 'product_units_total', product="MBA") == 3, "Units weren't counted per product"
+    assert counter(snapshot, 'promotion_applied_total', product="MBA", promotion="SecondHalfPrice") == 1, \
+        "Applied promotion wasn't counted"
+    text = metrics.prometheus_text()
+    assert '# TYPE store_order_seconds histogram' in text, "Histogram type is missing in Prometheus dump"
+    assert 'store_order_seconds_count 4' in text, "Histogram count is wrong in Prometheus dump"
+    assert 'product_revenue_total{product="MBA"} 3625' in text, "Labelled counter is missing in Prometheus dump"
+
+
+def test_disabled_metrics_record_nothing():
+    # Test that nothing is recorded while instrumentation is disabled
+    metrics.reset()
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    Store([mac]).order([(mac, 1)])
+    assert metrics.snapshot() == {'counters': [], 'histograms': []}, "Disabled metrics recorded values"
+
+
+def test_slow_orders_are_profiled(enabled_metrics):
+    # Test that sampled orders over the threshold are reported with profile stats
+    reports = []
+    metrics.profile_slow_orders(0, lambda seconds, shopping_list, stats: reports.append(stats), sample_every=2)
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    best_buy = Store([mac])
+    for _ in range(4):
+        best_buy.order([(mac, 1)])
+    assert len(reports) == 4, "Slow orders weren't reported"
+    assert sum(stats is not None for stats in reports) == 2, "Every second order wasn't profiled"
@@ -0,0 +1,88 @@
+import os
+import signal
+import subprocess
+import sys
+
+import persistence
+from products import Product
+from store import Store
+
+CRASHING_CUSTOMER = '''
+import sys
+import persistence
+import test_persistence
+
+best_buy = test_persistence.make_store()
+journal = persistence.InventoryJournal(best_buy, sys.argv[1], durability="always", snapshot_every=25)
+mac, pixel = best_buy.get_product("MBA"), best_buy.get_product("PIX")
+orders = 0
+while True:
+    best_buy.order([(mac, 1), (pixel, 2)])
+    orders += 1
+    print(orders, flush=True)
+'''
+
+
+def make_store():
+    # Build the catalog shared by the crashing process and the recovery check
+    return Store([Product("MacBook Air M2", price=1450, quantity=100000, sku="MBA"),
+                  Product("Google Pixel 7", price=100, quantity=200000, sku="PIX")])
+
+
+def test_recovery_after_kill(tmp_path):
+    # Test that killing a process mid-write loses no acknowledged order and tears no order apart
+    process = subprocess.Popen([sys.executable, '-c', CRASHING_CUSTOMER, str(tmp_path)],
+                               stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+    acknowledged = 0
+    while acknowledged < 120:
+        acknowledged = int(process.stdout.readline())
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    best_buy = make_store()
+    journal = persistence.InventoryJournal(best_buy, str(tmp_path))
+    journal.close()
+    recovered_orders = 100000 - best_buy.get_product("MBA").quantity
+    assert recovered_orders >= acknowledged, "Acknowledged orders were lost"
+    assert 200000 - best_buy.get_product("PIX").quantity == 2 * recovered_orders, "An order was partially recovered"
+
+
+def test_torn_record_is_ignored(tmp_path):
+    # Test that an incomplete last record is dropped and new records are appended after valid ones
+    best_buy = make_store()
+    journal = persistence.InventoryJournal(best_buy, str(tmp_path), durability='none')
+    best_buy.order([(best_buy.get_product("MBA"), 5)])
+    journal.close()
+    with open(tmp_path / persistence.LOG_NAME, 'ab') as log_file:
+        log_file.write(b'{"seq":2,"changes":[["MBA",0,')
+    best_buy = make_store()
+    journal = persistence.InventoryJournal(best_buy, str(tmp_path), durability='group')
+    best_buy.order([(best_buy.get_product("PIX"), 7)])
+    journal.close()
+    best_buy = make_store()
+    persistence.recover(best_buy, str(tmp_path))
+    assert best_buy.get_product("MBA").quantity == 99995, "Logged order wasn't recovered"
+    assert best_buy.get_product("PIX").quantity == 199993, "Order after a torn record wasn't recovered"
+
+
+def test_snapshot_restores_inactive_product(tmp_path):
+    # Test that a snapshot restores quantities and active states
+    best_buy = make_store()
+    journal = persistence.InventoryJournal(best_buy, str(tmp_path))
+    best_buy.get_product("MBA").quantity = 0
+    journal.snapshot()
+    journal.close()
+    best_buy = make_store()
+    persistence.recover(best_buy, str(tmp_path))
+    assert not best_buy.get_product("MBA").is_active, "Sold out product became active"
+    assert best_buy.total_quantity == 200000, "Snapshot restored wrong quantities"
+
+
+def test_unsynced_records_reach_the_file(tmp_path):
+    # Test that without fsync every record is still handed to the operating system before the order returns
+    best_buy = make_store()
+    journal = persistence.InventoryJournal(best_buy, str(tmp_path), durability='none')
+    best_buy.order([(best_buy.get_product("MBA"), 3)])
+    recovered = make_store()
+    persistence.recover(recovered, str(tmp_path))
+    journal.close()
+    assert recovered.get_product("MBA").quantity == 99997, "Record stayed in the process buffer"
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from products import Product, NonStockedProduct, LimitedProduct
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount
+from schedule import PromotionSchedule
+from store import Store
+
+np = pytest.importorskip("numpy")
+pricing = pytest.importorskip("pricing")
+
+
+def make_store(seed):
+    # Build a store with every product type and every promotion stacking combination
+    rng = random.Random(seed)
+    promos = [SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!"),
+              PercentDiscount("30% off!", percent=30), PercentDiscount("15% off!", percent=15)]
+    product_list = []
+    for number in range(60):
+        price = rng.choice([rng.randint(1, 2000), round(rng.uniform(0.01, 999.99), 2)])
+        kind = number % 3
+        if kind == 0:
+            product = Product(f"Product {number}", price=price, quantity=rng.randint(1, 100))
+        elif kind == 1:
+            product = NonStockedProduct(f"License {number}", price=price)
+        else:
+            product = LimitedProduct(f"Shipping {number}", price=price, quantity=50, maximum=rng.randint(1, 5))
+        for promo in rng.sample(promos, rng.randint(0, 3)):
+            product.set_promotion(promo)
+        product_list.append(product)
+    return Store(product_list)
+
+
+def random_lines(columns, rng, count):
+    # Generate valid order lines for the store behind columns
+    sku_index, quantity = [], []
+    for _ in range(count):
+        row = rng.randrange(len(columns))
+        product = columns.products[row]
+        if isinstance(product, LimitedProduct):
+            limit = product.maximum
+        elif isinstance(product, NonStockedProduct):
+            limit = 40
+        else:
+            limit = product.quantity
+        sku_index.append(row)
+        quantity.append(rng.randint(1, limit))
+    return sku_index, quantity
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_quote_matches_scalar_buy(seed, capsys):
+    # Test that vectorized line and order totals equal the scalar Product.buy path exactly
+    rng = random.Random(seed)
+    best_buy = make_store(seed)
+    columns = pricing.PriceColumns(best_buy)
+    sku_index, quantity = random_lines(columns, rng, 2000)
+    order_id = sorted(rng.randrange(300) for _ in range(2000))
+    line_totals, order_totals = columns.quote(sku_index, quantity, order_id)
+    expected_orders = [0] * 300
+    for line, (row, amount) in enumerate(zip(sku_index, quantity)):
+        expected = columns.products[row].buy(amount, reduce_product_quantity=False)
+        assert line_totals[line] == expected, f"Line {line} price differs from Product.buy"
+        expected_orders[order_id[line]] += expected
+    assert list(order_totals) == expected_orders, "Order totals differ from Store.order sums"
+
+
+def test_batch_quote_rejects_too_many():
+    # Test that ordering more than in stock invokes exception
+    best_buy = Store([Product("MacBook Air M2", price=1450, quantity=2)])
+    columns = pricing.PriceColumns(best_buy)
+    with pytest.raises(ValueError, match='can not be ordered'):
+        columns.quote([0], [3])
+
+
+def test_batch_quote_applies_schedule():
+    # Test that vectorized quotes stack promotions scheduled at the given moment like Store.quote
+    schedule = PromotionSchedule(retention=None)
+    flash_sale = PercentDiscount("Flash sale!", percent=50)
+    schedule.add(flash_sale, 100, 200)
+    schedule.add(SecondHalfPrice("Second Half price!"), 150, 300, skus=["MBA"])
+    mac = Product("MacBook Air M2", price=1450, quantity=100, sku="MBA")
+    mac.set_promotion(flash_sale)
+    best_buy = Store([mac, Product("Google Pixel 7", price=100, quantity=250, sku="PIX")], schedule=schedule)
+    columns = pricing.PriceColumns(best_buy)
+    for at in (50, 120, 160, 250):
+        line_totals, _ = columns.quote([0, 1, 0], [2, 3, 1], at=at)
+        expected = [best_buy.quote([(product, amount)], at=at)
+                    for product, amount in ((mac, 2), (columns.products[1], 3), (mac, 1))]
+        assert list(line_totals) == expected, f"Scheduled prices at {at} differ from Store.quote"
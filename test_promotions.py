@@ -0,0 +1,43 @@
+import promotions
+from products import Product
+
+
+def test_promotions_do_not_print(capsys):
+    # Test that applying promotions has no console output without subscribers
+    pixel = Product("Google Pixel 7", price=100, quantity=250)
+    pixel.set_promotion(promotions.ThirdOneFree("Third One Free!"))
+    pixel.set_promotion(promotions.SecondHalfPrice("Second Half price!"))
+    assert pixel.buy(6) == 300, "Order price calculated wrong"
+    assert capsys.readouterr().out == "", "Promotion application printed to console"
+
+
+def test_subscriber_receives_applied_promotions():
+    # Test that subscribers are notified about applied promotions in stacking order
+    third_one_free = promotions.ThirdOneFree("Third One Free!")
+    thirty_percent = promotions.PercentDiscount("30% off!", percent=30)
+    pixel = Product("Google Pixel 7", price=100, quantity=250)
+    pixel.set_promotion(third_one_free)
+    pixel.set_promotion(thirty_percent)
+    events = []
+
+    def subscriber(promotion, product, quantity):
+        events.append((promotion, product, quantity))
+
+    promotions.subscribe(subscriber)
+    try:
+        pixel.buy(2)
+        pixel.buy(3)
+    finally:
+        promotions.unsubscribe(subscriber)
+    assert events == [(thirty_percent, pixel, 2), (third_one_free, pixel, 3), (thirty_percent, pixel, 3)], \
+        "Wrong promotion events reported"
+
+
+def test_removed_promotion_is_not_applied():
+    # Test that removing a promotion rebuilds the product pricing
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    second_half_price = promotions.SecondHalfPrice("Second Half price!")
+    mac.set_promotion(second_half_price)
+    assert mac.buy(2, reduce_product_quantity=False) == 2175, "Promotion wasn't applied"
+    mac.remove_promotion(second_half_price)
+    assert mac.buy(2, reduce_product_quantity=False) == 2900, "Removed promotion was applied"
@@ -0,0 +1,47 @@
+import pytest
+
+from products import Product
+from promotions import PercentDiscount
+from quote_cache import QuoteCache
+from store import Store
+
+
+def test_cached_quote_follows_price_changes():
+    # Test that quotes are cached by quantity and recalculated after promotion or activation changes
+    cache = QuoteCache()
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    assert cache.quote(mac, 2) == 2900 and cache.quote(mac, 2) == 2900, "Quote has wrong price"
+    assert (cache.hits, cache.misses) == (1, 1), "Repeated quote wasn't served from cache"
+    mac.buy(1)
+    assert cache.quote(mac, 2) == 2900 and cache.hits == 2, "Quantity change invalidated cached price"
+    discount = PercentDiscount("30% off!", percent=30)
+    mac.set_promotion(discount)
+    assert cache.quote(mac, 2) == 2030, "Stale price returned after promotion was added"
+    mac.remove_promotion(discount)
+    mac.deactivate()
+    assert cache.quote(mac, 2) == 2900 and cache.misses == 3, "Stale price returned after promotion was removed"
+    with pytest.raises(ValueError):
+        cache.quote(mac, 100)
+
+
+def test_cache_evicts_least_recently_used():
+    # Test that the cache is bounded and evicts the least recently used quote
+    cache = QuoteCache(maxsize=2)
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    cache.quote(mac, 1)
+    cache.quote(mac, 2)
+    cache.quote(mac, 1)
+    cache.quote(mac, 3)
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2}, \
+        "Cache statistics are wrong"
+    cache.quote(mac, 1)
+    assert cache.hits == 2, "Recently used quote was evicted"
+
+
+def test_store_quotes_use_cache():
+    # Test that store quotes and orders without quantity reduction go through the cache
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    best_buy = Store([mac], quote_cache=QuoteCache())
+    assert best_buy.quote([(mac, 2)]) == 2900, "Store quote has wrong price"
+    assert best_buy.order([(mac, 2)], False) == 2900, "Order without reduction has wrong price"
+    assert best_buy.quote_cache.hits == 1 and mac.quantity == 100, "Order without reduction didn't use the cache"
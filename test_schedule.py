@@ -0,0 +1,82 @@
+import pytest
+
+from products import Product
+from promotions import PercentDiscount, SecondHalfPrice
+from schedule import PromotionSchedule
+from quote_cache import QuoteCache
+from store import Store
+
+
+def test_active_promotions_follow_windows():
+    # Test that promotions are valid only inside their windows, catalog wide or per sku
+    flash_sale = PercentDiscount("Flash sale!", percent=50)
+    second_half = SecondHalfPrice("Second Half price!")
+    schedule = PromotionSchedule(retention=None)
+    schedule.add(flash_sale, 100, 200)
+    schedule.add(second_half, 150, 300, skus=["MBA"])
+    assert schedule.active("MBA", 99) == () and schedule.active("MBA", 300) == (), "Promotion valid outside window"
+    assert schedule.active("MBA", 100) == (flash_sale,), "Catalog wide promotion isn't valid at window start"
+    assert schedule.active("MBA", 150) == (flash_sale, second_half), "Overlapping promotions weren't stacked"
+    assert schedule.active("PIX", 150) == (flash_sale,), "Sku promotion applies to another product"
+    assert schedule.active("MBA", 200) == (second_half,), "Promotion still valid at window end"
+    assert schedule.prune(250) == 1 and len(schedule) == 1, "Ended window wasn't pruned"
+    with pytest.raises(ValueError):
+        schedule.add(flash_sale, 10, 10)
+
+
+def test_store_prices_at_timestamp():
+    # Test that quotes and orders apply promotions scheduled at the given moment
+    mac = Product("MacBook Air M2", price=1450, quantity=100, sku="MBA")
+    schedule = PromotionSchedule(retention=None)
+    schedule.add(PercentDiscount("Flash sale!", percent=50), 100, 200)
+    best_buy = Store([mac], schedule=schedule)
+    assert best_buy.quote([(mac, 2)], at=150) == 1450, "Scheduled promotion wasn't applied to a quote"
+    assert best_buy.quote([(mac, 2)], at=250) == 2900, "Expired promotion was applied to a quote"
+    assert best_buy.order([(mac, 1)], at=199) == 725 and mac.quantity == 99, "Scheduled order has wrong price"
+    assert best_buy.order([(mac, 1)]) == 1450, "Promotion scheduled in the past was applied now"
+
+
+def test_federated_store_prices_through_members():
+    # Test that a federated quote and order use the schedule and the quote cache of the owning member
+    mac = Product("MacBook Air M2", price=500, quantity=100, sku="MBA")
+    pixel = Product("Google Pixel 7", price=100, quantity=100, sku="PIX")
+    schedule = PromotionSchedule(retention=None)
+    schedule.add(PercentDiscount("Flash sale!", percent=50), 100, 200)
+    europe, america = Store([mac], schedule=schedule), Store([pixel], quote_cache=QuoteCache())
+    combined = europe + america
+    assert europe.quote([(mac, 2)], at=150) == 500, "Member didn't apply its schedule"
+    assert combined.quote([(mac, 2), (pixel, 1)], at=150) == 600, "Federated quote ignored the member schedule"
+    assert combined.order([(pixel, 1)], product_quantity_reduction=False) == 100 and america.quote_cache.misses == 1, \
+        "Federated order didn't use the member quote cache"
+    assert combined.order([(mac, 2)], at=150) == 500 and mac.quantity == 98, "Federated order has wrong price"
+
+
+def test_sku_windows_leave_segments_alone():
+    # Test that windows of some skus are kept per sku instead of splitting the catalog wide segments
+    flash_sale = PercentDiscount("Flash sale!", percent=50)
+    schedule = PromotionSchedule(retention=None)
+    schedule.add(flash_sale, 100, 200)
+    for number in range(100):
+        schedule.add(SecondHalfPrice(f"Deal {number}"), number, number + 10, skus=[number, number + 1])
+    assert schedule._catalog_wide._bounds == [100, 200], "Sku window split the catalog wide segments"
+    assert schedule.active(150, 155) == (flash_sale,), "Catalog wide promotion is missing"
+    assert len(schedule.active(95, 104)) == 2 and schedule.active(95, 104)[0] is flash_sale, \
+        "Sku promotions weren't stacked after the earlier catalog wide one"
+
+
+def test_ended_windows_expire():
+    # Test that windows ended longer than the retention ago are dropped while new windows are added
+    now = [0]
+    schedule = PromotionSchedule(retention=10, clock=lambda: now[0])
+    flash_sale = PercentDiscount("Flash sale!", percent=50)
+    schedule.add(flash_sale, 0, 20)
+    schedule.add(SecondHalfPrice("Second Half price!"), 0, 20, skus=["MBA"])
+    now[0] = 25
+    schedule.add(flash_sale, 30, 40, skus=["PIX"])
+    assert len(schedule) == 3 and schedule.active("MBA", 15) == (flash_sale, schedule._windows[1][3]), \
+        "Window was dropped before its retention passed"
+    now[0] = 31
+    schedule.add(flash_sale, 50, 60)
+    assert len(schedule) == 2 and "MBA" not in schedule._by_sku, "Ended windows weren't dropped"
+    assert schedule.active("MBA", 15) == () and schedule.active("PIX", 35) == (flash_sale,), \
+        "Remaining windows were changed by expiry"
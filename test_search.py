@@ -0,0 +1,34 @@
+from products import Product
+from search import NameIndex
+from store import Store
+
+
+def test_substring_search_is_ranked_and_paginated():
+    # Test that names containing the query are found ignoring case, best matches first
+    names = ["Google Pixel 7", "Pixel Buds", "USB-C cable for Pixel", "MacBook Air M2", "Pixelated Poster"]
+    index = NameIndex()
+    index.add_many(Product(name, price=10, quantity=1) for name in names)
+    assert [product.name for product in index.search("PIXEL")] == \
+        ["Pixel Buds", "Pixelated Poster", "Google Pixel 7", "USB-C cable for Pixel"], "Matches ranked wrong"
+    assert [product.name for product in index.search("pixel", page=1, page_size=3)] == \
+        ["USB-C cable for Pixel"], "Second page is wrong"
+    assert [product.name for product in index.search("ir")] == ["MacBook Air M2"], "Short query failed"
+    assert [product.name for product in index.prefix("pix")] == ["Pixel Buds", "Pixelated Poster"], \
+        "Prefix query failed"
+
+
+def test_store_name_index_follows_changes():
+    # Test that the store name index is updated by additions, removals and activation changes
+    pixel = Product("Google Pixel 7", price=100, quantity=1)
+    best_buy = Store([pixel])
+    assert best_buy.search_products("pixel") == [pixel], "Product wasn't found"
+    pixel.buy(1)
+    assert best_buy.search_products("pixel") == [], "Inactive product was found"
+    buds = Product("Pixel Buds", price=100, quantity=5)
+    best_buy.add_product(buds)
+    best_buy.apply_adjustments([(pixel.sku, 3)])
+    assert best_buy.search_products("pixel") == [buds, pixel], "Added or restocked product wasn't found"
+    best_buy.remove_product(buds)
+    federated = best_buy + Store([Product("Pixel Stand", price=80, quantity=1)])
+    assert [product.name for product in federated.search_products("pixel")] == ["Pixel Stand", "Google Pixel 7"], \
+        "Federated search didn't merge member results"
@@ -0,0 +1,97 @@
+import asyncio
+
+from products import Product
+from server import Client, OrderService
+from store import Store
+
+
+def run_with_service(store_obj, scenario):
+    # Start the service on a free port, run a client scenario against it and stop the service
+    async def run():
+        service = OrderService(store_obj, queue_size=4, max_batch=8)
+        host, port = await service.start()
+        try:
+            return await scenario(service, host, port)
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+
+def test_quote_does_not_change_store():
+    # Test that a quote returns order price and keeps product quantity
+    mac = Product("MacBook Air M2", price=1450, quantity=10, sku="MBA")
+    best_buy = Store([mac])
+
+    async def scenario(service, host, port):
+        client = await Client.connect(host, port)
+        response = await client.request(op='quote', lines=[["MBA", 2]])
+        await client.close()
+        return response
+
+    assert run_with_service(best_buy, scenario) == {'ok': True, 'total': 2900}, "Wrong quote response"
+    assert mac.quantity == 10, "Quote changed product quantity"
+
+
+def test_concurrent_orders_are_applied():
+    # Test that orders of many clients are applied in micro-batches and rejected when out of stock
+    mac = Product("MacBook Air M2", price=1450, quantity=30, sku="MBA")
+    best_buy = Store([mac])
+
+    async def scenario(service, host, port):
+        async def customer():
+            client = await Client.connect(host, port)
+            responses = [await client.request(op='order', lines=[["MBA", 1]]) for _ in range(5)]
+            await client.close()
+            return responses
+        results = await asyncio.gather(*(customer() for _ in range(8)))
+        client = await Client.connect(host, port)
+        stats = await client.request(op='stats')
+        await client.close()
+        return [response for responses in results for response in responses], stats, service
+
+    responses, stats, service = run_with_service(best_buy, scenario)
+    assert sum(response['ok'] for response in responses) == 30, "Wrong number of accepted orders"
+    assert mac.quantity == 0, "Accepted orders weren't applied to the store"
+    assert stats['latency']['order']['count'] == 40, "Order latencies weren't recorded"
+
+
+def test_unknown_operation():
+    # Test that an unknown operation is answered with an error
+    async def scenario(service, host, port):
+        return await service.handle_request({'op': 'refund'})
+
+    assert not run_with_service(Store([]), scenario)['ok'], "Unknown operation was accepted"
+
+
+def test_writer_survives_subscriber_errors():
+    # Test that a failing store subscriber doesn't fail committed orders and changes are published per batch
+    mac = Product("MacBook Air M2", price=1450, quantity=100, sku="MBA")
+    best_buy = Store([mac])
+    published = []
+
+    def journal(changes):
+        published.append(len(changes))
+        if len(published) == 1:
+            raise OSError("Disk is full.")
+
+    best_buy.subscribe(journal)
+
+    async def scenario(service, host, port):
+        async def customer():
+            client = await Client.connect(host, port)
+            responses = [await client.request(op='order', lines=[["MBA", 1]]) for _ in range(5)]
+            await client.close()
+            return responses
+        results = await asyncio.wait_for(asyncio.gather(*(customer() for _ in range(4))), 5)
+        client = await Client.connect(host, port)
+        stats = await client.request(op='stats')
+        await client.close()
+        return [response for responses in results for response in responses], stats, service
+
+    responses, stats, service = run_with_service(best_buy, scenario)
+    assert all(response['ok'] for response in responses), "Committed order was reported as failed"
+    assert mac.quantity == 80, "Acknowledged orders and stock disagree"
+    assert stats['publish_failures'] == 1 and 'Disk is full' in stats['last_publish_error'], \
+        "Subscriber error wasn't reported"
+    assert sum(published) == 20 and len(published) == sum(service.batch_sizes.values()), \
+        "Changes weren't published once per batch"
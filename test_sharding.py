@@ -0,0 +1,66 @@
+import pytest
+
+from array_catalog import ArrayCatalog, LIMITED, PRODUCT
+from products import LimitedProduct, NonStockedProduct, Product
+from promotions import SecondHalfPrice
+from sharding import ShardedStore, shard_index
+
+
+@pytest.fixture
+def sharded_store():
+    # Start a two shard store with products on both shards
+    mac = Product("MacBook Air M2", price=1450, quantity=10, sku="MBA")
+    mac.set_promotion(SecondHalfPrice("Second Half price!"))
+    catalog = [mac, NonStockedProduct("Windows License", price=125, sku="WIN"),
+               LimitedProduct("Shipping", price=10, maximum=1, quantity=250, sku="SHIP"),
+               LimitedProduct("Gift wrap", price=2, maximum=1, sku="GIFT")]
+    catalog += [Product(f"Product {number}", price=number + 1, quantity=5, sku=number) for number in range(10)]
+    sharded = ShardedStore(catalog, workers=2)
+    yield sharded, {product.sku: product for product in catalog}
+    sharded.close()
+
+
+def test_orders_are_routed_to_shards(sharded_store):
+    # Test that orders of one and of several shards are applied and aggregates are summed over shards
+    sharded, catalog = sharded_store
+    assert {shard_index(sku, 2) for sku in catalog} == {0, 1}, "Catalog doesn't span both shards"
+    assert sharded.total_quantity == 310, "Total quantity wasn't summed over shards"
+    assert len(sharded.all_products) == 14, "Products of all shards weren't listed"
+    assert sharded.order([(catalog["MBA"], 2)]) == 2175, "Single shard order has wrong price"
+    shopping_list = [(catalog[number], 1) for number in range(10)]
+    assert sharded.quote(shopping_list) == 55, "Multi shard quote has wrong price"
+    assert sharded.order(shopping_list) == 55, "Multi shard order has wrong price"
+    assert sharded.total_quantity == 298, "Quantities weren't reduced on all shards"
+    assert sharded.get_product("MBA").quantity == 8, "Shard product wasn't updated"
+
+
+def test_failed_multi_shard_order_changes_nothing(sharded_store):
+    # Test that a multi shard order with one invalid line leaves every shard untouched
+    sharded, catalog = sharded_store
+    shopping_list = [(catalog[number], 1) for number in range(10)] + [(catalog["SHIP"], 2)]
+    with pytest.raises(ValueError):
+        sharded.order(shopping_list)
+    assert sharded.total_quantity == 310, "Failed order reduced quantities"
+    results = sharded.order_many([[(catalog[0], 4)], [(catalog[0], 1)], shopping_list[:10]])
+    assert results[0] == 4 and results[2] == 55, "Batched orders have wrong prices"
+    assert isinstance(results[1], ValueError), "Order over stock wasn't rejected in a batch"
+
+
+def test_limited_products_ignore_reserved_stock(sharded_store):
+    # Test that limited products without quantity are ordered on shards like in a plain store
+    sharded, catalog = sharded_store
+    shopping_list = [(catalog["GIFT"], 1)] + [(catalog[number], 1) for number in range(10)]
+    assert sharded.order(shopping_list) == 57, "Multi shard order of a limited product was rejected"
+    assert sharded.order([(catalog["GIFT"], 1)]) == 2, "Single shard order of a limited product was rejected"
+    with pytest.raises(ValueError):
+        sharded.order([(catalog["GIFT"], 2)])
+
+
+def test_catalog_views_are_sharded():
+    # Test that catalog views are shipped to shard processes as regular products
+    catalog = ArrayCatalog()
+    catalog.append(PRODUCT, "Google Pixel 7", 100, quantity=250, sku="PIX")
+    catalog.append(LIMITED, "Shipping", 10, quantity=250, maximum=1, sku="SHIP")
+    with ShardedStore(list(catalog), workers=2) as sharded:
+        assert sharded.total_quantity == 500, "Shards lost catalog quantities"
+        assert sharded.order([(catalog[0], 2), (catalog[1], 1)]) == 210, "Order of catalog views has wrong price"
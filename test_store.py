@@ -0,0 +1,231 @@
+import random
+import threading
+
+import pytest
+
+from products import NonStockedProduct, Product
+from store import Store
+
+
+@pytest.fixture(autouse=True)
+def check_store_invariants(monkeypatch):
+    # Check maintained store aggregates against full recalculation on every read
+    monkeypatch.setattr(Store, 'check_invariants', True)
+
+
+def test_order_resolves_product_by_sku():
+    # Test that ordering a product does not touch another product with the same price
+    mac = Product("MacBook Air M2", price=100, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=10)
+    best_buy = Store([mac, pixel])
+    assert best_buy.order([(pixel, 3)]) == 300, "Order price calculated wrong"
+    assert mac.quantity == 10, "Product with the same price was bought"
+    assert pixel.quantity == 7, "Ordered product quantity wasn't reduced"
+
+
+def test_order_unknown_product():
+    # Test that ordering a product missing from the store invokes exception
+    best_buy = Store([Product("MacBook Air M2", price=100, quantity=10)])
+    with pytest.raises(ValueError, match='There is no'):
+        best_buy.order([(Product("Google Pixel 7", price=100, quantity=10), 1)])
+
+
+def test_add_and_remove_product_keep_index():
+    # Test that add_product and remove_product keep sku lookups in sync
+    mac = Product("MacBook Air M2", price=1450, quantity=10, sku="MBA-M2")
+    best_buy = Store([])
+    best_buy.add_product(mac)
+    best_buy.add_product(mac)
+    assert best_buy.get_product("MBA-M2") is mac, "Product isn't found by its sku"
+    assert len(best_buy.all_products) == 1, "Duplicate product was added"
+    best_buy.remove_product(mac)
+    assert mac not in best_buy, "Removed product is still in store"
+
+
+def test_store_sum_keeps_index():
+    # Test that a sum of two stores can order products from both of them
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=10)
+    combined = Store([mac]) + Store([pixel])
+    assert mac in combined and pixel in combined, "Product is missing in a sum of stores"
+    assert combined.order([(mac, 1), (pixel, 2)]) == 1650, "Order price calculated wrong"
+
+
+def test_federated_store_is_a_live_view():
+    # Test that a sum of stores sees later member changes and orders through the owning members
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=10)
+    europe, america = Store([mac]), Store([pixel])
+    combined = europe + america + Store([])
+    assert len(combined.members) == 3, "Sums of stores weren't flattened"
+    bose = Product("Bose QuietComfort Earbuds", price=250, quantity=5)
+    america.add_product(bose)
+    assert list(combined.all_products) == [mac, pixel, bose] and combined.all_products[-1] is bose, \
+        "Product added to a member isn't visible"
+    pixel.deactivate()
+    assert len(combined.all_products) == 2 and len(combined) == 3, "Inactive product wasn't hidden from listing"
+    assert combined.total_quantity == 25, "Total quantity wasn't summed over members"
+    with pytest.raises(ValueError):
+        combined.order([(mac, 1), (bose, 6)])
+    assert combined.order([(mac, 1), (bose, 5)]) == 2700, "Order over members has wrong price"
+    assert europe.total_quantity == 9 and america.total_quantity == 10, "Members weren't updated by the order"
+
+
+def test_product_positions_are_cached_per_listing():
+    # Test that listing positions are computed once per listing and federated positions ask the owner
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=10)
+    bose = Product("Bose QuietComfort Earbuds", price=250, quantity=5)
+    europe, america = Store([mac, pixel]), Store([bose])
+    combined = europe + america
+    assert combined.product_position(bose) == 2 and europe.product_position(pixel) == 1, "Position is wrong"
+    positions = europe._positions
+    assert europe.product_position(mac) == 0 and europe._positions is positions, "Positions were recalculated"
+    mac.deactivate()
+    assert combined.product_position(bose) == 1, "Position didn't follow the listing"
+    with pytest.raises(ValueError):
+        combined.product_position(mac)
+
+
+def test_total_quantity_follows_product_changes():
+    # Test that total quantity is kept up to date by product quantity changes and buys
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=5)
+    best_buy = Store([mac, pixel])
+    assert best_buy.total_quantity == 15, "Initial total quantity is wrong"
+    mac.buy(4)
+    pixel.quantity = 20
+    assert best_buy.total_quantity == 26, "Total quantity didn't follow product changes"
+    best_buy.remove_product(pixel)
+    assert best_buy.total_quantity == 6, "Removed product is still counted"
+
+
+def test_all_products_follows_activation():
+    # Test that the cached active products view follows activation changes
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=5)
+    best_buy = Store([mac, pixel])
+    assert best_buy.all_products is best_buy.all_products, "Active products view isn't cached"
+    pixel.buy(5)
+    assert best_buy.all_products == (mac,), "Sold out product is still listed"
+    pixel.quantity = 3
+    pixel.activate()
+    assert [product.name for product in best_buy.all_products] == [mac.name, pixel.name], \
+        "Reactivated product isn't listed"
+
+
+def test_failed_order_changes_nothing():
+    # Test that an order with an invalid line doesn't reduce quantities of its valid lines
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    pixel = Product("Google Pixel 7", price=100, quantity=2)
+    best_buy = Store([mac, pixel])
+    with pytest.raises(ValueError, match='Quantity can not be bigger than items in store'):
+        best_buy.order([(mac, 3), (pixel, 2), (pixel, 1)])
+    assert (mac.quantity, pixel.quantity) == (10, 2), "Failed order reduced product quantities"
+
+
+def test_concurrent_orders_conserve_inventory():
+    # Test that concurrent multi-line orders never oversell and lose no items
+    product_list = [Product(f"Product {number}", price=10 + number, quantity=300) for number in range(8)]
+    best_buy = Store(product_list)
+    sold = [0] * len(product_list)
+    sold_lock = threading.Lock()
+
+    def customer(seed):
+        rng = random.Random(seed)
+        for _ in range(300):
+            lines = [(rng.randrange(len(product_list)), rng.randint(1, 4)) for _ in range(rng.randint(1, 4))]
+            try:
+                best_buy.order([(product_list[index], quantity) for index, quantity in lines])
+            except ValueError:
+                continue
+            with sold_lock:
+                for index, quantity in lines:
+                    sold[index] += quantity
+
+    threads = [threading.Thread(target=customer, args=(seed,)) for seed in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for product, sold_quantity in zip(product_list, sold):
+        assert product.quantity == 300 - sold_quantity, f"{product.name} inventory isn't conserved"
+    assert best_buy.total_quantity == 300 * len(product_list) - sum(sold), "Total quantity isn't conserved"
+
+
+def test_all_products_under_concurrent_changes(monkeypatch):
+    # Test that readers always get a tuple while other threads add products and flip activation
+    monkeypatch.setattr(Store, 'check_invariants', False)
+    mac = Product("MacBook Air M2", price=1450, quantity=10)
+    best_buy = Store([mac])
+    stop = threading.Event()
+    results = []
+
+    def reader():
+        while not stop.is_set():
+            results.append(isinstance(best_buy.all_products, tuple))
+
+    def writer():
+        for number in range(2000):
+            best_buy.add_product(Product(f"Product {number}", price=1, quantity=1))
+            mac.deactivate()
+            mac.activate()
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    writer()
+    stop.set()
+    for thread in readers:
+        thread.join()
+    assert all(results), "Reader got something else than a tuple of products"
+
+
+def test_price_range_and_top_products():
+    # Test price range queries and top cheapest and most expensive products
+    product_list = [Product(f"Product {price}", price=price, quantity=1) for price in (500, 100, 250, 100, 1450)]
+    best_buy = Store(product_list)
+    assert [product.price for product in best_buy.products_in_price_range(100, 500)] == [100, 100, 250, 500], \
+        "Price range query returned wrong products"
+    assert best_buy.cheapest_products(2) == [product_list[1], product_list[3]], "Wrong cheapest products"
+    assert [product.price for product in best_buy.most_expensive_products(2)] == [1450, 500], \
+        "Wrong most expensive products"
+    assert [product.price for product in best_buy.products_by_price(1, 2, descending=True)] == [250, 100], \
+        "Wrong page of products in price order"
+
+
+def test_price_index_follows_activation():
+    # Test that sold out, reactivated and removed products are kept up to date in the price index
+    mac = Product("MacBook Air M2", price=1450, quantity=1)
+    pixel = Product("Google Pixel 7", price=100, quantity=5)
+    best_buy = Store([mac, pixel])
+    mac.buy(1)
+    assert best_buy.products_in_price_range(0, 2000) == [pixel], "Sold out product is still indexed"
+    mac.quantity = 3
+    mac.activate()
+    assert best_buy.most_expensive_products(1) == [mac], "Reactivated product isn't indexed"
+    best_buy.remove_product(pixel)
+    assert best_buy.cheapest_products(5) == [mac], "Removed product is still indexed"
+
+
+def test_apply_adjustments_is_transactional():
+    # Test that a batch of stock deltas is validated first, applied at once and flips activation
+    mac = Product("MacBook Air M2", price=1450, quantity=10, sku="MBA")
+    pixel = Product("Google Pixel 7", price=100, quantity=2, sku="PIX")
+    bose = Product("Bose QuietComfort Earbuds", price=250, quantity=0, sku="BOSE")
+    license = NonStockedProduct("Windows License", price=125, sku="WIN")
+    best_buy = Store([mac, pixel, bose, license])
+    batches = []
+    best_buy.subscribe(batches.append)
+    with pytest.raises(ValueError):
+        best_buy.apply_adjustments([("MBA", 5), ("PIX", -3)])
+    with pytest.raises(ValueError):
+        best_buy.apply_adjustments([("WIN", 5)])
+    assert mac.quantity == 10 and not batches, "Rejected batch changed the store"
+    assert best_buy.apply_adjustments([("MBA", 5), ("PIX", -2), ("BOSE", 7), ("MBA", -1)]) == 3, \
+        "Adjusted products weren't counted"
+    assert (mac.quantity, pixel.quantity, bose.quantity) == (14, 0, 7), "Deltas weren't applied"
+    assert not pixel.is_active and bose.is_active, "Activation wasn't flipped"
+    assert best_buy.total_quantity == 21 and best_buy.products_in_price_range(100, 300) == [license, bose], \
+        "Aggregates weren't updated"
+    assert len(batches) == 1 and len(batches[0]) == 3, "Changes weren't published as one batch"
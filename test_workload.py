@@ -0,0 +1,34 @@
+import products
+import workload
+
+
+def test_workload_round_trip_and_replay(tmp_path):
+    # Test that a written workload reads back unchanged and replays with stock-outs reported
+    header = workload.WorkloadHeader(50, seed=7, stock=5)
+    orders = list(workload.generate_orders(header, 300))
+    assert orders == list(workload.generate_orders(header, 300)), "Generated orders aren't deterministic"
+    path = tmp_path / 'orders.bbwl'
+    assert workload.write_workload(path, header, orders) == 300, "Not all orders were written"
+    read_header, read_orders = workload.read_workload(path)
+    assert (read_header.catalog_size, read_header.seed, read_header.order_count) == (50, 7, 300), \
+        "Header wasn't read back"
+    assert list(read_orders) == orders, "Orders weren't read back"
+    report = workload.replay(path)
+    assert report['orders'] == 300 and report['stock_outs'] > 0, "Stock-outs weren't reported"
+    assert report['accepted'] + report['stock_outs'] + report['rejected'] == 300, "Orders weren't all counted"
+    counts = ('accepted', 'stock_outs', 'rejected')
+    again = workload.replay(path)
+    assert [again[key] for key in counts] == [report[key] for key in counts], "Replay isn't deterministic"
+
+
+def test_negative_seed_and_stock_outs_of_stocked_products_only(tmp_path):
+    # Test that a negative seed is written and that only stocked products can run out of stock
+    header = workload.WorkloadHeader(20, seed=-3, stock=5)
+    path = tmp_path / 'orders.bbwl'
+    workload.write_workload(path, header, workload.generate_orders(header, 10))
+    assert workload.read_workload(path)[0].seed == -3, "Negative seed wasn't read back"
+    gift_wrap = products.LimitedProduct("Gift wrap", price=2, quantity=0, maximum=1)
+    license_key = products.NonStockedProduct("Windows License", price=125)
+    mac = products.Product("MacBook Air M2", price=1450, quantity=1)
+    assert not workload.is_stock_out([(gift_wrap, 2), (license_key, 5)]), "Unstocked product ran out of stock"
+    assert workload.is_stock_out([(mac, 1), (mac, 1)]), "Stock-out of a stocked product wasn't found"
@@ -0,0 +1,238 @@
+"""Synthetic order workloads. A workload file holds the parameters of a generated catalog
+and a stream of orders against it, so every replay starts from the same store.
+Product popularity follows a Zipf distribution over a shuffled catalog.
+    python workload.py generate orders.bbwl --orders 1000000 --skus 100000
+    python workload.py replay orders.bbwl --rate 5000
+"""
+import argparse
+import itertools
+import json
+import random
+import struct
+import time
+
+import percentiles
+import products
+import promotions
+import store
+
+MAGIC = b'BBWL'
+FORMAT_VERSION = 1
+# magic, format version, catalog size, catalog seed, initial stock, stocked, non stocked
+# and limited shares of the catalog, maximum per order of limited products, zipf exponent, order count
+HEADER = struct.Struct('<4sHIqIdddHdQ')
+# number of lines of an order
+ORDER = struct.Struct('<H')
+# catalog position and quantity of an order line
+LINE = struct.Struct('<IH')
+DEFAULT_MIX = (0.8, 0.1, 0.1)
+
+
+class WorkloadHeader:
+    """Catalog parameters and size of a workload"""
+
+    def __init__(self, catalog_size, seed=0, stock=1000, mix=DEFAULT_MIX, maximum=3, zipf_exponent=1.1,
+                 order_count=0):
+        """Instance initialization
+        :param catalog_size: integer, number of products
+        :param seed: integer, seed of the catalog and of the order stream
+        :param stock: integer, initial quantity of every stocked product
+        :param mix: tuple of shares of Product, NonStockedProduct and LimitedProduct in the catalog
+        :param maximum: integer, maximum per order of limited products
+        :param zipf_exponent: float, popularity of the product of rank r is proportional to r ** -zipf_exponent
+        :param order_count: integer, number of orders in the stream
+        """
+        if catalog_size <= 0:
+            raise ValueError('Catalog size should be a positive integer.')
+        if len(mix) != 3 or min(mix) < 0 or not sum(mix):
+            raise ValueError('Product mix should be three non negative shares.')
+        self.catalog_size = catalog_size
+        self.seed = seed
+        self.stock = stock
+        self.mix = tuple(mix)
+        self.maximum = maximum
+        self.zipf_exponent = zipf_exponent
+        self.order_count = order_count
+
+    def pack(self):
+        """Returns binary header"""
+        return HEADER.pack(MAGIC, FORMAT_VERSION, self.catalog_size, self.seed, self.stock, *self.mix,
+                           self.maximum, self.zipf_exponent, self.order_count)
+
+    @classmethod
+    def unpack(cls, data):
+        """Returns header read from binary data"""
+        magic, version, catalog_size, seed, stock, *mix, maximum, zipf_exponent, order_count = HEADER.unpack(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Not a workload file of a supported version.')
+        return cls(catalog_size, seed, stock, tuple(mix), maximum, zipf_exponent, order_count)
+
+    def build_store(self):
+        """Returns a new Store with the workload catalog. Products have their catalog position as sku"""
+        rng = random.Random(self.seed)
+        promo_chains = ((), (promotions.SecondHalfPrice("Second Half price!"),),
+                        (promotions.ThirdOneFree("Third One Free!"),),
+                        (promotions.PercentDiscount("30% off!", percent=30),))
+        product_list = []
+        for position in range(self.catalog_size):
+            kind = rng.choices(range(3), weights=self.mix)[0]
+            price = round(rng.uniform(1, 2000), 2)
+            if kind == 0:
+                product = products.Product(f'Product {position}', price, quantity=self.stock, sku=position)
+            elif kind == 1:
+                product = products.NonStockedProduct(f'License {position}', price, sku=position)
+            else:
+                product = products.LimitedProduct(f'Shipping {position}', price, maximum=self.maximum,
+                                                  quantity=self.stock, sku=position)
+            for promo in rng.choice(promo_chains):
+                product.set_promotion(promo)
+            product_list.append(product)
+        return store.Store(product_list)
+
+
+def generate_orders(header, count, basket_sizes=(1, 5), max_quantity=3):
+    """Yields count orders as lists of tuples (catalog position, quantity)
+    :param header: WorkloadHeader of the catalog
+    :param count: integer, number of orders
+    :param basket_sizes: tuple of smallest and biggest number of lines per order
+    :param max_quantity: integer, biggest quantity of an order line
+    """
+    rng = random.Random(header.seed + 1)
+    # popularity rank -> catalog position, so popular products are spread over product kinds
+    ranked = list(range(header.catalog_size))
+    rng.shuffle(ranked)
+    cumulative_weights = list(itertools.accumulate(
+        rank ** -header.zipf_exponent for rank in range(1, header.catalog_size + 1)))
+    for _ in range(count):
+        basket = rng.randint(*basket_sizes)
+        lines = rng.choices(ranked, cum_weights=cumulative_weights, k=basket)
+        yield [(position, rng.randint(1, max_quantity)) for position in lines]
+
+
+def write_workload(path, header, orders):
+    """Writes header and orders to a workload file, returns number of written orders
+    :param path: file path
+    :param header: WorkloadHeader of the catalog
+    :param orders: iterable of lists of tuples (catalog position, quantity)
+    :return: integer
+    """
+    count = 0
+    with open(path, 'wb') as workload_file:
+        workload_file.write(header.pack())
+        for lines in orders:
+            workload_file.write(ORDER.pack(len(lines)) + b''.join(LINE.pack(*line) for line in lines))
+            count += 1
+        header.order_count = count
+        workload_file.seek(0)
+        workload_file.write(header.pack())
+    return count
+
+
+def read_workload(path):
+    """Returns header of a workload file and an iterator over its orders
+    as lists of tuples (catalog position, quantity)
+    """
+    with open(path, 'rb') as workload_file:
+        header = WorkloadHeader.unpack(workload_file.read(HEADER.size))
+        data = workload_file.read()
+
+    def orders():
+        offset = 0
+        for _ in range(header.order_count):
+            line_count, = ORDER.unpack_from(data, offset)
+            offset += ORDER.size
+            yield list(LINE.iter_unpack(data[offset:offset + line_count * LINE.size]))
+            offset += line_count * LINE.size
+
+    return header, orders()
+
+
+def is_stock_out(shopping_list):
+    """Returns bool weather a rejected order asked for more of a stocked product than is left.
+    Non stocked and limited products are never out of stock, orders of them are rejected for other reasons
+    """
+    ordered = {}
+    for product, quantity in shopping_list:
+        if not isinstance(product, (products.NonStockedBase, products.LimitedBase)):
+            ordered[product.sku] = (product, ordered.get(product.sku, (product, 0))[1] + quantity)
+    return any(quantity > product.quantity for product, quantity in ordered.values())
+
+
+def replay(path, rate=None, store_obj=None):
+    """Feeds the orders of a workload file through Store.order.
+    Orders are sent as fast as possible or at a target rate. With a target rate latency is
+    measured from the moment an order was due, so falling behind shows up in the percentiles
+    :param path: workload file path
+    :param rate: orders per second, None for as fast as possible
+    :param store_obj: store built from the workload header, a new one if not provided
+    :return: dictionary with order counts, throughput and latency percentiles in milliseconds
+    """
+    header, orders = read_workload(path)
+    store_obj = header.build_store() if store_obj is None else store_obj
+    catalog = [store_obj.get_product(position) for position in range(header.catalog_size)]
+    latencies = []
+    stock_outs = rejected = 0
+    started = time.perf_counter()
+    for number, lines in enumerate(orders):
+        shopping_list = [(catalog[position], quantity) for position, quantity in lines]
+        due = started
+        if rate:
+            due = started + number / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        order_started = due if rate else time.perf_counter()
+        try:
+            store_obj.order(shopping_list)
+        except ValueError:
+            if is_stock_out(shopping_list):
+                stock_outs += 1
+            else:
+                rejected += 1
+        latencies.append(time.perf_counter() - order_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'orders': len(latencies),
+        'accepted': len(latencies) - stock_outs - rejected,
+        'stock_outs': stock_outs,
+        'rejected': rejected,
+        'seconds': round(elapsed, 3),
+        'orders_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(percentiles.percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentiles.percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentiles.percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Best Buy synthetic order workloads')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='write a workload file')
+    generate_parser.add_argument('path')
+    generate_parser.add_argument('--orders', type=int, default=100000)
+    generate_parser.add_argument('--skus', type=int, default=10000)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--stock', type=int, default=1000, help='initial quantity of stocked products')
+    generate_parser.add_argument('--mix', type=float, nargs=3, default=list(DEFAULT_MIX),
+                                 metavar=('STOCKED', 'NON_STOCKED', 'LIMITED'))
+    generate_parser.add_argument('--zipf', type=float, default=1.1, help='popularity exponent')
+    generate_parser.add_argument('--basket', type=int, nargs=2, default=[1, 5], metavar=('MIN', 'MAX'))
+    generate_parser.add_argument('--max-quantity', type=int, default=3)
+    replay_parser = commands.add_parser('replay', help='replay a workload file against a new store')
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--rate', type=float, help='orders per second, as fast as possible if omitted')
+    arguments = parser.parse_args()
+    if arguments.command == 'generate':
+        header = WorkloadHeader(arguments.skus, arguments.seed, arguments.stock, arguments.mix,
+                                zipf_exponent=arguments.zipf)
+        count = write_workload(arguments.path, header,
+                               generate_orders(header, arguments.orders, arguments.basket, arguments.max_quantity))
+        print(f'{count} orders written to {arguments.path}')
+    else:
+        print(json.dumps(replay(arguments.path, arguments.rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()